@@ -0,0 +1,152 @@
+"""
+Integration API key issuing and verification
+
+Keys are issued as `{integration_name}_live_{prefix}.{secret}`. The prefix is
+public and stored indexed next to the bcrypt hash of the secret (bcrypt reads
+only 72 bytes, so the whole key is not hashed). A request costs one indexed
+lookup and one bcrypt check, run in a worker thread off the event loop. Keys
+verified recently are kept in a short-TTL in-memory cache keyed by a SHA-256
+digest of the key, so repeat requests skip bcrypt. The cache is per process,
+so a cache hit still re-reads the key's status and expiry by key_id (one
+indexed point read): a key revoked or rotated on any worker stops working
+everywhere at once. Keys issued before prefixes existed are still accepted
+through a scan of the unprefixed keys.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import secrets
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+API_KEY_CACHE_TTL_SECONDS = int(os.getenv("API_KEY_CACHE_TTL_SECONDS", "60"))
+API_KEY_CACHE_MAX_ENTRIES = 1000
+API_KEY_PREFIX_BYTES = 8  # 16 hex characters
+
+# Statuses a key can be used with (a rotated key stays valid until expires_at)
+USABLE_KEY_STATUSES = ["active", "rotating"]
+KEY_RECORD_FIELDS = {
+    "_id": 0, "key_id": 1, "key_prefix": 1, "api_key_hash": 1, "permissions": 1,
+    "rate_limit": 1, "rate_limit_period": 1, "status": 1, "expires_at": 1
+}
+# Re-read on cache hits (revocation and rotation change these)
+KEY_STATE_FIELDS = {"_id": 0, "status": 1, "expires_at": 1}
+
+# sha256(key) -> (cache expiry, key record without its hash)
+_verified_keys: Dict[str, Tuple[float, Dict]] = {}
+
+
+async def create_api_key_indexes(db):
+    """Create the public prefix index (keys issued before prefixes have none)"""
+    await db.integration_api_keys.create_index("key_prefix", unique=True, sparse=True)
+
+
+def generate_api_key(integration_name: str) -> Tuple[str, str, str]:
+    """New API key; returns (plain key, public prefix, bcrypt hash of the secret)"""
+    prefix = secrets.token_hex(API_KEY_PREFIX_BYTES)
+    secret = secrets.token_urlsafe(32)
+    api_key_hash = bcrypt.hashpw(secret.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return f"{integration_name}_live_{prefix}.{secret}", prefix, api_key_hash
+
+
+def split_api_key(api_key: str) -> Tuple[Optional[str], str]:
+    """
+    (public prefix, hashed part) of a key
+    Keys issued without a prefix have the whole key hashed.
+    """
+    if "." not in api_key:
+        return None, api_key
+    head, secret = api_key.rsplit(".", 1)
+    prefix = head.rsplit("_", 1)[-1]
+    if len(prefix) != API_KEY_PREFIX_BYTES * 2:
+        return None, api_key
+    return prefix, secret
+
+
+def _key_digest(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def _is_usable(key_record: Dict, now: datetime) -> bool:
+    if key_record.get("status") not in USABLE_KEY_STATUSES:
+        return False
+    expires_at = key_record.get("expires_at")
+    return expires_at is None or expires_at > now
+
+
+async def _check_hash(secret: str, api_key_hash: str) -> bool:
+    """bcrypt check in a worker thread (each check costs ~250ms of CPU)"""
+    return await asyncio.to_thread(bcrypt.checkpw, secret.encode('utf-8'), api_key_hash.encode('utf-8'))
+
+
+def _cache_verified_key(digest: str, key_record: Dict):
+    if len(_verified_keys) >= API_KEY_CACHE_MAX_ENTRIES:
+        now = time.monotonic()
+        for cached_digest in [d for d, (expires, _) in _verified_keys.items() if expires < now]:
+            del _verified_keys[cached_digest]
+        if len(_verified_keys) >= API_KEY_CACHE_MAX_ENTRIES:
+            _verified_keys.pop(next(iter(_verified_keys)))
+    record = {field: value for field, value in key_record.items() if field != "api_key_hash"}
+    _verified_keys[digest] = (time.monotonic() + API_KEY_CACHE_TTL_SECONDS, record)
+
+
+def invalidate_api_key(key_id: str):
+    """Drop a key from this process's verified cache (revocation, rotation)"""
+    for digest in [d for d, (_, record) in _verified_keys.items() if record["key_id"] == key_id]:
+        del _verified_keys[digest]
+
+
+async def verify_api_key(db, api_key: str) -> Optional[Dict]:
+    """
+    Key record for a valid, usable API key, or None
+    Checks the verified cache first (confirming the key's current status),
+    then the key with the request's prefix; keys issued without a prefix fall
+    back to a bcrypt scan.
+    """
+    digest = _key_digest(api_key)
+    now = datetime.utcnow()
+    cached = _verified_keys.get(digest)
+    if cached is not None:
+        expires, record = cached
+        if expires >= time.monotonic():
+            state = await db.integration_api_keys.find_one({"key_id": record["key_id"]}, KEY_STATE_FIELDS)
+            if state is not None and _is_usable(state, now):
+                record.update(state)
+                return record
+            _verified_keys.pop(digest, None)
+            return None
+        _verified_keys.pop(digest, None)
+
+    prefix, secret = split_api_key(api_key)
+    if prefix is not None:
+        candidates = await db.integration_api_keys.find(
+            {"key_prefix": prefix, "status": {"$in": USABLE_KEY_STATUSES}},
+            KEY_RECORD_FIELDS
+        ).to_list(1)
+    else:
+        candidates = await db.integration_api_keys.find(
+            {"key_prefix": {"$exists": False}, "status": {"$in": USABLE_KEY_STATUSES}},
+            KEY_RECORD_FIELDS
+        ).to_list(None)
+
+    for key_record in candidates:
+        if not _is_usable(key_record, now):
+            continue
+        if await _check_hash(secret, key_record["api_key_hash"]):
+            if prefix is None:
+                logger.warning(f"API key {key_record['key_id']} has no prefix - rotate it for faster verification")
+            _cache_verified_key(digest, key_record)
+            return _verified_keys[digest][1]
+    return None
+
+
+def has_permissions(key_record: Dict, required_permissions: List[str]) -> bool:
+    key_permissions = key_record.get("permissions", [])
+    return all(perm in key_permissions for perm in required_permissions)
+
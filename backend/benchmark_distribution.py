@@ -0,0 +1,237 @@
+"""
+Synthetic-data benchmark for lead distribution
+
+Seeds a new throwaway database on a local mongod with N members across tiers and
+M leads spread over several uploaded CSVs, then runs perform_lead_distribution
+(on the first CSV) and perform_scheduled_lead_distribution (across all CSVs).
+Each phase reports wall time, database round-trips, peak RSS and assignments
+per second; results are appended to a JSON file tagged with the git commit so
+runs can be compared across commits.
+
+Usage:
+    python benchmark_distribution.py --members 3000 --leads 100000 --csvs 5
+    python benchmark_distribution.py --mongo-url mongodb://localhost:27017 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import resource
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pymongo import monitoring
+
+DEFAULT_MONGO_URL = "mongodb://localhost:27017"
+DEFAULT_OUTPUT = "benchmark_results.json"
+TIER_MIX = ["bronze"] * 6 + ["silver"] * 3 + ["gold"]
+SEED_BATCH_SIZE = 10000
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts database commands (round-trips) by command name"""
+
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self) -> Counter:
+        commands, self.commands = self.commands, Counter()
+        return commands
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def seed(db, members: int, leads: int, csvs: int, rng: random.Random) -> list:
+    """Insert synthetic members, lead distributions and leads; returns distribution ids"""
+    users = [
+        {
+            "user_id": str(uuid.uuid4()),
+            "address": f"0x{i:040x}",
+            "username": f"member{i}",
+            "email": f"member{i}@example.com",
+            "membership_tier": rng.choice(TIER_MIX),
+            "suspended": False,
+            "email_notifications": {"lead_distribution": True},
+            "created_at": datetime.utcnow()
+        }
+        for i in range(members)
+    ]
+    for start in range(0, len(users), SEED_BATCH_SIZE):
+        await db.users.insert_many(users[start:start + SEED_BATCH_SIZE])
+
+    base_time = datetime.utcnow() - timedelta(days=csvs)
+    distribution_ids = [str(uuid.uuid4()) for _ in range(csvs)]
+    per_csv = -(-leads // csvs)
+    for index, distribution_id in enumerate(distribution_ids):
+        count = min(per_csv, leads - index * per_csv)
+        if count <= 0:
+            break
+        uploaded_at = base_time + timedelta(days=index)
+        await db.lead_distributions.insert_one({
+            "distribution_id": distribution_id,
+            "filename": f"benchmark_{index}.csv",
+            "total_leads": count,
+            "status": "queued",
+            "uploaded_by": "benchmark",
+            "uploaded_at": uploaded_at
+        })
+        batch = []
+        for offset in range(count):
+            lead_number = index * per_csv + offset
+            batch.append({
+                "lead_id": str(uuid.uuid4()),
+                "name": f"Lead {lead_number}",
+                "email": f"lead{lead_number}@example.org",
+                "address": f"{lead_number} Benchmark Street",
+                "distribution_id": distribution_id,
+                "distribution_count": 0,
+                "assigned_members": [],
+                "created_at": uploaded_at + timedelta(microseconds=offset)
+            })
+            if len(batch) >= SEED_BATCH_SIZE:
+                await db.leads.insert_many(batch)
+                batch = []
+        if batch:
+            await db.leads.insert_many(batch)
+    return distribution_ids
+
+
+async def measure(name: str, db, counter: CommandCounter, operation) -> dict:
+    """Run one phase and collect its metrics"""
+    assignments_before = await db.member_leads.estimated_document_count()
+    counter.reset()
+    started = time.perf_counter()
+    await operation()
+    wall_seconds = time.perf_counter() - started
+    commands = counter.reset()
+    assignments = await db.member_leads.estimated_document_count() - assignments_before
+    return {
+        "phase": name,
+        "wall_seconds": round(wall_seconds, 3),
+        "round_trips": sum(commands.values()),
+        "round_trips_by_command": dict(commands.most_common()),
+        "assignments": assignments,
+        "assignments_per_second": round(assignments / wall_seconds) if wall_seconds > 0 else None,
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+async def run_benchmark(args) -> dict:
+    # server.py connects at import time, so point it at the benchmark database first
+    db_name = args.db or f"proleads_benchmark_{uuid.uuid4().hex[:8]}"
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = db_name
+    os.environ.setdefault("DISTRIBUTION_WRITE_RATE", "0")
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    import server
+
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(args.mongo_url, event_listeners=[counter])
+    # The database is dropped after the run, so never seed into one that already exists
+    if db_name in await client.list_database_names():
+        client.close()
+        raise SystemExit(f"Database {db_name} already exists - pass the name of a new database to --db")
+    db = client[db_name]
+    server.db = db
+
+    async def skip_admin_email(*_args, **_kwargs):
+        return True
+    server.send_admin_lead_distribution_status = skip_admin_email
+
+    rng = random.Random(args.seed)
+    result = {
+        "commit": _git_commit(),
+        "recorded_at": datetime.utcnow().isoformat(),
+        "parameters": {
+            "members": args.members,
+            "leads": args.leads,
+            "csvs": args.csvs,
+            "seed": args.seed,
+            "concurrency": args.concurrency
+        },
+        "phases": []
+    }
+    try:
+        started = time.perf_counter()
+        distribution_ids = await seed(db, args.members, args.leads, args.csvs, rng)
+        await server.create_lead_indexes()
+        result["seed_seconds"] = round(time.perf_counter() - started, 3)
+
+        result["phases"].append(await measure(
+            "perform_lead_distribution", db, counter,
+            lambda: server.perform_lead_distribution(distribution_ids[0], concurrency=args.concurrency)
+        ))
+        result["phases"].append(await measure(
+            "perform_scheduled_lead_distribution", db, counter,
+            lambda: server.perform_scheduled_lead_distribution(
+                "benchmark-schedule", "Benchmark", concurrency=args.concurrency
+            )
+        ))
+    finally:
+        if not args.keep_db:
+            await client.drop_database(db_name)
+        client.close()
+    return result
+
+
+def append_result(path: str, result: dict):
+    """Append a run to the JSON results file (a list of runs)"""
+    runs = []
+    if os.path.exists(path):
+        with open(path) as handle:
+            runs = json.load(handle)
+    runs.append(result)
+    with open(path, "w") as handle:
+        json.dump(runs, handle, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lead distribution on synthetic data")
+    parser.add_argument("--members", type=int, default=3000)
+    parser.add_argument("--leads", type=int, default=100000)
+    parser.add_argument("--csvs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--mongo-url", default=os.getenv("BENCHMARK_MONGO_URL", DEFAULT_MONGO_URL))
+    parser.add_argument("--db", default=None, help="Name for a new database (default: a generated throwaway name)")
+    parser.add_argument("--keep-db", action="store_true", help="Keep the seeded database after the run")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    append_result(args.output, result)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Local disk storage for resumable, chunked lead CSV uploads
+"""
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Chunk storage configuration
+CHUNK_UPLOAD_DIR = os.getenv(
+    "CHUNK_UPLOAD_DIR",
+    os.path.join(tempfile.gettempdir(), "proleads_chunked_uploads")
+)
+MAX_CHUNK_SIZE = 16 * 1024 * 1024  # 16 MB per chunk
+MAX_PENDING_ROW_SIZE = 1024 * 1024  # Longest row carried over into the next chunk
+UPLOAD_EXPIRY_HOURS = 24
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f-]{36}$")
+
+
+def get_upload_dir(upload_id: str) -> str:
+    """Return the chunk directory for an upload (upload_id must be a UUID)"""
+    if not _UPLOAD_ID_PATTERN.match(upload_id):
+        raise ValueError("Invalid upload id")
+    return os.path.join(CHUNK_UPLOAD_DIR, upload_id)
+
+
+def get_chunk_path(upload_id: str, chunk_index: int) -> str:
+    """Return the on-disk path of one chunk"""
+    return os.path.join(get_upload_dir(upload_id), f"{chunk_index:06d}.part")
+
+
+def compute_checksum(data: bytes) -> str:
+    """SHA-256 hex digest used to verify chunks"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_chunk(upload_id: str, chunk_index: int, data: bytes, expected_checksum: str) -> str:
+    """
+    Verify and store a chunk atomically (write to a temp file, then rename)
+    Raises ValueError on checksum mismatch. Returns the checksum.
+    """
+    checksum = compute_checksum(data)
+    if checksum != expected_checksum.strip().lower():
+        raise ValueError(f"Checksum mismatch for chunk {chunk_index}")
+    
+    upload_dir = get_upload_dir(upload_id)
+    os.makedirs(upload_dir, exist_ok=True)
+    
+    chunk_path = get_chunk_path(upload_id, chunk_index)
+    tmp_path = f"{chunk_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, chunk_path)
+    return checksum
+
+
+def read_chunk(upload_id: str, chunk_index: int, checksum: Optional[str] = None) -> bytes:
+    """
+    Read one stored chunk, re-verifying its checksum when provided
+    Raises ValueError if the chunk is missing or corrupted on disk
+    """
+    chunk_path = get_chunk_path(upload_id, chunk_index)
+    if not os.path.exists(chunk_path):
+        raise ValueError(f"Chunk {chunk_index} is missing")
+    with open(chunk_path, "rb") as f:
+        data = f.read()
+    if checksum and compute_checksum(data) != checksum:
+        raise ValueError(f"Chunk {chunk_index} failed checksum verification")
+    return data
+
+
+def split_complete_rows(data: bytes) -> Tuple[bytes, bytes]:
+    """
+    Split CSV bytes after the last newline that ends a row (one outside a
+    quoted field). Returns (complete rows, trailing partial row). Safe on
+    UTF-8 input: quote and newline bytes never occur inside a multi-byte
+    character.
+    """
+    end = 0
+    quotes = 0
+    start = 0
+    while True:
+        newline = data.find(b"\n", start)
+        if newline == -1:
+            break
+        quotes += data.count(b'"', start, newline)
+        start = newline + 1
+        if quotes % 2 == 0:
+            end = start
+    return data[:end], data[end:]
+
+
+def remove_chunk(upload_id: str, chunk_index: int):
+    """Delete one stored chunk (rejected after it was written)"""
+    try:
+        os.remove(get_chunk_path(upload_id, chunk_index))
+    except FileNotFoundError:
+        pass
+
+
+def list_upload_ids() -> List[str]:
+    """Upload ids that have a chunk directory on this host"""
+    try:
+        names = os.listdir(CHUNK_UPLOAD_DIR)
+    except FileNotFoundError:
+        return []
+    return [name for name in names if _UPLOAD_ID_PATTERN.match(name)]
+
+
+def remove_upload(upload_id: str):
+    """Delete all stored chunks for an upload"""
+    try:
+        shutil.rmtree(get_upload_dir(upload_id), ignore_errors=True)
+    except ValueError as e:
+        logger.error(f"Failed to remove upload {upload_id}: {str(e)}")
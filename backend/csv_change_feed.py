@@ -0,0 +1,103 @@
+"""
+Change feed over member CSV files for integration partners
+
+Every write to a member_csv_files document stamps `updated_at` (new files,
+download tracking). Partners page through a user's files ordered by
+(updated_at, file_id) from an opaque resume token, so each sync returns only
+files created or changed since the last one.
+
+Stamps and the feed horizon both come from the database server clock
+($$NOW), so app hosts with skewed clocks cannot place a change behind a
+token already handed out. New files are stamped by a separate update once
+their insert has finished, so a slow insert is never stamped early. Changes
+younger than a short settle window (the time between an update reading
+$$NOW and committing) are held back.
+"""
+import json
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+CHANGE_FEED_SETTLE_SECONDS = 5
+CHANGE_FEED_DEFAULT_LIMIT = 100
+CHANGE_FEED_MAX_LIMIT = 1000
+
+CHANGE_FEED_FIELDS = {
+    "_id": 0, "file_id": 1, "filename": 1, "lead_count": 1, "line_count": 1, "distribution_id": 1,
+    "created_at": 1, "updated_at": 1, "downloaded": 1, "download_count": 1
+}
+
+
+async def create_csv_change_feed_indexes(db):
+    """
+    Index the feed order and stamp files that have no updated_at yet (written
+    before the feed existed, or left unstamped by an interrupted writer)
+    """
+    await db.member_csv_files.create_index([("member_address", 1), ("updated_at", 1), ("file_id", 1)])
+    await db.member_csv_files.update_many(
+        {"updated_at": {"$exists": False}},
+        [{"$set": {"updated_at": "$$NOW"}}]
+    )
+
+
+async def stamp_csv_file_changes(db, file_ids: List[str]):
+    """Move files to the head of the feed, stamped with the database server time"""
+    if file_ids:
+        await db.member_csv_files.update_many(
+            {"file_id": {"$in": file_ids}},
+            [{"$set": {"updated_at": "$$NOW"}}]
+        )
+
+
+async def database_now(db) -> datetime:
+    """Current time of the database server (naive UTC, like stored dates)"""
+    result = await db.command("hello")
+    return result["localTime"].replace(tzinfo=None)
+
+
+def encode_resume_token(updated_at: datetime, file_id: str) -> str:
+    payload = json.dumps({"t": updated_at.isoformat(), "f": file_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_resume_token(token: str) -> Tuple[datetime, str]:
+    """Position encoded in a resume token; raises ValueError for malformed tokens"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), payload["f"]
+    except (binascii.Error, UnicodeError, KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid resume token: {str(e)}")
+
+
+async def list_csv_file_changes(
+    db,
+    member_address: str,
+    resume_token: Optional[str] = None,
+    limit: int = CHANGE_FEED_DEFAULT_LIMIT
+) -> Dict:
+    """
+    Files of a member created or changed after the resume token position
+    Returns the changed files, the token to resume from and whether more
+    changes are already waiting.
+    """
+    limit = max(1, min(limit, CHANGE_FEED_MAX_LIMIT))
+    horizon = await database_now(db) - timedelta(seconds=CHANGE_FEED_SETTLE_SECONDS)
+    query = {"member_address": member_address, "updated_at": {"$lte": horizon}}
+    if resume_token:
+        updated_at, file_id = decode_resume_token(resume_token)
+        query["$or"] = [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "file_id": {"$gt": file_id}}
+        ]
+
+    files = await db.member_csv_files.find(query, CHANGE_FEED_FIELDS).sort(
+        [("updated_at", 1), ("file_id", 1)]
+    ).limit(limit + 1).to_list(None)
+    has_more = len(files) > limit
+    files = files[:limit]
+
+    next_token = resume_token
+    if files:
+        next_token = encode_resume_token(files[-1]["updated_at"], files[-1]["file_id"])
+    return {"files": files, "resume_token": next_token, "has_more": has_more}
@@ -0,0 +1,326 @@
+"""
+Member lead CSV files: rendering and legacy stored bodies
+
+New member CSV files store no body: a file is rendered on demand by streaming
+its `member_leads` rows (linked by csv_file_id) through csv.writer, so a
+distribution only writes the assignments it already needs. Hot renders are
+cached in memory by file_id and validated with an ETag. Files written before
+this keep their body in the `csv_content` string and are streamed from it.
+"""
+import io
+import os
+import csv
+import json
+import zlib
+import logging
+import zipfile
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Files rendered from their member_leads rows
+RENDERED_STORAGE = "assignments"
+RENDER_BATCH_SIZE = 1000  # member_leads rows per cursor batch
+CSV_RENDER_CACHE_MAX_BYTES = int(os.getenv("CSV_RENDER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CSV_RENDER_CACHE_ENTRY_MAX_BYTES = 2 * 1024 * 1024  # Larger renders are streamed but not cached
+
+CSV_HEADER = ["Name", "Email", "Address"]
+
+# Fields that hold the body; list endpoints project them out
+CSV_BODY_FIELDS = {"csv_content": 0}
+
+# file_id -> (etag, rendered body), LRU bounded by total size
+_render_cache: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+_render_cache_bytes = 0
+
+
+def rendered_csv_fields() -> Dict:
+    """Fields for a member_csv_files document rendered from its assignments"""
+    return {"csv_storage": RENDERED_STORAGE}
+
+
+def csv_file_etag(csv_file: dict) -> str:
+    """
+    Strong ETag of a member CSV file
+    A file's rows never change after it is written: replayed chunks rewrite
+    the same plan, assignments embed their lead's fields, and older
+    assignments are frozen with the lead's fields (or a placeholder row for a
+    deleted lead) the first time they are rendered. So the file id, row count
+    and creation time identify the body.
+    """
+    created_at = csv_file.get("created_at")
+    stamp = int(created_at.timestamp()) if created_at else 0
+    return f'"{csv_file["file_id"]}-{csv_file.get("line_count", 0)}-{stamp}"'
+
+
+def _encode_rows(rows: Iterable[List[str]], header: bool = False) -> bytes:
+    """Same layout as the stored files: plain header, fully quoted rows"""
+    text = io.StringIO()
+    if header:
+        csv.writer(text, lineterminator="\n").writerow(CSV_HEADER)
+    csv.writer(text, quoting=csv.QUOTE_ALL, lineterminator="\n").writerows(rows)
+    return text.getvalue().encode("utf-8")
+
+
+async def _lead_rows(db, assignments: List[dict]) -> List[List[str]]:
+    """
+    CSV rows for a batch of assignments, one per assignment
+    Assignments written before they embedded their lead's fields are looked
+    up in leads once and frozen with those fields, so later renders (and the
+    ETag) stay the same when the lead is edited or deleted. A deleted lead
+    leaves an empty placeholder row, keeping the row count at line_count.
+    """
+    missing = [row["lead_id"] for row in assignments if row.get("lead_email") is None]
+    leads = {}
+    if missing:
+        async for lead in db.leads.find(
+            {"lead_id": {"$in": missing}},
+            {"_id": 0, "lead_id": 1, "name": 1, "email": 1, "address": 1}
+        ):
+            leads[lead["lead_id"]] = lead
+    rows = []
+    frozen = []
+    for row in assignments:
+        if row.get("lead_email") is None:
+            lead = leads.get(row["lead_id"], {})
+            fields = {
+                "lead_name": lead.get("name", ""),
+                "lead_email": lead.get("email", ""),
+                "lead_address": lead.get("address", "")
+            }
+            frozen.append(UpdateOne({"_id": row["_id"], "lead_email": None}, {"$set": fields}))
+            row = fields
+        rows.append([row.get("lead_name", ""), row["lead_email"], row.get("lead_address", "")])
+    if frozen:
+        await db.member_leads.bulk_write(frozen, ordered=False)
+    return rows
+
+
+async def iter_rendered_csv(
+    db,
+    file_id: str,
+    start_line: int = 0,
+    max_lines: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Render a member CSV file from its member_leads rows, batch by batch
+    start_line/max_lines select a range of data rows; the header is always sent.
+    """
+    yield _encode_rows([], header=True)
+    if max_lines == 0:
+        return
+    cursor = db.member_leads.find(
+        {"csv_file_id": file_id},
+        {"_id": 1, "lead_id": 1, "lead_name": 1, "lead_email": 1, "lead_address": 1}
+    ).sort("_id", 1).skip(start_line).batch_size(RENDER_BATCH_SIZE)
+    if max_lines is not None:
+        cursor = cursor.limit(max_lines)
+    while True:
+        assignments = await cursor.to_list(length=RENDER_BATCH_SIZE)
+        if not assignments:
+            break
+        rows = await _lead_rows(db, assignments)
+        if rows:
+            yield _encode_rows(rows)
+
+
+def _cached_render(file_id: str, etag: str) -> Optional[bytes]:
+    entry = _render_cache.get(file_id)
+    if entry is None or entry[0] != etag:
+        return None
+    _render_cache.move_to_end(file_id)
+    return entry[1]
+
+
+def _cache_render(file_id: str, etag: str, body: bytes):
+    """Store a render (LRU bounded by CSV_RENDER_CACHE_MAX_BYTES)"""
+    global _render_cache_bytes
+    if len(body) > CSV_RENDER_CACHE_ENTRY_MAX_BYTES:
+        return
+    previous = _render_cache.pop(file_id, None)
+    if previous is not None:
+        _render_cache_bytes -= len(previous[1])
+    _render_cache[file_id] = (etag, body)
+    _render_cache_bytes += len(body)
+    while _render_cache_bytes > CSV_RENDER_CACHE_MAX_BYTES and _render_cache:
+        _, (_, evicted) = _render_cache.popitem(last=False)
+        _render_cache_bytes -= len(evicted)
+
+
+async def iter_csv_body(db, csv_file: dict) -> AsyncIterator[bytes]:
+    """
+    Stream the uncompressed body of a member CSV file
+    Rendered files are served from the render cache when the ETag matches,
+    and complete renders small enough are cached for the next request.
+    """
+    if csv_file.get("csv_storage") == RENDERED_STORAGE:
+        file_id = csv_file["file_id"]
+        etag = csv_file_etag(csv_file)
+        cached = _cached_render(file_id, etag)
+        if cached is not None:
+            for start in range(0, len(cached), STREAM_CHUNK_SIZE):
+                yield cached[start:start + STREAM_CHUNK_SIZE]
+            return
+        parts = []
+        size = 0
+        async for chunk in iter_rendered_csv(db, file_id):
+            if parts is not None:
+                parts.append(chunk)
+                size += len(chunk)
+                if size > CSV_RENDER_CACHE_ENTRY_MAX_BYTES:
+                    parts = None
+            yield chunk
+        if parts is not None:
+            _cache_render(file_id, etag, b"".join(parts))
+        return
+
+    # Legacy document with the body as a plain string
+    content = csv_file.get("csv_content", "").encode("utf-8")
+    for start in range(0, len(content), STREAM_CHUNK_SIZE):
+        yield content[start:start + STREAM_CHUNK_SIZE]
+
+
+async def read_csv_body(db, csv_file: dict) -> str:
+    """Whole body as a string, for responses that embed it"""
+    parts = [chunk async for chunk in iter_csv_body(db, csv_file)]
+    return b"".join(parts).decode("utf-8")
+
+
+def csv_range_etag(csv_file: dict, start_line: int = 0, max_lines: Optional[int] = None, gzipped: bool = False) -> str:
+    """
+    Strong ETag of one representation of a member CSV file: the row range
+    and the content encoding are part of it, as each is a different body
+    """
+    tag = csv_file_etag(csv_file)[1:-1]
+    if start_line != 0 or max_lines is not None:
+        tag += f":{start_line}-{'all' if max_lines is None else max_lines}"
+    if gzipped:
+        tag += "-gz"
+    return f'"{tag}"'
+
+
+def csv_line_count(csv_file: dict) -> int:
+    """Data rows of a member CSV file, from its stored metadata"""
+    return csv_file.get("line_count", csv_file.get("lead_count", 0))
+
+
+async def iter_csv_range(
+    db,
+    csv_file: dict,
+    start_line: int = 0,
+    max_lines: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Stream the header and a range of data rows of a member CSV file
+    Rendered files read only the requested rows; stored bodies are streamed
+    and cut on row boundaries. A quoted field may span lines, so a row ends
+    at the first newline outside quotes (an even count of quote characters
+    so far; quotes never occur inside multi-byte UTF-8 sequences).
+    """
+    if csv_file.get("csv_storage") == RENDERED_STORAGE:
+        async for chunk in iter_rendered_csv(db, csv_file["file_id"], start_line, max_lines):
+            yield chunk
+        return
+
+    end_line = None if max_lines is None else start_line + max_lines
+
+    def selected(row_number: int) -> bool:
+        # The header is row -1
+        return row_number == -1 or (row_number >= start_line and (end_line is None or row_number < end_line))
+
+    row_number = -1
+    row = b""
+    in_quotes = False
+    pending = b""
+    async for chunk in iter_csv_body(db, csv_file):
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        rows = []
+        for line in lines:
+            row += line + b"\n"
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if in_quotes:
+                continue
+            if selected(row_number):
+                rows.append(row)
+            row = b""
+            row_number += 1
+        if rows:
+            yield b"".join(rows)
+        if end_line is not None and row_number >= end_line:
+            return
+    row += pending
+    if row and selected(row_number):
+        yield row
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip-compress a byte stream on the fly"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """Unseekable sink for zipfile; the archive is drained chunk by chunk"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer.extend(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+async def iter_zip_export(db, csv_files: List[dict]) -> AsyncIterator[bytes]:
+    """Stream several member CSV files as one zip archive (one entry per file)"""
+    sink = _ZipStreamBuffer()
+    used_names = set()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for csv_file in csv_files:
+            name = csv_file.get("filename") or f"{csv_file['file_id']}.csv"
+            if name in used_names:
+                name = f"{csv_file['file_id']}_{name}"
+            used_names.add(name)
+            with archive.open(name, mode="w") as entry:
+                async for chunk in iter_csv_body(db, csv_file):
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+async def iter_ndjson_export(db, csv_files: List[dict]) -> AsyncIterator[bytes]:
+    """Stream several member CSV files as NDJSON, one object per file"""
+    for csv_file in csv_files:
+        created_at = csv_file.get("created_at")
+        record = {
+            "file_id": csv_file["file_id"],
+            "filename": csv_file.get("filename"),
+            "distribution_id": csv_file.get("distribution_id", ""),
+            "line_count": csv_line_count(csv_file),
+            "created_at": created_at.isoformat() if created_at else None,
+            "csv_data": await read_csv_body(db, csv_file)
+        }
+        yield (json.dumps(record) + "\n").encode("utf-8")
@@ -0,0 +1,229 @@
+"""
+Dry-run planner for lead distributions
+
+Runs the same allocation as a real distribution (tier quotas and allocators
+from lead_allocator) in memory against the current members and leads, and
+reports per-tier fill rates, members left short, lead exhaustion projections
+and how long planning took. Nothing is written.
+
+Usage: python distribution_planner.py [distribution_id]
+(without a distribution id, the oldest-first scheduled run is simulated)
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+
+from lead_allocator import (
+    MAX_DISTRIBUTIONS_PER_LEAD,
+    LeadAllocator,
+    WindowedLeadAllocator,
+    get_tier_quota,
+    iter_eligible_member_batches
+)
+from distribution_writer import DISTRIBUTION_WRITE_RATE
+from lead_assignments import lookup_member_ids, make_repeat_check
+
+logger = logging.getLogger(__name__)
+
+SHORTFALL_LIMIT = 100  # Members listed in the shortfall report
+
+MEMBER_PROJECTION = {"_id": 0, "address": 1, "username": 1, "membership_tier": 1}
+LEAD_PROJECTION = {"_id": 0, "lead_id": 1, "distribution_count": 1, "assigned_members": 1}
+
+
+class _ListCursor:
+    """Serves preloaded leads through the to_list() interface of a Motor cursor"""
+
+    def __init__(self, items: List[dict]):
+        self.items = items
+        self.position = 0
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        end = len(self.items) if length is None else self.position + length
+        batch = self.items[self.position:end]
+        self.position += len(batch)
+        return batch
+
+
+async def load_planning_inputs(db, distribution_id: Optional[str] = None) -> Dict:
+    """Load eligible members and the leads a run would draw from"""
+    members = []
+    async for batch in iter_eligible_member_batches(db, MEMBER_PROJECTION):
+        members += batch
+
+    served = set()
+    if distribution_id:
+        leads = await db.leads.find(
+            {"distribution_id": distribution_id, "distribution_count": {"$lt": MAX_DISTRIBUTIONS_PER_LEAD}},
+            LEAD_PROJECTION
+        ).to_list(None)
+        served = set(await db.member_csv_files.distinct("member_address", {"distribution_id": distribution_id}))
+    else:
+        leads = await db.leads.find(
+            {"distribution_count": {"$lt": MAX_DISTRIBUTIONS_PER_LEAD}},
+            LEAD_PROJECTION
+        ).sort("created_at", 1).to_list(None)
+
+    member_ids = await lookup_member_ids(db, [member["address"] for member in members])
+    return {"members": members, "leads": leads, "served_addresses": served, "member_ids": member_ids}
+
+
+async def simulate_distribution(
+    members: List[dict],
+    leads: List[dict],
+    oldest_first: bool = False,
+    served_addresses: Optional[set] = None,
+    leads_per_tier: Optional[Dict[str, int]] = None,
+    shortfall_limit: int = SHORTFALL_LIMIT,
+    member_ids: Optional[Dict[str, int]] = None
+) -> Dict:
+    """
+    Allocate leads to members in memory and summarise the outcome
+    oldest_first selects the scheduled-run allocator; otherwise the rotating
+    allocator of a single distribution is used. With member_ids, leads a member
+    received in earlier runs are skipped as in a real run.
+    """
+    served_addresses = served_addresses or set()
+    capacity_before = sum(max(0, MAX_DISTRIBUTIONS_PER_LEAD - lead.get("distribution_count", 0)) for lead in leads)
+
+    started = time.perf_counter()
+    is_assigned = make_repeat_check(member_ids) if member_ids else None
+    if oldest_first:
+        allocator = WindowedLeadAllocator(_ListCursor(leads), is_assigned=is_assigned)
+    else:
+        allocator = LeadAllocator(leads, max_per_lead=MAX_DISTRIBUTIONS_PER_LEAD, is_assigned=is_assigned)
+
+    per_tier = {}
+    shortfalls = []
+    lead_increments = Counter()
+    members_planned = 0
+    for member in members:
+        if member["address"] in served_addresses:
+            continue
+        tier = member.get("membership_tier") or "bronze"
+        quota = get_tier_quota(tier, leads_per_tier)
+        if oldest_first:
+            # The windowed allocator reads leads from its cursor as it goes
+            picked = await allocator.allocate(member["address"], quota)
+        else:
+            picked = allocator.allocate(member["address"], quota)
+        for lead in picked:
+            lead_increments[lead["lead_id"]] += 1
+        if picked:
+            members_planned += 1
+
+        stats = per_tier.setdefault(tier, {
+            "members": 0, "quota": quota, "demand": 0, "allocated": 0,
+            "members_short": 0, "members_empty": 0
+        })
+        stats["members"] += 1
+        stats["demand"] += quota
+        stats["allocated"] += len(picked)
+        if len(picked) < quota:
+            stats["members_short"] += 1
+            if not picked:
+                stats["members_empty"] += 1
+            shortfalls.append({
+                "address": member["address"],
+                "username": member.get("username"),
+                "tier": tier,
+                "quota": quota,
+                "allocated": len(picked),
+                "short_by": quota - len(picked)
+            })
+    planning_seconds = time.perf_counter() - started
+
+    for stats in per_tier.values():
+        stats["fill_rate"] = round(stats["allocated"] / stats["demand"], 4) if stats["demand"] else 1.0
+
+    assignments = sum(lead_increments.values())
+    capacity_after = capacity_before - assignments
+    leads_exhausted = sum(
+        1 for lead in leads
+        if lead_increments[lead["lead_id"]]
+        and lead.get("distribution_count", 0) + lead_increments[lead["lead_id"]] >= MAX_DISTRIBUTIONS_PER_LEAD
+    )
+    demand = sum(stats["demand"] for stats in per_tier.values())
+
+    # Documents a real run writes: CSV files, assignments and one update per touched lead
+    documents_to_write = members_planned + assignments + len(lead_increments)
+    shortfalls.sort(key=lambda shortfall: shortfall["short_by"], reverse=True)
+
+    return {
+        "mode": "scheduled" if oldest_first else "distribution",
+        "members": {
+            "eligible": len(members),
+            "already_served": len(served_addresses & {member["address"] for member in members}),
+            "planned": members_planned
+        },
+        "per_tier": per_tier,
+        "totals": {
+            "demand": demand,
+            "allocated": assignments,
+            "fill_rate": round(assignments / demand, 4) if demand else 1.0,
+            "members_short": len(shortfalls)
+        },
+        "shortfalls": shortfalls[:shortfall_limit],
+        "exhaustion": {
+            "leads_available": len(leads),
+            "capacity_before": capacity_before,
+            "capacity_after": capacity_after,
+            "leads_exhausted_by_run": leads_exhausted,
+            "leads_remaining_with_capacity": len(leads) - leads_exhausted,
+            # Runs of the same demand until no slots are left (this run included)
+            "runs_until_exhausted": math.ceil(capacity_before / assignments) if assignments else None,
+            "run_demand_exceeds_capacity": demand > capacity_before
+        },
+        "timing": {
+            "planning_seconds": round(planning_seconds, 4),
+            "assignments_per_second": round(assignments / planning_seconds) if planning_seconds > 0 else None,
+            "documents_to_write": documents_to_write,
+            "estimated_write_seconds": round(documents_to_write / DISTRIBUTION_WRITE_RATE, 1) if DISTRIBUTION_WRITE_RATE > 0 else None
+        }
+    }
+
+
+async def plan_distribution(
+    db,
+    distribution_id: Optional[str] = None,
+    shortfall_limit: int = SHORTFALL_LIMIT
+) -> Dict:
+    """Dry-run a distribution (or a scheduled run when distribution_id is None)"""
+    started = time.perf_counter()
+    inputs = await load_planning_inputs(db, distribution_id)
+    load_seconds = time.perf_counter() - started
+
+    plan = await simulate_distribution(
+        inputs["members"],
+        inputs["leads"],
+        oldest_first=distribution_id is None,
+        served_addresses=inputs["served_addresses"],
+        shortfall_limit=shortfall_limit,
+        member_ids=inputs["member_ids"]
+    )
+    plan["distribution_id"] = distribution_id
+    plan["timing"]["load_seconds"] = round(load_seconds, 4)
+    return plan
+
+
+async def _main(distribution_id: Optional[str]):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL"))
+    try:
+        plan = await plan_distribution(client[os.getenv("DB_NAME")], distribution_id)
+    finally:
+        client.close()
+    print(json.dumps(plan, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else None))
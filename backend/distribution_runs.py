@@ -0,0 +1,369 @@
+"""
+Checkpointed lead distribution runs
+
+The allocation plan of a distribution is saved before anything is written:
+one `distribution_runs` document holds the run header and progress cursor,
+and one `distribution_run_chunks` document per member chunk holds the leads
+planned for each member of that chunk. A chunk is marked committed once its
+batch is written, so an interrupted run resumes from the first uncommitted
+chunk without re-planning or looking up members one by one.
+
+The process executing a run holds its lease under an owner token and renews
+it from a heartbeat task, so only runs whose process died (or stalled for a
+whole lease period) are resumed elsewhere. Chunk writes and commits match on
+the owner token, so a process whose run was taken over stops writing.
+"""
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from pymongo import ReturnDocument, UpdateOne
+
+from lead_assignments import lookup_member_ids
+
+logger = logging.getLogger(__name__)
+
+RUN_LEASE_MINUTES = 5  # A running run whose lease was not renewed for this long is considered interrupted
+RUN_LEASE_RENEW_SECONDS = 60  # Heartbeat interval while a run executes
+MAX_RUN_RESUMES = 5  # Give up on runs that keep failing after this many resumes
+
+RUN_MEMBER_FIELDS = ("address", "username", "email", "membership_tier", "email_notifications")
+
+
+async def create_distribution_run_indexes(db):
+    """Create indexes for distribution runs and their plan chunks"""
+    await db.distribution_runs.create_index("run_id", unique=True)
+    await db.distribution_runs.create_index([("distribution_id", 1), ("status", 1)])
+    await db.distribution_runs.create_index([("status", 1), ("lease_expires_at", 1)])
+    await db.distribution_run_chunks.create_index([("run_id", 1), ("chunk_number", 1)], unique=True)
+
+
+class RunLeaseLost(Exception):
+    """The run was taken over by another process after this one's lease expired"""
+
+
+def _lease_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(minutes=RUN_LEASE_MINUTES)
+
+
+def _new_lease_owner() -> str:
+    return str(uuid.uuid4())
+
+
+class RunLease:
+    """
+    Lease on a running run, renewed by a heartbeat task while it is held
+    (`async with RunLease(db, run) as lease:`). Renewals match on the owner
+    token the run was started or claimed with.
+    """
+
+    def __init__(self, db, run: dict):
+        self.db = db
+        self.run_id = run["run_id"]
+        self.owner = run["lease_owner"]
+        self.lost = False
+        self.task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self._heartbeat())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+    async def renew(self) -> bool:
+        """Extend the lease; False once another process has claimed the run"""
+        result = await self.db.distribution_runs.update_one(
+            {"run_id": self.run_id, "status": "running", "lease_owner": self.owner},
+            {"$set": {"lease_expires_at": _lease_expiry()}}
+        )
+        if result.matched_count == 0:
+            self.lost = True
+        return not self.lost
+
+    async def ensure_held(self):
+        """Renew the lease, raising RunLeaseLost if the run was taken over"""
+        if not await self.renew():
+            raise RunLeaseLost(f"Distribution run {self.run_id} was taken over by another process")
+
+    async def _heartbeat(self):
+        while not self.lost:
+            await asyncio.sleep(RUN_LEASE_RENEW_SECONDS)
+            try:
+                if not await self.renew():
+                    logger.error(f"Lost the lease on distribution run {self.run_id}")
+            except Exception as e:
+                logger.error(f"Failed to renew the lease on distribution run {self.run_id}: {str(e)}")
+
+
+def _plan_member(member: dict, leads: Sequence[dict]) -> dict:
+    planned = {field: member.get(field) for field in RUN_MEMBER_FIELDS}
+    planned["membership_tier"] = planned["membership_tier"] or "bronze"
+    planned["email_notifications"] = planned["email_notifications"] or {}
+    planned["file_id"] = str(uuid.uuid4())
+    planned["lead_ids"] = [lead["lead_id"] for lead in leads]
+    return planned
+
+
+def run_percent_complete(run: dict) -> float:
+    """Share of planned members whose chunk has been committed"""
+    if not run.get("members_total"):
+        return 100.0 if run.get("status") == "completed" else 0.0
+    return round(run.get("members_committed", 0) / run["members_total"] * 100, 2)
+
+
+async def start_distribution_run(
+    db,
+    distribution_id: str,
+    allocation_plan: List[tuple],
+    chunk_size: int,
+    totals: Optional[Dict] = None
+) -> dict:
+    """
+    Save an allocation plan of (member, leads) pairs as a new running run
+    The plan chunks are written before the header, so a run header always
+    refers to a complete plan.
+    """
+    run_id = str(uuid.uuid4())
+    chunks = [
+        allocation_plan[i:i + chunk_size]
+        for i in range(0, len(allocation_plan), chunk_size)
+    ]
+    chunk_docs = [
+        {
+            "run_id": run_id,
+            "chunk_number": chunk_number,
+            "status": "pending",
+            "members": [_plan_member(member, leads) for member, leads in chunk],
+            "errors": []
+        }
+        for chunk_number, chunk in enumerate(chunks, start=1)
+    ]
+    if chunk_docs:
+        await db.distribution_run_chunks.insert_many(chunk_docs, ordered=False)
+
+    now = datetime.utcnow()
+    run = {
+        "run_id": run_id,
+        "distribution_id": distribution_id,
+        "status": "running",
+        "chunk_size": chunk_size,
+        "chunks_total": len(chunk_docs),
+        "chunks_committed": 0,
+        "chunks_failed": 0,
+        "members_total": len(allocation_plan),
+        "members_committed": 0,
+        "assignments_planned": sum(len(leads) for _, leads in allocation_plan),
+        "assignments_committed": 0,
+        "totals": totals or {},
+        "resume_count": 0,
+        "created_at": now,
+        "updated_at": now,
+        "lease_owner": _new_lease_owner(),
+        "lease_expires_at": _lease_expiry()
+    }
+    await db.distribution_runs.insert_one(run)
+    run.pop("_id", None)
+    return run
+
+
+async def load_pending_chunks(db, run_id: str) -> List[dict]:
+    """Plan chunks of a run that have not been committed yet, in order"""
+    return await db.distribution_run_chunks.find(
+        {"run_id": run_id, "status": {"$ne": "committed"}},
+        {"_id": 0}
+    ).sort("chunk_number", 1).to_list(None)
+
+
+async def load_chunk_leads(db, chunk: dict) -> Dict[str, dict]:
+    """Fetch the CSV fields of every lead planned in a chunk with one query"""
+    lead_ids = list({lead_id for member in chunk["members"] for lead_id in member["lead_ids"]})
+    leads = await db.leads.find(
+        {"lead_id": {"$in": lead_ids}},
+        {"_id": 0, "lead_id": 1, "name": 1, "email": 1, "address": 1}
+    ).to_list(None)
+    return {lead["lead_id"]: lead for lead in leads}
+
+
+async def wait_for_previous_writer(lease: RunLease, chunk: dict):
+    """
+    Wait until a chunk left "writing" by an earlier owner of the run can no
+    longer be in flight: its writer had to renew the lease when it started the
+    chunk, so a full lease period after that start it is dead or fenced off.
+    The lease is kept renewed meanwhile. Chunks without an owner were
+    released by a process that had stopped writing them.
+    """
+    if chunk.get("lease_owner") in (None, lease.owner):
+        return
+    started_at = chunk.get("started_at") or datetime.min
+    while True:
+        remaining = (started_at + timedelta(minutes=RUN_LEASE_MINUTES) - datetime.utcnow()).total_seconds()
+        if remaining <= 0:
+            return
+        await lease.ensure_held()
+        await asyncio.sleep(min(remaining, RUN_LEASE_RENEW_SECONDS))
+
+
+async def repair_interrupted_chunk(db, lease: RunLease, chunk: dict):
+    """
+    Undo a chunk whose writes were cut off midway
+    Only done while holding the run's lease, once the chunk's previous writer
+    can no longer be writing. Its CSV files and assignments are removed by
+    their planned file ids, and the distribution counts and assigned member
+    sets of its leads are rebuilt from member_leads.
+    """
+    await wait_for_previous_writer(lease, chunk)
+    await lease.ensure_held()
+    file_ids = [member["file_id"] for member in chunk["members"]]
+    lead_ids = list({lead_id for member in chunk["members"] for lead_id in member["lead_ids"]})
+
+    await db.member_csv_files.delete_many({"file_id": {"$in": file_ids}})
+    await db.member_leads.delete_many({"csv_file_id": {"$in": file_ids}})
+
+    recounted = {lead_id: (0, []) for lead_id in lead_ids}
+    async for row in db.member_leads.aggregate([
+        {"$match": {"lead_id": {"$in": lead_ids}}},
+        {"$group": {"_id": "$lead_id", "count": {"$sum": 1}, "members": {"$addToSet": "$member_address"}}}
+    ]):
+        recounted[row["_id"]] = (row["count"], row["members"])
+    member_ids = await lookup_member_ids(db, {address for _, members in recounted.values() for address in members})
+    if recounted:
+        await db.leads.bulk_write(
+            [
+                UpdateOne({"lead_id": lead_id}, {"$set": {
+                    "distribution_count": count,
+                    "assigned_members": sorted({member_ids[address] for address in members if address in member_ids})
+                }})
+                for lead_id, (count, members) in recounted.items()
+            ],
+            ordered=False
+        )
+    logger.info(f"Repaired interrupted chunk {chunk['chunk_number']} of run {chunk['run_id']}")
+
+
+async def mark_chunk_writing(db, lease: RunLease, chunk_number: int):
+    """Record that this lease owner starts writing a chunk (raises RunLeaseLost after a takeover)"""
+    await lease.ensure_held()
+    await db.distribution_run_chunks.update_one(
+        {"run_id": lease.run_id, "chunk_number": chunk_number},
+        {"$set": {"status": "writing", "started_at": datetime.utcnow(), "lease_owner": lease.owner}}
+    )
+
+
+async def commit_chunk(db, lease: RunLease, chunk: dict, batch_result: dict):
+    """Mark a chunk committed and advance the run's progress cursor"""
+    result = await db.distribution_run_chunks.update_one(
+        {"run_id": lease.run_id, "chunk_number": chunk["chunk_number"], "status": "writing", "lease_owner": lease.owner},
+        {"$set": {
+            "status": "committed",
+            "committed_at": datetime.utcnow(),
+            "assignments": batch_result["assignments"],
+            "errors": batch_result["errors"]
+        }}
+    )
+    if result.matched_count == 0:
+        raise RunLeaseLost(f"Chunk {chunk['chunk_number']} of run {lease.run_id} was taken over by another process")
+    await db.distribution_runs.update_one(
+        {"run_id": lease.run_id},
+        {
+            "$inc": {
+                "chunks_committed": 1,
+                "chunks_failed": 1 if batch_result["errors"] else 0,
+                "members_committed": len(chunk["members"]),
+                "assignments_committed": batch_result["assignments"]
+            },
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+    )
+
+
+async def get_failed_chunks(db, run_id: str) -> List[dict]:
+    """Committed chunks whose writes reported errors"""
+    return await db.distribution_run_chunks.find(
+        {"run_id": run_id, "errors.0": {"$exists": True}},
+        {"_id": 0, "chunk_number": 1, "assignments": 1, "errors": 1}
+    ).sort("chunk_number", 1).to_list(None)
+
+
+async def finish_distribution_run(
+    db,
+    run_id: str,
+    status: str = "completed",
+    error: Optional[str] = None,
+    lease_owner: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Close a run; its plan chunks are dropped once it completes
+    With lease_owner, only closes a run still held under that lease.
+    """
+    update = {"status": status, "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+    if error:
+        update["error_message"] = error
+    query = {"run_id": run_id}
+    if lease_owner is not None:
+        query.update({"status": "running", "lease_owner": lease_owner})
+    run = await db.distribution_runs.find_one_and_update(
+        query,
+        {"$set": update},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if run is not None and status == "completed":
+        await db.distribution_run_chunks.delete_many({"run_id": run_id})
+    return run
+
+
+async def release_distribution_run(db, run: dict, error: str):
+    """
+    Leave a failed run resumable by expiring its lease right away (if still
+    held). Only called once its chunk writers have stopped, so the chunks it
+    left "writing" can be repaired without waiting.
+    """
+    result = await db.distribution_runs.update_one(
+        {"run_id": run["run_id"], "status": "running", "lease_owner": run.get("lease_owner")},
+        {"$set": {"lease_expires_at": datetime.utcnow(), "last_error": error, "updated_at": datetime.utcnow()}}
+    )
+    if result.matched_count:
+        await db.distribution_run_chunks.update_many(
+            {"run_id": run["run_id"], "status": "writing", "lease_owner": run.get("lease_owner")},
+            {"$set": {"lease_owner": None}}
+        )
+
+
+async def claim_distribution_run(db, run_id: str) -> Optional[dict]:
+    """
+    Take over a running run whose lease has expired
+    Claiming is atomic and hands out a new owner token, so only one process
+    resumes a given run and the previous owner can no longer write to it.
+    """
+    now = datetime.utcnow()
+    return await db.distribution_runs.find_one_and_update(
+        {"run_id": run_id, "status": "running", "lease_expires_at": {"$lte": now}},
+        {
+            "$set": {"lease_owner": _new_lease_owner(), "lease_expires_at": _lease_expiry(), "resumed_at": now},
+            "$inc": {"resume_count": 1}
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def claim_interrupted_runs(db) -> List[dict]:
+    """Claim every running run whose lease has expired"""
+    claimed = []
+    stale_runs = await db.distribution_runs.find(
+        {"status": "running", "lease_expires_at": {"$lte": datetime.utcnow()}},
+        {"_id": 0, "run_id": 1, "resume_count": 1}
+    ).to_list(None)
+
+    for stale in stale_runs:
+        if stale.get("resume_count", 0) >= MAX_RUN_RESUMES:
+            await finish_distribution_run(db, stale["run_id"], "failed", "Gave up after repeated resumes")
+            continue
+        run = await claim_distribution_run(db, stale["run_id"])
+        if run:
+            claimed.append(run)
+    return claimed
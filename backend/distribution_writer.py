@@ -0,0 +1,159 @@
+"""
+Batched persistence for lead distribution runs
+
+Each member batch is written with one insert_many for member_leads
+assignments, one insert_many for CSV file records and one grouped bulk_write
+of distribution_count increments, instead of one round-trip per lead.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from csv_change_feed import stamp_csv_file_changes
+
+logger = logging.getLogger(__name__)
+
+MEMBER_WRITE_BATCH_SIZE = 50  # Members persisted per batch
+DISTRIBUTION_CONCURRENCY = int(os.getenv("DISTRIBUTION_CONCURRENCY", "1"))  # Member chunks persisted at once
+DISTRIBUTION_WRITE_RATE = int(os.getenv("DISTRIBUTION_WRITE_RATE", "20000"))  # Documents written per second (0 = unlimited)
+
+
+class WriteRateLimiter:
+    """
+    Token bucket shared by concurrent chunk writers, in documents per second.
+    Requests larger than one second of budget are allowed and paid back as debt.
+    """
+
+    def __init__(self, rate_per_second: int = DISTRIBUTION_WRITE_RATE):
+        self.rate = rate_per_second
+        self.tokens = float(rate_per_second)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: int):
+        if self.rate <= 0 or amount <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                needed = min(amount, self.rate)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+async def run_partitioned(
+    chunks: Sequence,
+    worker: Callable[[int, object], Awaitable[Dict]],
+    concurrency: int = DISTRIBUTION_CONCURRENCY
+) -> List[Dict]:
+    """
+    Run worker(chunk_number, chunk) over all chunks with bounded concurrency
+    Returns the worker results in chunk order.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run(chunk_number: int, chunk) -> Dict:
+        async with semaphore:
+            return await worker(chunk_number, chunk)
+    
+    tasks = [asyncio.ensure_future(run(number, chunk)) for number, chunk in enumerate(chunks, start=1)]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # Stop the remaining chunks so a failed run does not keep writing behind the caller
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _describe_error(error: Exception) -> str:
+    """Short description of a write error for run reports"""
+    if isinstance(error, BulkWriteError):
+        details = error.details or {}
+        return f"{len(details.get('writeErrors', []))} write errors, first: {(details.get('writeErrors') or [{}])[0].get('errmsg', str(error))}"
+    return str(error)
+
+
+async def write_distribution_batch(
+    db,
+    batch_number: int,
+    csv_file_docs: List[dict],
+    member_lead_docs: List[dict],
+    lead_increments: Counter,
+    rate_limiter: Optional[WriteRateLimiter] = None,
+    lead_members: Optional[Dict[str, List[int]]] = None
+) -> Dict:
+    """
+    Persist one member batch. Failures are captured per collection and
+    returned (not raised) so the run can report them per batch.
+    lead_members: lead_id -> interned member ids added to the lead's
+    assigned_members set in the same update as its count
+    """
+    result = {
+        "batch": batch_number,
+        "csv_files": 0,
+        "assignments": 0,
+        "lead_updates": 0,
+        "errors": []
+    }
+    
+    if member_lead_docs:
+        try:
+            if rate_limiter:
+                await rate_limiter.acquire(len(member_lead_docs))
+            insert_result = await db.member_leads.insert_many(member_lead_docs, ordered=False)
+            result["assignments"] = len(insert_result.inserted_ids)
+        except (BulkWriteError, PyMongoError) as e:
+            if isinstance(e, BulkWriteError):
+                result["assignments"] = e.details.get("nInserted", 0)
+            result["errors"].append({"collection": "member_leads", "error": _describe_error(e)})
+    
+    # Files go in after their assignments, so a visible file always renders in full
+    if csv_file_docs:
+        try:
+            if rate_limiter:
+                await rate_limiter.acquire(len(csv_file_docs))
+            insert_result = await db.member_csv_files.insert_many(csv_file_docs, ordered=False)
+            result["csv_files"] = len(insert_result.inserted_ids)
+        except (BulkWriteError, PyMongoError) as e:
+            if isinstance(e, BulkWriteError):
+                result["csv_files"] = e.details.get("nInserted", 0)
+            result["errors"].append({"collection": "member_csv_files", "error": _describe_error(e)})
+        # Change feed position, stamped by the database once the files are in
+        try:
+            await stamp_csv_file_changes(db, [doc["file_id"] for doc in csv_file_docs])
+        except PyMongoError as e:
+            result["errors"].append({"collection": "member_csv_files", "error": f"Change feed stamp failed: {str(e)}"})
+    
+    if lead_increments:
+        operations = []
+        for lead_id, count in lead_increments.items():
+            update = {"$inc": {"distribution_count": count}}
+            if lead_members and lead_members.get(lead_id):
+                update["$addToSet"] = {"assigned_members": {"$each": lead_members[lead_id]}}
+            operations.append(UpdateOne({"lead_id": lead_id}, update))
+        try:
+            if rate_limiter:
+                await rate_limiter.acquire(len(operations))
+            bulk_result = await db.leads.bulk_write(operations, ordered=False)
+            result["lead_updates"] = bulk_result.modified_count
+        except (BulkWriteError, PyMongoError) as e:
+            if isinstance(e, BulkWriteError):
+                result["lead_updates"] = e.details.get("nModified", 0)
+            result["errors"].append({"collection": "leads", "error": _describe_error(e)})
+    
+    if result["errors"]:
+        logger.error(f"Distribution batch {batch_number} had write failures: {result['errors']}")
+    
+    return result
@@ -0,0 +1,265 @@
+"""
+Queued notification and email fan-out
+
+Distribution runs do not send email themselves: they bulk-insert in-app
+notifications and queue emails in the `email_outbox` collection, where a
+unique dedupe key drops repeats (e.g. a replayed chunk or a schedule that
+runs twice in a day). A background worker claims queued emails in batches and
+sends them over a small pool of long-lived SMTP connections, retrying
+failures with backoff, so run completion never waits on SMTP.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import aiosmtplib
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from email_service import (
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_USERNAME,
+    SMTP_PASSWORD,
+    build_email_message,
+    build_history_notification
+)
+
+logger = logging.getLogger(__name__)
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))  # Concurrent SMTP connections
+OUTBOX_BATCH_SIZE = 100  # Emails claimed per batch
+OUTBOX_POLL_SECONDS = 30  # Idle wait between checks when not woken
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_CLAIM_TIMEOUT_MINUTES = 10  # Emails left "sending" this long (e.g. by a crash) are retried
+SENT_RETENTION_DAYS = 30
+
+_DUPLICATE_KEY_ERROR = 11000
+
+
+async def create_email_outbox_indexes(db):
+    """Create indexes for the email outbox"""
+    await db.email_outbox.create_index("email_id", unique=True)
+    await db.email_outbox.create_index("dedupe_key", unique=True)
+    await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.email_outbox.create_index("claim_id")
+    await db.email_outbox.create_index("sent_at", expireAfterSeconds=SENT_RETENTION_DAYS * 24 * 3600)
+
+
+def build_outbox_email(
+    to_email: str,
+    subject: str,
+    body: str,
+    notification_type: str,
+    dedupe_key: str,
+    store_in_history: bool = True
+) -> dict:
+    """Outbox document for one email; emails sharing a dedupe_key are sent once"""
+    now = datetime.utcnow()
+    return {
+        "email_id": str(uuid.uuid4()),
+        "dedupe_key": dedupe_key,
+        "to_email": to_email,
+        "subject": subject,
+        "body": body,
+        "notification_type": notification_type,
+        "store_in_history": store_in_history,
+        "status": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now
+    }
+
+
+async def enqueue_notifications(db, notifications: List[dict], emails: List[dict]) -> Dict:
+    """
+    Bulk-insert in-app notifications and queue emails for the worker
+    Emails whose dedupe key is already queued or sent are dropped; the
+    history notification is stored only for emails actually queued.
+    """
+    result = {"notifications": 0, "emails_queued": 0, "emails_deduplicated": 0}
+    if notifications:
+        inserted = await db.notifications.insert_many(notifications, ordered=False)
+        result["notifications"] = len(inserted.inserted_ids)
+
+    if emails:
+        duplicates = set()
+        try:
+            await db.email_outbox.insert_many(emails, ordered=False)
+        except BulkWriteError as e:
+            other_errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != _DUPLICATE_KEY_ERROR]
+            if other_errors:
+                raise
+            duplicates = {error["index"] for error in e.details["writeErrors"]}
+        queued = [email for index, email in enumerate(emails) if index not in duplicates]
+        result["emails_queued"] = len(queued)
+        result["emails_deduplicated"] = len(duplicates)
+
+        history = [
+            build_history_notification(email["to_email"], email["subject"], email["body"], email["notification_type"])
+            for email in queued if email.get("store_in_history")
+        ]
+        if history:
+            await db.notifications.insert_many(history, ordered=False)
+
+    if result["emails_queued"] and _worker is not None:
+        _worker.wake()
+    return result
+
+
+class _PooledSmtpConnection:
+    """One long-lived SMTP session, reopened when the server drops it"""
+
+    def __init__(self):
+        self.smtp: Optional[aiosmtplib.SMTP] = None
+
+    async def _connect(self):
+        self.smtp = aiosmtplib.SMTP(
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            username=SMTP_USERNAME,
+            password=SMTP_PASSWORD,
+            start_tls=True
+        )
+        await self.smtp.connect()
+
+    async def send(self, message):
+        if self.smtp is None or not self.smtp.is_connected:
+            await self._connect()
+        try:
+            await self.smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Idle sessions get closed by the server - reconnect once
+            await self._connect()
+            await self.smtp.send_message(message)
+
+    async def close(self):
+        if self.smtp is not None and self.smtp.is_connected:
+            try:
+                await self.smtp.quit()
+            except aiosmtplib.SMTPException:
+                self.smtp.close()
+        self.smtp = None
+
+
+class EmailOutboxWorker:
+    """Background sender draining email_outbox over pooled SMTP connections"""
+
+    def __init__(self, db, pool_size: int = SMTP_POOL_SIZE, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.db = db
+        self.connections = [_PooledSmtpConnection() for _ in range(max(1, pool_size))]
+        self.batch_size = batch_size
+        self.wake_event = asyncio.Event()
+        self.stopping = False
+        self.task: Optional[asyncio.Task] = None
+
+    def wake(self):
+        self.wake_event.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.stopping = True
+        self.wake()
+        if self.task is not None:
+            await self.task
+        for connection in self.connections:
+            await connection.close()
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                emails = await self._claim_batch()
+                if emails:
+                    await self._send_batch(emails)
+                    continue
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {str(e)}")
+            try:
+                await asyncio.wait_for(self.wake_event.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wake_event.clear()
+
+    async def _claim_batch(self) -> List[dict]:
+        """Atomically mark a batch of due emails as sending for this worker"""
+        now = datetime.utcnow()
+        claimable = {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lte": now - timedelta(minutes=OUTBOX_CLAIM_TIMEOUT_MINUTES)}}
+        ]}
+        due = await self.db.email_outbox.find(
+            claimable, {"_id": 0, "email_id": 1}
+        ).limit(self.batch_size).to_list(None)
+        if not due:
+            return []
+
+        # Re-check the claim condition so concurrent workers never share an email
+        claim_id = str(uuid.uuid4())
+        await self.db.email_outbox.update_many(
+            {"email_id": {"$in": [email["email_id"] for email in due]}, **claimable},
+            {"$set": {"status": "sending", "claim_id": claim_id, "claimed_at": now}}
+        )
+        return await self.db.email_outbox.find({"claim_id": claim_id}, {"_id": 0}).to_list(None)
+
+    async def _send_batch(self, emails: List[dict]):
+        queue: asyncio.Queue = asyncio.Queue()
+        for email in emails:
+            queue.put_nowait(email)
+        outcomes: List[UpdateOne] = []
+        sent = 0
+
+        async def sender(connection: _PooledSmtpConnection):
+            nonlocal sent
+            while not queue.empty():
+                email = queue.get_nowait()
+                try:
+                    await connection.send(build_email_message(email["to_email"], email["subject"], email["body"]))
+                    outcomes.append(UpdateOne(
+                        {"email_id": email["email_id"]},
+                        {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$inc": {"attempts": 1}}
+                    ))
+                    sent += 1
+                except Exception as e:
+                    outcomes.append(self._failure_update(email, e))
+                    await connection.close()
+
+        await asyncio.gather(*(sender(connection) for connection in self.connections))
+        await self.db.email_outbox.bulk_write(outcomes, ordered=False)
+        logger.info(f"Email outbox: sent {sent} of {len(emails)} emails")
+
+    @staticmethod
+    def _failure_update(email: dict, error: Exception) -> UpdateOne:
+        attempts = email.get("attempts", 0) + 1
+        logger.error(f"Failed to send email to {email['to_email']} (attempt {attempts}): {str(error)}")
+        update = {"attempts": attempts, "last_error": str(error)}
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            update["status"] = "failed"
+        else:
+            update["status"] = "queued"
+            update["next_attempt_at"] = datetime.utcnow() + timedelta(minutes=2 ** attempts)
+        return UpdateOne({"email_id": email["email_id"]}, {"$set": update})
+
+
+_worker: Optional[EmailOutboxWorker] = None
+
+
+async def start_email_outbox_worker(db):
+    """Start the process-wide outbox worker (idempotent)"""
+    global _worker
+    if _worker is None:
+        _worker = EmailOutboxWorker(db)
+        _worker.start()
+        logger.info("Email outbox worker started")
+
+
+async def stop_email_outbox_worker():
+    """Stop the outbox worker and close its SMTP connections"""
+    global _worker
+    if _worker is not None:
+        await _worker.stop()
+        _worker = None
@@ -58,20 +58,38 @@ async def store_notification(user_email: str, subject: str, body: str, notificat
     """Store notification in database for history"""
     try:
         db = get_db()
-        notification = {
-            "notification_id": str(uuid.uuid4()),
-            "user_email": user_email,
-            "subject": subject,
-            "body": body,
-            "type": notification_type,
-            "read": False,
-            "created_at": datetime.utcnow().isoformat(),
-        }
+        notification = build_history_notification(user_email, subject, body, notification_type)
         await db.notifications.insert_one(notification)
         logger.info(f"Stored notification for {user_email}: {subject}")
     except Exception as e:
         logger.error(f"Failed to store notification: {str(e)}")
 
+def build_email_message(to_email: str, subject: str, body: str, html: bool = False) -> MIMEMultipart:
+    """Build the MIME message for an outgoing email"""
+    message = MIMEMultipart("alternative")
+    message["From"] = f"{SMTP_FROM_NAME} <{SMTP_FROM_EMAIL}>"
+    message["To"] = to_email
+    message["Subject"] = subject
+    
+    # Add body
+    if html:
+        message.attach(MIMEText(body, "html"))
+    else:
+        message.attach(MIMEText(body, "plain"))
+    return message
+
+def build_history_notification(user_email: str, subject: str, body: str, notification_type: str = "general") -> dict:
+    """Notification history document as stored by store_notification"""
+    return {
+        "notification_id": str(uuid.uuid4()),
+        "user_email": user_email,
+        "subject": subject,
+        "body": body,
+        "type": notification_type,
+        "read": False,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
 async def send_email(to_email: str, subject: str, body: str, html: bool = False, notification_type: str = "general", store_in_history: bool = True):
     """Send email via SMTP and optionally store in notification history"""
     try:
@@ -79,16 +97,7 @@ async def send_email(to_email: str, subject: str, body: str, html: bool = False,
         if store_in_history:
             await store_notification(to_email, subject, body, notification_type)
         # Create message
-        message = MIMEMultipart("alternative")
-        message["From"] = f"{SMTP_FROM_NAME} <{SMTP_FROM_EMAIL}>"
-        message["To"] = to_email
-        message["Subject"] = subject
-        
-        # Add body
-        if html:
-            message.attach(MIMEText(body, "html"))
-        else:
-            message.attach(MIMEText(body, "plain"))
+        message = build_email_message(to_email, subject, body, html)
         
         # Send email
         await aiosmtplib.send(
@@ -126,8 +135,8 @@ Proleads Network Team
 """
     return await send_email(to_email, subject, body, notification_type="new_referral")
 
-async def send_lead_distribution_email(to_email: str, username: str, lead_count: int, csv_filename: str):
-    """Send email when new leads are distributed"""
+def lead_distribution_email_content(username: str, lead_count: int, csv_filename: str):
+    """Subject and body of the new leads email"""
     subject = f"📋 {lead_count} New Leads Distributed to Your Account"
     body = f"""Hello {username},
 
@@ -143,6 +152,11 @@ Start reaching out to these leads and grow your business!
 Best regards,
 Proleads Network Team
 """
+    return subject, body
+
+async def send_lead_distribution_email(to_email: str, username: str, lead_count: int, csv_filename: str):
+    """Send email when new leads are distributed"""
+    subject, body = lead_distribution_email_content(username, lead_count, csv_filename)
     return await send_email(to_email, subject, body, notification_type="lead_distribution")
 
 async def send_payment_confirmation_email(to_email: str, username: str, tier: str, amount: float):
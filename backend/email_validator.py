@@ -1,17 +1,105 @@
 """
 Email validation utilities using Rapid Email Verifier API
 """
+import os
 import re
+import math
+import time
+import random
 import httpx
 import asyncio
-from typing import Tuple, Dict, List
+from collections import OrderedDict, Counter
+from typing import Tuple, Dict, List, Optional
 import logging
 
+try:
+    import dns.asyncresolver
+    import dns.resolver
+    import dns.exception
+except ImportError:  # dnspython is optional - hybrid mode falls back to the remote API
+    dns = None
+
 logger = logging.getLogger(__name__)
 
 # Rapid Email Verifier API Configuration
-RAPID_EMAIL_API_URL = "https://rapid-email-verifier.fly.dev/api"
+# Override RAPID_EMAIL_API_URL to point the validator at a local stub server
+RAPID_EMAIL_API_URL = os.getenv("RAPID_EMAIL_API_URL", "https://rapid-email-verifier.fly.dev/api")
 BATCH_SIZE = 100  # API supports up to 100 emails per batch
+BATCH_CONCURRENCY = int(os.getenv("EMAIL_VALIDATION_CONCURRENCY", "8"))  # Batches in flight at once
+MAX_RETRIES = 4  # Retries per batch on 429/5xx or transport errors
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 10.0
+
+# Validation modes for analyze_csv_emails
+VALIDATION_MODE_OFFLINE = "offline"  # Local tier only, no network calls
+VALIDATION_MODE_HYBRID = "hybrid"    # Local tier + DNS, remote API only for unknowns
+VALIDATION_MODE_REMOTE = "remote"    # Everything through the remote API
+VALIDATION_MODES = (VALIDATION_MODE_OFFLINE, VALIDATION_MODE_HYBRID, VALIDATION_MODE_REMOTE)
+
+# Local validation tier configuration
+DISPOSABLE_DOMAINS_FILE = os.path.join(os.path.dirname(__file__), "disposable_domains.txt")
+ROLE_BASED_LOCAL_PARTS = frozenset({
+    "abuse", "admin", "administrator", "billing", "contact", "enquiries", "help",
+    "hello", "hostmaster", "info", "inquiries", "jobs", "mail", "marketing",
+    "no-reply", "noreply", "office", "postmaster", "privacy", "root", "sales",
+    "security", "support", "team", "webmaster"
+})
+DOMAIN_CACHE_TTL_SECONDS = int(os.getenv("EMAIL_DOMAIN_CACHE_TTL", "86400"))
+DOMAIN_CACHE_MAX_ENTRIES = 100000
+DNS_CONCURRENCY = 20
+DNS_TIMEOUT_SECONDS = 3.0
+
+# Sampling preview configuration
+PREVIEW_SAMPLE_SIZE = 1500
+PREVIEW_MAX_STRATA = 50  # Largest domains get their own stratum, the rest are pooled
+PREVIEW_Z_SCORE = 1.96  # 95% confidence intervals
+
+_disposable_domains: Optional[frozenset] = None
+# domain -> (expires_at, {"domain_exists": bool, "mx_records": bool})
+_domain_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+# Shared HTTP client - lazy initialization, reused across calls for keep-alive
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared validation HTTP client (lazy initialization)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(
+                max_connections=BATCH_CONCURRENCY * 2,
+                max_keepalive_connections=BATCH_CONCURRENCY
+            )
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (called on application shutdown)"""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+
+def _is_retryable_status(status_code: int) -> bool:
+    """429 and 5xx responses are worth retrying, everything else is final"""
+    return status_code == 429 or 500 <= status_code < 600
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Full-jitter exponential backoff, honouring a numeric Retry-After header
+    """
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX_SECONDS, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(0, ceiling)
 
 
 def validate_email_format(email: str) -> Tuple[bool, str]:
@@ -51,30 +139,200 @@ def validate_email_format(email: str) -> Tuple[bool, str]:
     return True, ""
 
 
+def get_disposable_domains() -> frozenset:
+    """Load the bundled disposable-domain list (lazy, loaded once)"""
+    global _disposable_domains
+    if _disposable_domains is None:
+        domains = set()
+        try:
+            with open(DISPOSABLE_DOMAINS_FILE, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip().lower()
+                    if line and not line.startswith("#"):
+                        domains.add(line)
+        except OSError as e:
+            logger.error(f"Failed to load disposable domain list: {str(e)}")
+        _disposable_domains = frozenset(domains)
+    return _disposable_domains
+
+
+def is_disposable_domain(domain: str) -> bool:
+    """Check a domain (or any parent domain) against the disposable list"""
+    disposable = get_disposable_domains()
+    parts = domain.split(".")
+    return any(".".join(parts[i:]) in disposable for i in range(len(parts) - 1))
+
+
+def is_role_based_local_part(local_part: str) -> bool:
+    """Detect role accounts such as info@, support@, noreply@"""
+    base = local_part.split("+", 1)[0]
+    return base in ROLE_BASED_LOCAL_PARTS
+
+
+def get_cached_domain_verdict(domain: str) -> Optional[Dict]:
+    """Return a cached domain/MX verdict, or None if missing or expired"""
+    entry = _domain_cache.get(domain)
+    if entry is None:
+        return None
+    expires_at, verdict = entry
+    if expires_at < time.monotonic():
+        _domain_cache.pop(domain, None)
+        return None
+    _domain_cache.move_to_end(domain)
+    return verdict
+
+
+def cache_domain_verdict(domain: str, domain_exists: bool, mx_records: bool):
+    """Store a domain/MX verdict (LRU bounded)"""
+    _domain_cache[domain] = (
+        time.monotonic() + DOMAIN_CACHE_TTL_SECONDS,
+        {"domain_exists": domain_exists, "mx_records": mx_records}
+    )
+    _domain_cache.move_to_end(domain)
+    while len(_domain_cache) > DOMAIN_CACHE_MAX_ENTRIES:
+        _domain_cache.popitem(last=False)
+
+
+async def resolve_domain_verdict(domain: str) -> Optional[Dict]:
+    """
+    Resolve MX (falling back to A) records for a domain and cache the verdict.
+    Returns None when DNS is unavailable or inconclusive.
+    """
+    if dns is None:
+        return None
+    
+    resolver = dns.asyncresolver.Resolver()
+    resolver.lifetime = DNS_TIMEOUT_SECONDS
+    try:
+        await resolver.resolve(domain, "MX")
+        cache_domain_verdict(domain, True, True)
+        return get_cached_domain_verdict(domain)
+    except dns.resolver.NXDOMAIN:
+        cache_domain_verdict(domain, False, False)
+        return get_cached_domain_verdict(domain)
+    except dns.resolver.NoAnswer:
+        pass
+    except (dns.exception.DNSException, OSError):
+        return None
+    
+    # No MX records - the domain can still receive mail via its A record
+    try:
+        await resolver.resolve(domain, "A")
+        cache_domain_verdict(domain, True, False)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        cache_domain_verdict(domain, False, False)
+    except (dns.exception.DNSException, OSError):
+        return None
+    return get_cached_domain_verdict(domain)
+
+
+async def validate_emails_local(emails: List[str], resolve_dns: bool = False) -> List[Dict]:
+    """
+    Offline validation tier: syntax, disposable domains, role accounts and
+    cached domain/MX verdicts. With resolve_dns, uncached domains are looked up
+    once each. Results are in input order; status is "UNKNOWN" when the domain
+    verdict could not be determined locally.
+    """
+    parsed = []
+    domains_to_resolve = set()
+    for email in emails:
+        normalized = (email or "").strip().lower()
+        format_valid, format_message = validate_email_format(normalized)
+        domain = normalized.rsplit("@", 1)[1] if format_valid else ""
+        parsed.append((email, normalized, format_valid, format_message, domain))
+        if format_valid and get_cached_domain_verdict(domain) is None and not is_disposable_domain(domain):
+            domains_to_resolve.add(domain)
+    
+    if resolve_dns and domains_to_resolve and dns is not None:
+        semaphore = asyncio.Semaphore(DNS_CONCURRENCY)
+        
+        async def resolve(domain: str):
+            async with semaphore:
+                await resolve_domain_verdict(domain)
+        
+        await asyncio.gather(*(resolve(domain) for domain in domains_to_resolve))
+    
+    results = []
+    for email, normalized, format_valid, format_message, domain in parsed:
+        if not format_valid:
+            results.append({
+                "email": email,
+                "valid": False,
+                "status": "INVALID_FORMAT",
+                "is_disposable": False,
+                "is_role_based": False,
+                "source": "local",
+                "checks": {"syntax": False, "message": format_message}
+            })
+            continue
+        
+        local_part = normalized.rsplit("@", 1)[0]
+        disposable = is_disposable_domain(domain)
+        role_based = is_role_based_local_part(local_part)
+        # Disposable providers are live mail domains by definition
+        verdict = {"domain_exists": True, "mx_records": True} if disposable else get_cached_domain_verdict(domain)
+        
+        checks = {
+            "syntax": True,
+            "is_disposable": disposable,
+            "is_role_based": role_based
+        }
+        if verdict is None:
+            status = "UNKNOWN"
+            valid = True  # Format-valid; the domain is unverified
+        else:
+            checks.update(verdict)
+            valid = verdict["domain_exists"]
+            if not valid:
+                status = "INVALID_DOMAIN"
+            elif disposable:
+                status = "DISPOSABLE"
+            else:
+                status = "VALID"
+        
+        results.append({
+            "email": email,
+            "valid": valid,
+            "status": status,
+            "is_disposable": disposable,
+            "is_role_based": role_based,
+            "source": "local",
+            "checks": checks
+        })
+    
+    return results
+
+
 async def validate_email_api(email: str, timeout: int = 10) -> Dict:
     """
     Validate email using Rapid Email Verifier API
     Returns: validation result dict
     """
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        client = get_http_client()
+        response = None
+        for attempt in range(MAX_RETRIES + 1):
             response = await client.get(
                 f"{RAPID_EMAIL_API_URL}/validate",
-                params={"email": email}
+                params={"email": email},
+                timeout=timeout
             )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Email validation API error: {response.status_code}")
-                return {
-                    "valid": False,
-                    "email": email,
-                    "validations": {
-                        "syntax": False
-                    },
-                    "status": "API_ERROR"
-                }
+            if not _is_retryable_status(response.status_code) or attempt == MAX_RETRIES:
+                break
+            await asyncio.sleep(_backoff_delay(attempt, response.headers.get("Retry-After")))
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.error(f"Email validation API error: {response.status_code}")
+            return {
+                "valid": False,
+                "email": email,
+                "validations": {
+                    "syntax": False
+                },
+                "status": "API_ERROR"
+            }
     except Exception as e:
         logger.error(f"Email validation failed for {email}: {str(e)}")
         return {
@@ -87,45 +345,111 @@ async def validate_email_api(email: str, timeout: int = 10) -> Dict:
         }
 
 
-async def validate_emails_batch(emails: List[str], timeout: int = 30) -> Dict:
+async def _validate_batch_with_retry(
+    client: httpx.AsyncClient,
+    batch: List[str],
+    timeout: int,
+    summary: Dict
+) -> List[Dict]:
+    """
+    POST one batch, retrying 429/5xx and transport errors with jittered backoff.
+    Returns one result per input email, in input order. Emails the API did not
+    return a result for are marked individually as API_ERROR.
+    """
+    last_error = None
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await client.post(
+                f"{RAPID_EMAIL_API_URL}/validate/batch",
+                json={"emails": batch},
+                timeout=timeout
+            )
+        except httpx.HTTPError as e:
+            last_error = str(e)
+            response = None
+        
+        if response is not None and response.status_code == 200:
+            results_by_email = {}
+            for result in response.json().get("results", []):
+                results_by_email.setdefault(result.get("email", ""), result)
+            
+            ordered = []
+            for email in batch:
+                result = results_by_email.get(email)
+                if result is None:
+                    summary["emails_failed"] += 1
+                    result = {"email": email, "valid": False, "status": "API_ERROR"}
+                ordered.append(result)
+            summary["batches_succeeded"] += 1
+            return ordered
+        
+        if response is not None:
+            last_error = f"HTTP {response.status_code}"
+            if not _is_retryable_status(response.status_code):
+                break
+        
+        if attempt < MAX_RETRIES:
+            summary["retries"] += 1
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            await asyncio.sleep(_backoff_delay(attempt, retry_after))
+    
+    logger.error(f"Batch validation API error after retries: {last_error}")
+    summary["batches_failed"] += 1
+    summary["emails_failed"] += len(batch)
+    return [
+        {"email": email, "valid": False, "status": "API_ERROR"}
+        for email in batch
+    ]
+
+
+async def validate_emails_batch(emails: List[str], timeout: int = 30, concurrency: int = BATCH_CONCURRENCY) -> Dict:
     """
     Validate multiple emails using batch API
-    Returns: batch validation results
+    Batches run concurrently (bounded by `concurrency`) on the shared client.
+    Returns: batch validation results (in input order) plus a failure summary
     """
+    summary = {
+        "batches": 0,
+        "batches_succeeded": 0,
+        "batches_failed": 0,
+        "emails_failed": 0,
+        "retries": 0
+    }
     try:
         # Split into batches of 100
         batches = [emails[i:i + BATCH_SIZE] for i in range(0, len(emails), BATCH_SIZE)]
+        summary["batches"] = len(batches)
+        
+        client = get_http_client()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run_batch(batch: List[str]) -> List[Dict]:
+            async with semaphore:
+                return await _validate_batch_with_retry(client, batch, timeout, summary)
+        
+        batch_results = await asyncio.gather(*(run_batch(batch) for batch in batches))
+        
         all_results = []
+        for results in batch_results:
+            all_results.extend(results)
+        
+        if summary["emails_failed"]:
+            logger.warning(
+                f"Batch validation: {summary['emails_failed']} of {len(emails)} emails failed "
+                f"({summary['batches_failed']} batches failed, {summary['retries']} retries)"
+            )
         
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            for batch in batches:
-                response = await client.post(
-                    f"{RAPID_EMAIL_API_URL}/validate/batch",
-                    json={"emails": batch}
-                )
-                
-                if response.status_code == 200:
-                    batch_result = response.json()
-                    all_results.extend(batch_result.get("results", []))
-                else:
-                    logger.error(f"Batch validation API error: {response.status_code}")
-                    # Add error results for this batch
-                    for email in batch:
-                        all_results.append({
-                            "email": email,
-                            "valid": False,
-                            "status": "API_ERROR"
-                        })
-        
-        return {"results": all_results}
+        return {"results": all_results, "summary": summary}
         
     except Exception as e:
         logger.error(f"Batch email validation failed: {str(e)}")
+        summary["emails_failed"] = len(emails)
         return {
             "results": [
                 {"email": email, "valid": False, "status": "VALIDATION_ERROR"}
                 for email in emails
-            ]
+            ],
+            "summary": summary
         }
 
 
@@ -170,60 +494,106 @@ async def validate_email_comprehensive(email: str, use_api: bool = True) -> Dict
     return result
 
 
-async def analyze_csv_emails(emails: List[str], use_api: bool = True) -> Dict:
+def _api_result_to_analysis(result: Dict) -> Dict:
+    """Convert a remote API result into the analysis result shape"""
+    email = result.get("email", "")
+    status = result.get("status", "UNKNOWN")
+    validations = result.get("validations", {})
+    
+    # Determine validity based on actual validation checks
+    # Email is valid if it passes syntax AND domain checks
+    syntax_valid = validations.get("syntax", False)
+    domain_valid = validations.get("domain_exists", False)
+    
+    # Email is valid if syntax and domain are good (MX records are optional)
+    is_valid = syntax_valid and domain_valid
+    
+    # Feed the domain verdict back into the local cache
+    if syntax_valid and "domain_exists" in validations and "@" in email:
+        cache_domain_verdict(
+            email.strip().lower().rsplit("@", 1)[1],
+            bool(domain_valid),
+            bool(validations.get("mx_records", False))
+        )
+    
+    return {
+        "email": email,
+        "valid": is_valid,
+        "status": status,
+        "is_disposable": validations.get("is_disposable", False),
+        "is_role_based": validations.get("is_role_based", False),
+        "source": "api",
+        "checks": validations
+    }
+
+
+def _tally_result(stats: Dict, result: Dict):
+    """Add one analysis result to the running statistics"""
+    checks = result.get("checks", {})
+    if result.get("status") in ("API_ERROR", "VALIDATION_ERROR"):
+        stats["api_errors"] += 1
+    elif result.get("valid"):
+        stats["valid"] += 1
+    elif not checks.get("syntax", False):
+        stats["invalid_format"] += 1
+    elif not checks.get("domain_exists", False):
+        stats["invalid_domain"] += 1
+    
+    if result.get("is_disposable", False):
+        stats["disposable"] += 1
+    if result.get("is_role_based", False):
+        stats["role_based"] += 1
+
+
+async def analyze_csv_emails(emails: List[str], use_api: bool = True, mode: Optional[str] = None) -> Dict:
     """
     Analyze a list of emails from CSV
-    Returns statistics and validation results
+    mode: "offline" (local tier only), "hybrid" (local tier + DNS, remote API
+    only for addresses still unknown) or "remote" (remote API for everything).
+    Defaults to "remote" when use_api is set, otherwise format-only checks.
+    Returns statistics and validation results (in input order)
     """
+    if mode is None and use_api:
+        mode = VALIDATION_MODE_REMOTE
+    if mode is not None and mode not in VALIDATION_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(VALIDATION_MODES)}")
+    
     stats = {
         "total": len(emails),
         "valid": 0,
         "invalid_format": 0,
         "invalid_domain": 0,
         "disposable": 0,
-        "role_based": 0
+        "role_based": 0,
+        "api_errors": 0
     }
     
     validation_results = []
+    api_summary = None
     
-    if use_api and len(emails) > 0:
-        # Use batch API for efficiency
-        batch_result = await validate_emails_batch(emails)
+    if mode is not None and len(emails) > 0:
+        if mode == VALIDATION_MODE_REMOTE:
+            results = [None] * len(emails)
+            pending = list(range(len(emails)))
+        else:
+            results = await validate_emails_local(emails, resolve_dns=(mode == VALIDATION_MODE_HYBRID))
+            pending = []
+            if mode == VALIDATION_MODE_HYBRID:
+                pending = [i for i, result in enumerate(results) if result["status"] == "UNKNOWN"]
         
-        for result in batch_result.get("results", []):
-            email = result.get("email", "")
-            status = result.get("status", "UNKNOWN")
-            validations = result.get("validations", {})
-            
-            # Determine validity based on actual validation checks
-            # Email is valid if it passes syntax AND domain checks
-            syntax_valid = validations.get("syntax", False)
-            domain_valid = validations.get("domain_exists", False)
-            mx_valid = validations.get("mx_records", False)
-            
-            # Email is valid if syntax and domain are good (MX records are optional)
-            is_valid = syntax_valid and domain_valid
-            
-            validation_results.append({
-                "email": email,
-                "valid": is_valid,
-                "status": status,
-                "is_disposable": validations.get("is_disposable", False),
-                "is_role_based": validations.get("is_role_based", False),
-                "checks": validations
-            })
-            
-            if is_valid:
-                stats["valid"] += 1
-            elif not syntax_valid:
-                stats["invalid_format"] += 1
-            elif not domain_valid:
-                stats["invalid_domain"] += 1
-            
-            if validations.get("is_disposable", False):
-                stats["disposable"] += 1
-            if validations.get("is_role_based", False):
-                stats["role_based"] += 1
+        if pending:
+            # Use batch API only for addresses the local tier could not settle
+            batch_result = await validate_emails_batch([emails[i] for i in pending])
+            api_summary = batch_result.get("summary")
+            for i, api_result in zip(pending, batch_result.get("results", [])):
+                results[i] = _api_result_to_analysis(api_result)
+        
+        for result in results:
+            validation_results.append(result)
+            _tally_result(stats, result)
+        
+        stats["resolved_locally"] = sum(1 for result in results if result.get("source") == "local")
+        stats["sent_to_api"] = len(pending)
     else:
         # Format-only validation
         for email in emails:
@@ -242,8 +612,146 @@ async def analyze_csv_emails(emails: List[str], use_api: bool = True) -> Dict:
             else:
                 stats["invalid_format"] += 1
     
-    return {
+    analysis = {
         "stats": stats,
         "validation_results": validation_results,
         "recommendation": "proceed" if stats["valid"] == stats["total"] else "review_invalid"
     }
+    if mode is not None:
+        analysis["mode"] = mode
+    if api_summary is not None:
+        analysis["api_summary"] = api_summary
+    return analysis
+
+
+def _stratified_sample(indexes_by_stratum: Dict[str, List[int]], sample_size: int, rng: random.Random) -> Dict[str, List[int]]:
+    """
+    Proportional allocation (at least one row per stratum) of sample_size rows
+    """
+    total = sum(len(indexes) for indexes in indexes_by_stratum.values())
+    sample = {}
+    for stratum, indexes in indexes_by_stratum.items():
+        allocation = max(1, round(sample_size * len(indexes) / total))
+        sample[stratum] = rng.sample(indexes, min(len(indexes), allocation))
+    return sample
+
+
+def _stratified_estimate(strata: List[Tuple[int, List[bool]]], total: int) -> Dict:
+    """
+    Stratified proportion estimate with a normal-approximation confidence
+    interval (finite population corrected). strata: [(N_h, sampled flags)]
+    Strata without sampled results (every lookup failed) are left out and the
+    weights renormalized over the covered strata; with none covered the rate
+    is unknown and the interval spans 0-1.
+    """
+    covered = sum(population for population, flags in strata if flags)
+    if covered == 0:
+        return {"rate": 0.0, "ci_low": 0.0, "ci_high": 1.0, "estimated_count": 0}
+    
+    rate = 0.0
+    variance = 0.0
+    for population, flags in strata:
+        if not flags:
+            continue
+        weight = population / covered
+        p = sum(flags) / len(flags)
+        rate += weight * p
+        if len(flags) > 1:
+            fpc = 1 - len(flags) / population
+            variance += weight ** 2 * fpc * p * (1 - p) / (len(flags) - 1)
+    margin = PREVIEW_Z_SCORE * math.sqrt(variance)
+    return {
+        "rate": round(rate, 4),
+        "ci_low": round(max(0.0, rate - margin), 4),
+        "ci_high": round(min(1.0, rate + margin), 4),
+        "estimated_count": round(rate * total)
+    }
+
+
+async def estimate_csv_email_quality(
+    emails: List[str],
+    sample_size: int = PREVIEW_SAMPLE_SIZE,
+    mode: Optional[str] = VALIDATION_MODE_HYBRID,
+    seed: Optional[int] = None
+) -> Dict:
+    """
+    Fast preview: validate a domain-stratified random sample and estimate
+    valid / disposable / invalid-domain rates with confidence intervals.
+    Format checks and the domain histogram are computed locally over every row.
+    uncovered_share is the share of rows in strata where every sampled lookup
+    failed; the estimates extrapolate to them from the covered strata.
+    """
+    total = len(emails)
+    domain_counts = Counter()
+    indexes_by_domain: Dict[str, List[int]] = {}
+    invalid_format = 0
+    
+    for i, email in enumerate(emails):
+        normalized = (email or "").strip().lower()
+        format_valid, _ = validate_email_format(normalized)
+        if not format_valid:
+            invalid_format += 1
+            continue
+        domain = normalized.rsplit("@", 1)[1]
+        domain_counts[domain] += 1
+        indexes_by_domain.setdefault(domain, []).append(i)
+    
+    # Largest domains are their own strata; the long tail is pooled into one
+    indexes_by_stratum: Dict[str, List[int]] = {}
+    for rank, (domain, _) in enumerate(domain_counts.most_common()):
+        stratum = domain if rank < PREVIEW_MAX_STRATA else "(other)"
+        indexes_by_stratum.setdefault(stratum, []).extend(indexes_by_domain[domain])
+    
+    well_formed = total - invalid_format
+    sampled: Dict[str, List[int]] = {}
+    if well_formed > 0:
+        sampled = _stratified_sample(indexes_by_stratum, min(sample_size, well_formed), random.Random(seed))
+    
+    sample_indexes = [i for indexes in sampled.values() for i in indexes]
+    analysis = await analyze_csv_emails([emails[i] for i in sample_indexes], use_api=True, mode=mode)
+    results_by_index = dict(zip(sample_indexes, analysis["validation_results"]))
+    
+    # Lookup errors say nothing about the address; strata with only errors are not covered
+    usable_by_stratum = {
+        stratum: [i for i in indexes if results_by_index[i].get("status") not in ("API_ERROR", "VALIDATION_ERROR")]
+        for stratum, indexes in sampled.items()
+    }
+    uncovered = sum(len(indexes_by_stratum[stratum]) for stratum, usable in usable_by_stratum.items() if not usable)
+    
+    def estimate(predicate) -> Dict:
+        # Malformed rows are known exactly; estimate the rest from the sample
+        strata = [
+            (len(indexes_by_stratum[stratum]), [predicate(results_by_index[i]) for i in usable])
+            for stratum, usable in usable_by_stratum.items()
+        ]
+        result = _stratified_estimate(strata, well_formed) if well_formed else _stratified_estimate([], 1)
+        scale = well_formed / total if total else 0.0
+        return {
+            "rate": round(result["rate"] * scale, 4),
+            "ci_low": round(result["ci_low"] * scale, 4),
+            "ci_high": round(result["ci_high"] * scale, 4),
+            "estimated_count": result["estimated_count"] if well_formed else 0
+        }
+    
+    return {
+        "preview": True,
+        "mode": mode,
+        "total": total,
+        "sample_size": len(sample_indexes),
+        "confidence_level": 0.95,
+        "estimates": {
+            "valid": estimate(lambda r: bool(r.get("valid"))),
+            "disposable": estimate(lambda r: bool(r.get("is_disposable"))),
+            "role_based": estimate(lambda r: bool(r.get("is_role_based"))),
+            "invalid_domain": estimate(lambda r: not r.get("valid") and r.get("checks", {}).get("syntax", False))
+        },
+        "invalid_format": invalid_format,
+        "uncovered_share": round(uncovered / total, 4) if total else 0.0,
+        "unique_domains": len(domain_counts),
+        "domain_histogram": [
+            {"domain": domain, "count": count}
+            for domain, count in domain_counts.most_common()
+        ],
+        "sample_stats": analysis["stats"],
+        "recommendation": "proceed" if invalid_format == 0 and analysis["stats"]["valid"] == analysis["stats"]["total"] else "review_invalid"
+    }
@@ -0,0 +1,297 @@
+"""
+Capacity-aware lead allocator for lead distributions
+
+Leads that still have distribution slots sit in a ring; each member takes the
+next `quota` live leads from a rotating cursor. This keeps allocation linear in
+the number of assignments, spreads load evenly across leads instead of always
+favouring the first ones, and guarantees:
+  - no lead is given to the same member twice,
+  - no lead exceeds MAX_DISTRIBUTIONS_PER_LEAD distributions in total,
+  - no member receives more than their tier quota.
+"""
+import sys
+import time
+import random
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Leads per member per distribution, by membership tier
+LEADS_PER_TIER = {
+    "bronze": 100,
+    "silver": 250,
+    "gold": 500
+}
+DEFAULT_TIER_QUOTA = 100
+# Order in which tiers are served when leads run short (bronze first, gold last)
+TIER_ALLOCATION_RANK = {
+    "bronze": 0,
+    "silver": 1,
+    "gold": 2
+}
+MAX_DISTRIBUTIONS_PER_LEAD = 10
+
+# Member fields a distribution needs (plan, CSV file and notification email)
+ELIGIBLE_MEMBER_PROJECTION = {
+    "_id": 0, "address": 1, "username": 1, "email": 1,
+    "membership_tier": 1, "email_notifications": 1
+}
+MEMBER_FETCH_SIZE = 1000
+
+# Compact the ring once this fraction of its entries is exhausted
+_COMPACT_DEAD_RATIO = 0.5
+
+
+def get_tier_quota(tier: Optional[str], leads_per_tier: Optional[Dict[str, int]] = None) -> int:
+    """Leads a member of this tier should receive per distribution"""
+    return (leads_per_tier or LEADS_PER_TIER).get(tier or "bronze", DEFAULT_TIER_QUOTA)
+
+
+def eligible_members_filter(now: Optional[datetime] = None) -> Dict:
+    """
+    Members that receive leads: a paid tier, not suspended, subscription not expired
+    Served by the users index on (membership_tier, suspended, subscription_expires_at);
+    members without an expiry date stay eligible.
+    """
+    now = now or datetime.utcnow()
+    return {
+        "membership_tier": {"$in": list(LEADS_PER_TIER)},
+        "suspended": False,
+        "$or": [
+            {"subscription_expires_at": None},
+            {"subscription_expires_at": {"$gt": now}}
+        ]
+    }
+
+
+async def iter_eligible_member_batches(
+    db,
+    projection: Optional[Dict] = None,
+    batch_size: int = MEMBER_FETCH_SIZE
+) -> AsyncIterator[List[dict]]:
+    """
+    Stream eligible members in batches, tier by tier in TIER_ALLOCATION_RANK
+    order, from one projected query per tier on the eligibility index
+    """
+    members_filter = eligible_members_filter()
+    tiers = sorted(
+        members_filter["membership_tier"]["$in"],
+        key=lambda tier: TIER_ALLOCATION_RANK.get(tier, len(TIER_ALLOCATION_RANK))
+    )
+    for tier in tiers:
+        cursor = db.users.find(
+            {**members_filter, "membership_tier": tier},
+            projection or ELIGIBLE_MEMBER_PROJECTION
+        ).batch_size(batch_size)
+        while True:
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                break
+            yield batch
+
+
+class LeadAllocator:
+    """
+    Rotating-cursor allocator over leads with remaining capacity
+
+    leads: lead documents (must carry "lead_id"; "distribution_count" is the
+    number of times the lead has already been distributed)
+    is_assigned: optional (member_key, lead) -> bool predicate rejecting leads a
+    member already received in earlier runs
+    """
+
+    def __init__(
+        self,
+        leads: List[dict],
+        max_per_lead: int = MAX_DISTRIBUTIONS_PER_LEAD,
+        is_assigned: Optional[Callable[[str, dict], bool]] = None
+    ):
+        self.leads = leads
+        self.capacity = [max(0, max_per_lead - lead.get("distribution_count", 0)) for lead in leads]
+        self.ring = [i for i, capacity in enumerate(self.capacity) if capacity > 0]
+        self.cursor = 0
+        self.dead = 0
+        self.is_assigned = is_assigned
+        self.assignments_made = 0
+        self.remaining_capacity = sum(self.capacity)
+
+    def allocate(self, member_key: str, quota: int) -> List[dict]:
+        """
+        Take up to `quota` distinct leads for a member, advancing the cursor
+        Each lead is visited at most once per call, so repeats are impossible.
+        """
+        picked: List[dict] = []
+        ring_size = len(self.ring)
+        if quota <= 0 or ring_size == 0:
+            return picked
+        
+        position = self.cursor
+        visited = 0
+        while visited < ring_size and len(picked) < quota:
+            lead_index = self.ring[position]
+            position += 1
+            if position == ring_size:
+                position = 0
+            visited += 1
+            
+            if self.capacity[lead_index] == 0:
+                continue
+            lead = self.leads[lead_index]
+            if self.is_assigned is not None and self.is_assigned(member_key, lead):
+                continue
+            
+            picked.append(lead)
+            self.capacity[lead_index] -= 1
+            if self.capacity[lead_index] == 0:
+                self.dead += 1
+        
+        self.cursor = position
+        self.assignments_made += len(picked)
+        self.remaining_capacity -= len(picked)
+        
+        if self.dead > len(self.ring) * _COMPACT_DEAD_RATIO:
+            self._compact()
+        return picked
+
+    def _compact(self):
+        """Drop exhausted leads from the ring, keeping the cursor on the same live lead"""
+        live_before_cursor = sum(1 for i in self.ring[:self.cursor] if self.capacity[i] > 0)
+        self.ring = [i for i in self.ring if self.capacity[i] > 0]
+        self.cursor = live_before_cursor if live_before_cursor < len(self.ring) else 0
+        self.dead = 0
+
+    @property
+    def leads_with_capacity(self) -> int:
+        """Number of leads that can still be distributed"""
+        return len(self.ring) - self.dead
+
+
+class WindowedLeadAllocator:
+    """
+    Oldest-first allocator over a single forward cursor of leads
+
+    The window holds the oldest leads that still have slots, in order. Each
+    member takes the first `quota` live leads of the window (contiguous, so no
+    repeats); the window is refilled from the cursor only when it runs short,
+    and exhausted leads fall off the front. One sorted query serves the whole run.
+
+    cursor: Motor cursor sorted oldest first (created_at ascending)
+    """
+
+    def __init__(
+        self,
+        cursor,
+        max_per_lead: int = MAX_DISTRIBUTIONS_PER_LEAD,
+        is_assigned: Optional[Callable[[str, dict], bool]] = None,
+        fetch_size: int = 1000
+    ):
+        self.cursor = cursor
+        self.max_per_lead = max_per_lead
+        self.is_assigned = is_assigned
+        self.fetch_size = fetch_size
+        self.window: List[list] = []  # [lead, remaining_slots], oldest first
+        self.dead = 0
+        self.exhausted_cursor = False
+        self.assignments_made = 0
+        self.leads_fetched = 0
+
+    async def _refill(self, needed: int):
+        """Pull leads from the cursor until `needed` live leads are in the window"""
+        while not self.exhausted_cursor and len(self.window) - self.dead < needed:
+            batch = await self.cursor.to_list(length=max(self.fetch_size, needed))
+            if not batch:
+                self.exhausted_cursor = True
+                break
+            self.leads_fetched += len(batch)
+            for lead in batch:
+                slots = self.max_per_lead - lead.get("distribution_count", 0)
+                if slots > 0:
+                    self.window.append([lead, slots])
+
+    async def allocate(self, member_key: str, quota: int) -> List[dict]:
+        """Take the `quota` oldest live leads this member has not received"""
+        picked: List[dict] = []
+        if quota <= 0:
+            return picked
+        
+        await self._refill(quota)
+        position = 0
+        while len(picked) < quota:
+            if position >= len(self.window):
+                # Leads were rejected for this member - extend the window
+                await self._refill(len(self.window) - self.dead + (quota - len(picked)))
+                if position >= len(self.window):
+                    break
+            entry = self.window[position]
+            position += 1
+            if entry[1] == 0:
+                continue
+            if self.is_assigned is not None and self.is_assigned(member_key, entry[0]):
+                continue
+            picked.append(entry[0])
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.dead += 1
+        
+        self.assignments_made += len(picked)
+        self._trim()
+        return picked
+
+    def _trim(self):
+        """Drop exhausted leads from the front, compacting when many are dead"""
+        front = 0
+        while front < len(self.window) and self.window[front][1] == 0:
+            front += 1
+        if front:
+            del self.window[:front]
+            self.dead -= front
+        if self.dead > len(self.window) * 0.5:
+            self.window = [entry for entry in self.window if entry[1] > 0]
+            self.dead = 0
+
+
+def benchmark(member_count: int = 5000, lead_count: int = 200000, seed: int = 42) -> Dict:
+    """Allocate synthetic members (mixed tiers) over synthetic leads and time it"""
+    rng = random.Random(seed)
+    tiers = ["bronze"] * 6 + ["silver"] * 3 + ["gold"]
+    members = [
+        {"address": f"0x{i:040x}", "membership_tier": rng.choice(tiers)}
+        for i in range(member_count)
+    ]
+    leads = [
+        {"lead_id": f"lead-{i}", "distribution_count": rng.choice([0, 0, 0, 3, 9])}
+        for i in range(lead_count)
+    ]
+    
+    started = time.perf_counter()
+    allocator = LeadAllocator(leads)
+    allocations = {}
+    for member in members:
+        allocations[member["address"]] = allocator.allocate(member["address"], get_tier_quota(member["membership_tier"]))
+    elapsed = time.perf_counter() - started
+    
+    # Verify the constraints
+    per_lead = {}
+    for address, picked in allocations.items():
+        ids = [lead["lead_id"] for lead in picked]
+        assert len(ids) == len(set(ids)), "lead repeated for a member"
+        for lead in picked:
+            per_lead[lead["lead_id"]] = per_lead.get(lead["lead_id"], 0) + 1
+    for lead in leads:
+        assert lead.get("distribution_count", 0) + per_lead.get(lead["lead_id"], 0) <= MAX_DISTRIBUTIONS_PER_LEAD
+    
+    return {
+        "members": member_count,
+        "leads": lead_count,
+        "assignments": allocator.assignments_made,
+        "seconds": round(elapsed, 3),
+        "assignments_per_second": round(allocator.assignments_made / elapsed) if elapsed > 0 else None
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python lead_allocator.py [members] [leads]
+    args = [int(arg) for arg in sys.argv[1:3]]
+    print(benchmark(*args))
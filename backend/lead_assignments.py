@@ -0,0 +1,118 @@
+"""
+Cross-run repeat prevention for lead distributions
+
+Members are interned to small integers (`member_ids` collection), and every
+lead carries the ids of the members it was given to in `assigned_members`.
+Because a lead is distributed at most MAX_DISTRIBUTIONS_PER_LEAD times, each
+set holds a handful of integers: it is the sorted-array container of a
+roaring set, and far smaller than a bitset over all members. The set rides
+along with the lead documents a run already loads, so the allocator rejects
+repeats in O(1) without querying member_leads, and it is extended with
+$addToSet in the same bulk write that bumps distribution_count.
+"""
+import logging
+from typing import Callable, Dict, Iterable, List
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+MEMBER_ID_COUNTER = "member_id"
+BACKFILL_BATCH_SIZE = 1000
+
+
+async def create_lead_assignment_indexes(db):
+    """Create indexes for interned member ids"""
+    await db.member_ids.create_index("address", unique=True)
+    await db.member_ids.create_index("member_id", unique=True)
+
+
+async def lookup_member_ids(db, addresses: Iterable[str]) -> Dict[str, int]:
+    """Interned ids of members that already have one (read only)"""
+    docs = await db.member_ids.find(
+        {"address": {"$in": list(set(addresses))}},
+        {"_id": 0, "address": 1, "member_id": 1}
+    ).to_list(None)
+    return {doc["address"]: doc["member_id"] for doc in docs}
+
+
+async def intern_members(db, addresses: Iterable[str]) -> Dict[str, int]:
+    """
+    Map member addresses to integer ids, allocating ids for new members
+    New ids are reserved as one block from a counter document.
+    """
+    addresses = set(addresses)
+    member_ids = await lookup_member_ids(db, addresses)
+    missing = sorted(addresses - member_ids.keys())
+    if not missing:
+        return member_ids
+
+    counter = await db.counters.find_one_and_update(
+        {"_id": MEMBER_ID_COUNTER},
+        {"$inc": {"seq": len(missing)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    first_id = counter["seq"] - len(missing) + 1
+    new_docs = [{"address": address, "member_id": first_id + i} for i, address in enumerate(missing)]
+    try:
+        await db.member_ids.insert_many(new_docs, ordered=False)
+    except BulkWriteError:
+        # Another run interned some of these members first - use their ids
+        pass
+    member_ids.update(await lookup_member_ids(db, missing))
+    return member_ids
+
+
+def make_repeat_check(member_ids: Dict[str, int]) -> Callable[[str, dict], bool]:
+    """
+    Build the allocator's is_assigned hook
+    Leads must be loaded with their `assigned_members` field.
+    """
+    def is_assigned(member_key: str, lead: dict) -> bool:
+        member_id = member_ids.get(member_key)
+        return member_id is not None and member_id in lead.get("assigned_members", ())
+
+    return is_assigned
+
+
+def lead_assignment_updates(
+    assignments: Iterable[tuple],
+    member_ids: Dict[str, int]
+) -> Dict[str, List[int]]:
+    """Group (member_address, lead_id) pairs into lead_id -> new member ids"""
+    lead_members: Dict[str, List[int]] = {}
+    for member_address, lead_id in assignments:
+        member_id = member_ids.get(member_address)
+        if member_id is not None:
+            lead_members.setdefault(lead_id, []).append(member_id)
+    return lead_members
+
+
+async def rebuild_lead_assignment_sets(db, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Rebuild every lead's assigned_members from member_leads (one-off backfill)
+    Returns the number of leads updated
+    """
+    member_ids = await intern_members(db, await db.member_leads.distinct("member_address"))
+
+    updated = 0
+    operations = []
+    cursor = db.member_leads.aggregate([
+        {"$group": {"_id": "$lead_id", "members": {"$addToSet": "$member_address"}}}
+    ], allowDiskUse=True)
+    async for row in cursor:
+        assigned = sorted({member_ids[address] for address in row["members"] if address in member_ids})
+        operations.append(UpdateOne({"lead_id": row["_id"]}, {"$set": {"assigned_members": assigned}}))
+        if len(operations) >= batch_size:
+            result = await db.leads.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+    if operations:
+        result = await db.leads.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+
+    # Leads never distributed start with an empty set
+    await db.leads.update_many({"assigned_members": {"$exists": False}}, {"$set": {"assigned_members": []}})
+    return updated
@@ -0,0 +1,262 @@
+"""
+Incremental duplicate index for leads
+
+The email_index collection maps a normalized email to the lead ids that use it,
+so duplicate reports are an indexed range query instead of a $group over the
+whole leads collection. It is maintained when leads are inserted, merged and
+rolled back.
+Distribution counts change on every distribution, so they are not copied into
+the index; reports sum them from the grouped leads.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne, UpdateMany, DeleteMany
+
+logger = logging.getLogger(__name__)
+
+MERGE_BATCH_SIZE = 100  # Duplicate groups merged per bulk_write round
+
+
+def normalize_email(email: str) -> str:
+    """Normalize an email for duplicate matching"""
+    return (email or "").strip().lower()
+
+
+async def create_email_index_indexes(db):
+    """Create indexes backing the duplicate index"""
+    await db.email_index.create_index("email", unique=True)
+    await db.email_index.create_index([("lead_count", -1), ("email", 1)])
+    await db.leads.create_index("lead_id")
+    await db.leads.create_index("email")
+    await db.member_leads.create_index("lead_id")
+
+
+async def update_email_index(db, leads: List[dict]):
+    """
+    Register newly inserted leads in the duplicate index (one bulk_write)
+    """
+    if not leads:
+        return
+    
+    grouped: Dict[str, dict] = {}
+    for lead in leads:
+        email = normalize_email(lead.get("email"))
+        if not email:
+            continue
+        group = grouped.setdefault(email, {"lead_ids": [], "distribution_ids": set()})
+        group["lead_ids"].append(lead["lead_id"])
+        if lead.get("distribution_id"):
+            group["distribution_ids"].add(lead["distribution_id"])
+    
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"email": email},
+            {
+                "$push": {"lead_ids": {"$each": group["lead_ids"]}},
+                "$addToSet": {"distribution_ids": {"$each": sorted(group["distribution_ids"])}},
+                "$inc": {"lead_count": len(group["lead_ids"])},
+                "$set": {"updated_at": now}
+            },
+            upsert=True
+        )
+        for email, group in grouped.items()
+    ]
+    await db.email_index.bulk_write(operations, ordered=False)
+
+
+async def remove_from_email_index(db, leads: List[dict], distribution_id: Optional[str] = None):
+    """
+    Unregister leads that are being deleted (a rolled-back upload)
+    Only entries that still list the lead are decremented, so a retry after
+    a partial failure is safe. distribution_id is dropped from the entries
+    too; callers remove every lead of that distribution.
+    """
+    if not leads:
+        return
+    
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"email": normalize_email(lead.get("email")), "lead_ids": lead["lead_id"]},
+            {
+                "$pull": {"lead_ids": lead["lead_id"]},
+                "$inc": {"lead_count": -1},
+                "$set": {"updated_at": now}
+            }
+        )
+        for lead in leads
+    ]
+    await db.email_index.bulk_write(operations, ordered=False)
+    
+    emails = sorted({normalize_email(lead.get("email")) for lead in leads})
+    if distribution_id:
+        await db.email_index.update_many(
+            {"email": {"$in": emails}},
+            {"$pull": {"distribution_ids": distribution_id}}
+        )
+    await db.email_index.delete_many({"email": {"$in": emails}, "lead_count": {"$lte": 0}})
+
+
+async def rebuild_email_index(db) -> int:
+    """
+    Rebuild the duplicate index from the leads collection (one-off backfill)
+    Returns the number of indexed emails
+    """
+    pipeline = [
+        {"$sort": {"created_at": 1}},
+        {
+            "$group": {
+                "_id": {"$toLower": {"$trim": {"input": "$email"}}},
+                "lead_ids": {"$push": "$lead_id"},
+                "distribution_ids": {"$addToSet": "$distribution_id"},
+                "lead_count": {"$sum": 1}
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "email": "$_id",
+                "lead_ids": 1,
+                "distribution_ids": 1,
+                "lead_count": 1,
+                "updated_at": "$$NOW"
+            }
+        },
+        {"$out": "email_index"}
+    ]
+    await db.leads.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    await create_email_index_indexes(db)
+    return await db.email_index.count_documents({})
+
+
+async def get_duplicate_groups(db, limit: int = 100, after_email: Optional[str] = None) -> List[dict]:
+    """
+    Return duplicate groups (lead_count > 1), largest first, via the index
+    """
+    query = {"lead_count": {"$gt": 1}}
+    if after_email:
+        query["email"] = {"$gt": after_email}
+    cursor = db.email_index.find(query, {"_id": 0}).sort([("lead_count", -1), ("email", 1)]).limit(limit)
+    return await cursor.to_list(None)
+
+
+def _plan_group_merge(email: str, keep_lead_id: str, leads: List[dict]):
+    """Build the write operations that merge one duplicate group into keep_lead_id"""
+    leads_to_merge = [lead for lead in leads if lead["lead_id"] != keep_lead_id]
+    merged_ids = [lead["lead_id"] for lead in leads_to_merge]
+    merged_count = sum(lead.get("distribution_count", 0) for lead in leads_to_merge)
+    keep_lead = next(lead for lead in leads if lead["lead_id"] == keep_lead_id)
+    
+    merged_members = sorted({member for lead in leads_to_merge for member in lead.get("assigned_members", [])})
+    keep_update = {"$inc": {"distribution_count": merged_count}}
+    if merged_members:
+        keep_update["$addToSet"] = {"assigned_members": {"$each": merged_members}}
+    
+    member_lead_ops = [UpdateMany({"lead_id": {"$in": merged_ids}}, {"$set": {"lead_id": keep_lead_id}})]
+    lead_ops = [
+        UpdateOne({"lead_id": keep_lead_id}, keep_update),
+        DeleteMany({"lead_id": {"$in": merged_ids}})
+    ]
+    index_ops = [
+        UpdateOne(
+            {"email": email},
+            {"$set": {
+                "lead_ids": [keep_lead_id],
+                "lead_count": 1,
+                "distribution_ids": [keep_lead["distribution_id"]] if keep_lead.get("distribution_id") else [],
+                "updated_at": datetime.utcnow()
+            }}
+        )
+    ]
+    return member_lead_ops, lead_ops, index_ops, len(merged_ids)
+
+
+async def merge_duplicate_group(db, email: str, keep_lead_id: str, leads: List[dict]) -> Dict:
+    """
+    Merge one duplicate group: repoint member_leads, fold distribution counts
+    into the kept lead and delete the rest, each as a single bulk_write
+    """
+    member_lead_ops, lead_ops, index_ops, merged = _plan_group_merge(
+        normalize_email(email), keep_lead_id, leads
+    )
+    member_result = await db.member_leads.bulk_write(member_lead_ops, ordered=False)
+    lead_result = await db.leads.bulk_write(lead_ops, ordered=True)
+    await db.email_index.bulk_write(index_ops, ordered=False)
+    return {
+        "merged_leads": merged,
+        "merged_references": member_result.modified_count,
+        "deleted_duplicates": lead_result.deleted_count
+    }
+
+
+async def merge_all_duplicates(db, job_id: str, batch_size: int = MERGE_BATCH_SIZE):
+    """
+    Background job: merge every duplicate group, keeping the oldest lead of each
+    Groups are processed in batches with one bulk_write per collection per batch,
+    and progress is recorded on the lead_jobs document.
+    """
+    totals = {"groups_merged": 0, "leads_deleted": 0, "references_updated": 0}
+    try:
+        await db.lead_jobs.update_one(
+            {"job_id": job_id},
+            {"$set": {"status": "running", "started_at": datetime.utcnow()}}
+        )
+        
+        last_email = None
+        while True:
+            query = {"lead_count": {"$gt": 1}}
+            if last_email:
+                query["email"] = {"$gt": last_email}
+            groups = await db.email_index.find(query, {"_id": 0}).sort("email", 1).limit(batch_size).to_list(None)
+            if not groups:
+                break
+            last_email = groups[-1]["email"]
+            
+            lead_ids = [lead_id for group in groups for lead_id in group["lead_ids"]]
+            leads = await db.leads.find(
+                {"lead_id": {"$in": lead_ids}},
+                {"_id": 0, "lead_id": 1, "email": 1, "distribution_id": 1, "distribution_count": 1, "assigned_members": 1, "created_at": 1}
+            ).to_list(None)
+            leads_by_email: Dict[str, List[dict]] = {}
+            for lead in leads:
+                leads_by_email.setdefault(normalize_email(lead["email"]), []).append(lead)
+            
+            member_lead_ops, lead_ops, index_ops = [], [], []
+            for group in groups:
+                group_leads = leads_by_email.get(group["email"], [])
+                if len(group_leads) <= 1:
+                    continue
+                keep = min(group_leads, key=lambda lead: (lead.get("created_at") or datetime.min, lead["lead_id"]))
+                ops = _plan_group_merge(group["email"], keep["lead_id"], group_leads)
+                member_lead_ops.extend(ops[0])
+                lead_ops.extend(ops[1])
+                index_ops.extend(ops[2])
+                totals["groups_merged"] += 1
+            
+            if lead_ops:
+                member_result = await db.member_leads.bulk_write(member_lead_ops, ordered=False)
+                lead_result = await db.leads.bulk_write(lead_ops, ordered=False)
+                await db.email_index.bulk_write(index_ops, ordered=False)
+                totals["references_updated"] += member_result.modified_count
+                totals["leads_deleted"] += lead_result.deleted_count
+            
+            await db.lead_jobs.update_one(
+                {"job_id": job_id},
+                {"$set": {"progress": {**totals, "last_email": last_email}, "updated_at": datetime.utcnow()}}
+            )
+        
+        await db.lead_jobs.update_one(
+            {"job_id": job_id},
+            {"$set": {"status": "completed", "progress": totals, "completed_at": datetime.utcnow()}}
+        )
+        logger.info(f"Merge-all job {job_id} completed: {totals}")
+        
+    except Exception as e:
+        logger.error(f"Merge-all job {job_id} failed: {str(e)}")
+        await db.lead_jobs.update_one(
+            {"job_id": job_id},
+            {"$set": {"status": "failed", "error_message": str(e), "progress": totals}}
+        )
@@ -0,0 +1,207 @@
+"""
+Checkpointed background re-validation of existing leads
+
+Walks the leads collection in _id order, validates each page through the
+concurrent batch validator, writes results with one bulk_write per page and
+checkpoints its position on the lead_jobs document so it can pause and resume.
+
+The process running a job holds a lease under an owner token and renews it
+from a heartbeat task, so only jobs whose process died are paused for resuming
+(other workers may still be running theirs). Job writes match on the owner.
+"""
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from email_validator import analyze_csv_emails
+
+logger = logging.getLogger(__name__)
+
+VALIDATION_PAGE_SIZE = 2000  # Leads validated per checkpoint
+JOB_LEASE_MINUTES = 5  # A running job whose lease was not renewed for this long is considered interrupted
+JOB_LEASE_RENEW_SECONDS = 60  # Heartbeat interval while a job runs
+
+
+def build_validation_query(job: dict) -> dict:
+    """Leads query for a job, resuming after the last checkpointed _id"""
+    query = {}
+    if job.get("distribution_id"):
+        query["distribution_id"] = job["distribution_id"]
+    checkpoint = job.get("checkpoint") or {}
+    if checkpoint.get("last_id") is not None:
+        query["_id"] = {"$gt": checkpoint["last_id"]}
+    return query
+
+
+def _job_lease_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(minutes=JOB_LEASE_MINUTES)
+
+
+async def renew_job_lease(db, job_id: str, owner: str) -> bool:
+    """Extend a running job's lease; False once the job is no longer held by owner"""
+    result = await db.lead_jobs.update_one(
+        {"job_id": job_id, "status": {"$in": ["running", "pausing"]}, "lease_owner": owner},
+        {"$set": {"lease_expires_at": _job_lease_expiry()}}
+    )
+    return result.matched_count == 1
+
+
+async def _heartbeat_job_lease(db, job_id: str, owner: str):
+    while True:
+        await asyncio.sleep(JOB_LEASE_RENEW_SECONDS)
+        try:
+            if not await renew_job_lease(db, job_id, owner):
+                return
+        except Exception as e:
+            logger.error(f"Failed to renew the lease on lead validation job {job_id}: {str(e)}")
+
+
+async def run_lead_validation_job(db, job_id: str, page_size: int = VALIDATION_PAGE_SIZE, resume: bool = False):
+    """
+    Run a queued lead validation job (or resume a paused one) until it
+    finishes or is paused
+    Progress fields: processed, valid, invalid, throughput_per_second,
+    eta_seconds and the checkpoint (last _id written)
+    """
+    owner = str(uuid.uuid4())
+    job = await db.lead_jobs.find_one_and_update(
+        {"job_id": job_id, "status": "paused" if resume else "queued"},
+        {"$set": {
+            "status": "running",
+            "resumed_at": datetime.utcnow(),
+            "lease_owner": owner,
+            "lease_expires_at": _job_lease_expiry()
+        }}
+    )
+    if not job:
+        logger.warning(f"Lead validation job {job_id} is not runnable")
+        return
+    held = {"job_id": job_id, "lease_owner": owner}
+    heartbeat = asyncio.create_task(_heartbeat_job_lease(db, job_id, owner))
+    
+    progress = job.get("progress") or {}
+    processed = progress.get("processed", 0)
+    valid = progress.get("valid", 0)
+    invalid = progress.get("invalid", 0)
+    api_errors = progress.get("api_errors", 0)
+    active_seconds = progress.get("active_seconds", 0.0)
+    total = job.get("total_leads", 0)
+    checkpoint = job.get("checkpoint") or {}
+    
+    try:
+        while True:
+            # Honour pause requests between pages
+            current = await db.lead_jobs.find_one({"job_id": job_id}, {"status": 1, "lease_owner": 1})
+            if not current or current.get("lease_owner") != owner:
+                logger.warning(f"Lead validation job {job_id} was taken over, stopping")
+                return
+            if current.get("status") == "pausing":
+                await db.lead_jobs.update_one(held, {"$set": {"status": "paused", "paused_at": datetime.utcnow(), "lease_owner": None}})
+                logger.info(f"Lead validation job {job_id} paused after {processed} leads")
+                return
+            
+            page_started = time.monotonic()
+            query = build_validation_query({**job, "checkpoint": checkpoint})
+            leads = await db.leads.find(query, {"_id": 1, "lead_id": 1, "email": 1}).sort("_id", 1).limit(page_size).to_list(None)
+            if not leads:
+                break
+            
+            validation_result = await analyze_csv_emails(
+                [lead["email"] for lead in leads],
+                use_api=True,
+                mode=job.get("mode")
+            )
+            
+            now = datetime.utcnow()
+            operations = []
+            for lead, result in zip(leads, validation_result.get("validation_results", [])):
+                if result.get("status") in ("API_ERROR", "VALIDATION_ERROR"):
+                    continue  # Leave unvalidated rather than marking as invalid
+                operations.append(UpdateOne(
+                    {"_id": lead["_id"]},
+                    {"$set": {
+                        "email_validated": result.get("valid", False),
+                        "validation_date": now,
+                        "validation_status": result.get("status", "UNKNOWN"),
+                        "is_disposable": result.get("is_disposable", False),
+                        "is_role_based": result.get("is_role_based", False)
+                    }}
+                ))
+            if operations:
+                await db.leads.bulk_write(operations, ordered=False)
+            
+            stats = validation_result.get("stats", {})
+            processed += len(leads)
+            valid += stats.get("valid", 0)
+            invalid += len(leads) - stats.get("valid", 0) - stats.get("api_errors", 0)
+            api_errors += stats.get("api_errors", 0)
+            active_seconds += time.monotonic() - page_started
+            checkpoint = {"last_id": leads[-1]["_id"], "updated_at": now}
+            
+            throughput = processed / active_seconds if active_seconds > 0 else 0
+            remaining = max(0, total - processed)
+            result = await db.lead_jobs.update_one(
+                held,
+                {"$set": {
+                    "checkpoint": checkpoint,
+                    "progress": {
+                        "processed": processed,
+                        "valid": valid,
+                        "invalid": invalid,
+                        "api_errors": api_errors,
+                        "active_seconds": round(active_seconds, 2),
+                        "throughput_per_second": round(throughput, 1),
+                        "remaining": remaining,
+                        "eta_seconds": round(remaining / throughput) if throughput > 0 else None,
+                        "percent_complete": round(processed / total * 100, 1) if total else 100.0
+                    },
+                    "updated_at": now
+                }}
+            )
+            if result.matched_count == 0:
+                logger.warning(f"Lead validation job {job_id} was taken over, stopping")
+                return
+        
+        await db.lead_jobs.update_one(
+            held,
+            {"$set": {
+                "status": "completed",
+                "lease_owner": None,
+                "completed_at": datetime.utcnow(),
+                "progress.remaining": 0,
+                "progress.eta_seconds": 0,
+                "progress.percent_complete": 100.0
+            }}
+        )
+        logger.info(f"Lead validation job {job_id} completed: {processed} leads validated")
+        
+    except Exception as e:
+        logger.error(f"Lead validation job {job_id} failed: {str(e)}")
+        # Keep the checkpoint so the job can be resumed
+        await db.lead_jobs.update_one(
+            held,
+            {"$set": {"status": "paused", "error_message": str(e), "paused_at": datetime.utcnow(), "lease_owner": None}}
+        )
+    finally:
+        heartbeat.cancel()
+
+
+async def pause_interrupted_validation_jobs(db) -> int:
+    """
+    Mark jobs whose process stopped renewing their lease as paused so they
+    can be resumed. Jobs still renewed by a live worker are left running.
+    """
+    now = datetime.utcnow()
+    result = await db.lead_jobs.update_many(
+        {
+            "type": "validate_leads",
+            "status": {"$in": ["running", "pausing"]},
+            "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}]
+        },
+        {"$set": {"status": "paused", "paused_at": now, "lease_owner": None}}
+    )
+    return result.modified_count
@@ -0,0 +1,94 @@
+"""
+Fixed-window rate limiting for integration endpoints
+
+Each API key gets one counter per window (`rate_limit` requests per
+`rate_limit_period`, configured on the key). A check is a single atomic
+increment, so cost does not grow with traffic. Counters live in a pluggable
+backend: in memory for tests and single-process runs, or MongoDB (one `$inc`
+upsert per request on a document removed by a TTL index) so all workers and
+replicas share the same limits.
+"""
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "mongo")  # mongo | memory
+DEFAULT_RATE_LIMIT = 100
+DEFAULT_RATE_LIMIT_PERIOD = "hour"
+PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def period_seconds(period: Optional[str]) -> int:
+    """Window length for a rate_limit_period name"""
+    return PERIOD_SECONDS.get(period or DEFAULT_RATE_LIMIT_PERIOD, PERIOD_SECONDS[DEFAULT_RATE_LIMIT_PERIOD])
+
+
+class MemoryRateLimitBackend:
+    """Counters in this process only (tests, single worker)"""
+
+    def __init__(self):
+        self.windows: Dict[str, Tuple[int, int]] = {}  # key -> (window_start, count)
+
+    async def increment(self, key: str, window_start: int, window_seconds: int) -> int:
+        current_start, count = self.windows.get(key, (window_start, 0))
+        if current_start != window_start:
+            count = 0
+        count += 1
+        self.windows[key] = (window_start, count)
+        return count
+
+
+class MongoRateLimitBackend:
+    """Counters shared by every worker: one document per key and window"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def increment(self, key: str, window_start: int, window_seconds: int) -> int:
+        window = await self.db.rate_limit_windows.find_one_and_update(
+            {"_id": f"{key}:{window_start}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {
+                    "expires_at": datetime.utcfromtimestamp(window_start + window_seconds) + timedelta(minutes=1)
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return window["count"]
+
+
+async def create_rate_limit_indexes(db):
+    """Expire finished windows"""
+    await db.rate_limit_windows.create_index("expires_at", expireAfterSeconds=0)
+
+
+class FixedWindowRateLimiter:
+    """Allows `limit` requests per key in each aligned window of `window_seconds`"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, Dict]:
+        now = int(time.time())
+        window_start = now - now % window_seconds
+        count = await self.backend.increment(key, window_start, window_seconds)
+        return count <= limit, {
+            "limit": limit,
+            "remaining": max(0, limit - count),
+            "reset": window_start + window_seconds
+        }
+
+
+def create_rate_limiter(db, backend: Optional[str] = None) -> FixedWindowRateLimiter:
+    """Rate limiter on the configured backend (RATE_LIMIT_BACKEND)"""
+    if (backend or RATE_LIMIT_BACKEND) == "memory":
+        return FixedWindowRateLimiter(MemoryRateLimitBackend())
+    return FixedWindowRateLimiter(MongoRateLimitBackend(db))
@@ -2,18 +2,33 @@
 Background scheduler for automated lead distributions
 """
 import asyncio
+import heapq
 import os
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 import uuid
 import logging
 from dotenv import load_dotenv
 from scheduler_health import update_scheduler_heartbeat, log_scheduler_event
+from lead_validation_job import pause_interrupted_validation_jobs
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+SCHEDULER_HEARTBEAT_SECONDS = 60
+SCHEDULER_MAX_SLEEP_SECONDS = 900  # Re-read schedules at least this often (changes made by other workers)
+SCHEDULE_RETRY_SECONDS = 60  # Delay before retrying a schedule whose run failed
+RUN_RESUME_CHECK_SECONDS = 60
+REMINDER_CHECK_SECONDS = 3600
+UPLOAD_SWEEP_SECONDS = 3600
+
+# Set by the schedule endpoints to wake the scheduler loop
+_schedules_changed: Optional[asyncio.Event] = None
+# Heartbeat and maintenance tasks (referenced so they are not garbage collected)
+_background_tasks: set = set()
+
 
 def calculate_next_run(schedule: dict) -> datetime:
     """Calculate the next run time based on schedule settings"""
@@ -362,84 +377,165 @@ async def send_subscription_reminder_email(db, email, username, tier, days_remai
         raise
 
 
+def notify_schedules_changed():
+    """Wake the scheduler loop to re-read schedules (created, updated or deleted)"""
+    if _schedules_changed is not None:
+        _schedules_changed.set()
+
+
+async def load_schedule_heap(db) -> list:
+    """Min-heap of (next_run, schedule_id) for enabled schedules"""
+    schedules = await db.distribution_schedules.find(
+        {"enabled": True, "next_run": {"$ne": None}},
+        {"_id": 0, "schedule_id": 1, "next_run": 1}
+    ).to_list(None)
+    heap = []
+    for schedule in schedules:
+        next_run = schedule["next_run"]
+        if next_run.tzinfo is not None:
+            next_run = next_run.astimezone(timezone.utc).replace(tzinfo=None)
+        heap.append((next_run, schedule["schedule_id"]))
+    heapq.heapify(heap)
+    return heap
+
+
+def seconds_until_next_run(heap: list) -> float:
+    """How long the loop may sleep before the earliest schedule is due"""
+    if not heap:
+        return SCHEDULER_MAX_SLEEP_SECONDS
+    delay = (heap[0][0] - datetime.utcnow()).total_seconds()
+    if delay <= 0:
+        # Still due right after running - the run failed, retry later
+        return SCHEDULE_RETRY_SECONDS
+    return min(delay, SCHEDULER_MAX_SLEEP_SECONDS)
+
+
+async def run_due_schedules(db):
+    """Execute every enabled schedule whose next_run has passed"""
+    now = datetime.now(timezone.utc)
+    schedules_to_run = await db.distribution_schedules.find({
+        "enabled": True,
+        "next_run": {"$lte": now}
+    }).to_list(None)
+    
+    if schedules_to_run:
+        logger.info(f"Found {len(schedules_to_run)} schedule(s) to execute")
+        await log_scheduler_event(
+            db, 
+            "found_schedules", 
+            f"Found {len(schedules_to_run)} schedule(s) to execute at {now.isoformat()}"
+        )
+    
+    for schedule in schedules_to_run:
+        try:
+            await log_scheduler_event(
+                db,
+                "execute_start",
+                f"Starting execution of schedule: {schedule.get('name')}",
+                schedule_id=schedule.get('schedule_id')
+            )
+            await execute_scheduled_distribution(db, schedule)
+            await log_scheduler_event(
+                db,
+                "execute_complete",
+                f"Completed execution of schedule: {schedule.get('name')}",
+                schedule_id=schedule.get('schedule_id')
+            )
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(
+                f"Failed to run schedule {schedule.get('name', 'unknown')}: {error_msg}"
+            )
+            await log_scheduler_event(
+                db,
+                "execute_error",
+                f"Failed to execute schedule: {schedule.get('name')}",
+                schedule_id=schedule.get('schedule_id'),
+                error=error_msg
+            )
+
+
+async def run_scheduler_heartbeat(db):
+    """Heartbeat on its own timer, independent of how long the main loop sleeps"""
+    while True:
+        await update_scheduler_heartbeat(db)
+        await asyncio.sleep(SCHEDULER_HEARTBEAT_SECONDS)
+
+
+async def run_scheduler_maintenance(db):
+    """
+    Resume interrupted distribution runs, pause validation jobs whose process
+    died, send subscription reminders and sweep abandoned uploads
+    """
+    last_reminder_check = None
+    last_upload_sweep = None
+    while True:
+        try:
+            # Resume distribution runs interrupted by a restart or a failed write (in the background)
+            # Note: We're importing here to avoid circular imports
+            from server import resume_interrupted_distribution_runs, sweep_abandoned_lead_uploads
+            await resume_interrupted_distribution_runs()
+            
+            # Validation jobs whose lease expired can then be resumed by an admin
+            interrupted_jobs = await pause_interrupted_validation_jobs(db)
+            if interrupted_jobs:
+                logger.info(f"Paused {interrupted_jobs} interrupted lead validation job(s)")
+            
+            # Remove chunk directories of expired lead uploads every hour
+            now = datetime.now(timezone.utc)
+            if last_upload_sweep is None or (now - last_upload_sweep).total_seconds() >= UPLOAD_SWEEP_SECONDS:
+                await sweep_abandoned_lead_uploads()
+                last_upload_sweep = now
+            
+            # Check subscription reminders every hour
+            now = datetime.now(timezone.utc)
+            if last_reminder_check is None or (now - last_reminder_check).total_seconds() >= REMINDER_CHECK_SECONDS:
+                logger.info("Running subscription reminder check...")
+                await check_subscription_reminders(db)
+                last_reminder_check = now
+        except Exception as e:
+            logger.error(f"Scheduler maintenance error: {str(e)}")
+        await asyncio.sleep(RUN_RESUME_CHECK_SECONDS)
+
+
 async def run_distribution_scheduler():
-    """Main scheduler loop - runs every minute"""
+    """
+    Main scheduler loop
+    Sleeps until the earliest next_run of a min-heap of enabled schedules, and
+    is woken early when schedules change through the admin endpoints.
+    """
+    global _schedules_changed
     logger.info("Starting distribution scheduler...")
     
     client = AsyncIOMotorClient(os.getenv("MONGO_URL"))
     db = client[os.getenv("DB_NAME")]
+    _schedules_changed = asyncio.Event()
     
     # Log startup
     await log_scheduler_event(db, "startup", "Scheduler started successfully")
     
-    # Track last reminder check time
-    last_reminder_check = datetime.now(timezone.utc) - timedelta(hours=2)  # Run on first iteration
+    # Heartbeat and maintenance run on their own timers
+    _background_tasks.add(asyncio.create_task(run_scheduler_heartbeat(db)))
+    _background_tasks.add(asyncio.create_task(run_scheduler_maintenance(db)))
     
     while True:
         try:
-            # Update heartbeat
-            await update_scheduler_heartbeat(db)
+            heap = await load_schedule_heap(db)
+            if heap and heap[0][0] <= datetime.utcnow():
+                await run_due_schedules(db)
+                heap = await load_schedule_heap(db)
             
-            now = datetime.now(timezone.utc)
-            
-            # Log check
-            await log_scheduler_event(db, "check", f"Checking for schedules at {now.isoformat()}")
-            
-            # Check subscription reminders every hour
-            if (now - last_reminder_check).total_seconds() >= 3600:  # 1 hour
-                logger.info("Running subscription reminder check...")
-                await check_subscription_reminders(db)
-                last_reminder_check = now
-            
-            # Find schedules that need to run
-            schedules_to_run = await db.distribution_schedules.find({
-                "enabled": True,
-                "next_run": {"$lte": now}
-            }).to_list(None)
-            
-            if schedules_to_run:
-                logger.info(f"Found {len(schedules_to_run)} schedule(s) to execute")
-                await log_scheduler_event(
-                    db, 
-                    "found_schedules", 
-                    f"Found {len(schedules_to_run)} schedule(s) to execute at {now.isoformat()}"
-                )
-            
-            for schedule in schedules_to_run:
-                try:
-                    await log_scheduler_event(
-                        db,
-                        "execute_start",
-                        f"Starting execution of schedule: {schedule.get('name')}",
-                        schedule_id=schedule.get('schedule_id')
-                    )
-                    await execute_scheduled_distribution(db, schedule)
-                    await log_scheduler_event(
-                        db,
-                        "execute_complete",
-                        f"Completed execution of schedule: {schedule.get('name')}",
-                        schedule_id=schedule.get('schedule_id')
-                    )
-                except Exception as e:
-                    error_msg = str(e)
-                    logger.error(
-                        f"Failed to run schedule {schedule.get('name', 'unknown')}: {error_msg}"
-                    )
-                    await log_scheduler_event(
-                        db,
-                        "execute_error",
-                        f"Failed to execute schedule: {schedule.get('name')}",
-                        schedule_id=schedule.get('schedule_id'),
-                        error=error_msg
-                    )
-            
-            # Sleep for 1 minute
-            await asyncio.sleep(60)
+            # Sleep until the next schedule is due or schedules change
+            try:
+                await asyncio.wait_for(_schedules_changed.wait(), timeout=seconds_until_next_run(heap))
+            except asyncio.TimeoutError:
+                pass
+            _schedules_changed.clear()
             
         except Exception as e:
             logger.error(f"Scheduler error: {str(e)}")
             await log_scheduler_event(db, "error", f"Scheduler loop error: {str(e)}", error=str(e))
-            await asyncio.sleep(60)
+            await asyncio.sleep(SCHEDULE_RETRY_SECONDS)
 
 
 async def start_scheduler_task():
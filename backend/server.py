@@ -5,13 +5,15 @@ from fastapi.responses import StreamingResponse, Response
 from ftp_storage import upload_file_to_ftp, download_file_from_ftp, get_public_url, get_content_type
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, AsyncIterator, Tuple
 import json
 import hmac
 import hashlib
 import httpx
 import asyncio
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 import uuid
@@ -20,8 +22,8 @@ import logging
 from dotenv import load_dotenv
 import csv
 import io
-import secrets
-from collections import defaultdict
+import itertools
+from collections import Counter
 
 # Import crypto utilities
 from crypto_utils import PolygonWallet, validate_wallet_address, get_hot_wallet_balance
@@ -36,17 +38,154 @@ from email_validator import (
     validate_email_api,
     validate_emails_batch,
     validate_email_comprehensive,
-    analyze_csv_emails
+    analyze_csv_emails,
+    estimate_csv_email_quality,
+    close_http_client as close_email_validation_client,
+    VALIDATION_MODES
+)
+
+# Import chunked upload storage
+from chunked_upload import (
+    MAX_CHUNK_SIZE,
+    MAX_PENDING_ROW_SIZE,
+    UPLOAD_EXPIRY_HOURS,
+    compute_checksum,
+    write_chunk,
+    read_chunk,
+    split_complete_rows,
+    remove_chunk,
+    list_upload_ids,
+    remove_upload
+)
+
+# Import duplicate index utilities
+from lead_index import (
+    create_email_index_indexes,
+    update_email_index,
+    remove_from_email_index,
+    rebuild_email_index,
+    get_duplicate_groups,
+    merge_duplicate_group,
+    merge_all_duplicates
+)
+
+# Import lead allocator
+from lead_allocator import (
+    LeadAllocator,
+    WindowedLeadAllocator,
+    MAX_DISTRIBUTIONS_PER_LEAD,
+    get_tier_quota,
+    eligible_members_filter,
+    iter_eligible_member_batches
+)
+
+# Import batched distribution writer
+from distribution_writer import (
+    MEMBER_WRITE_BATCH_SIZE,
+    DISTRIBUTION_CONCURRENCY,
+    WriteRateLimiter,
+    run_partitioned,
+    write_distribution_batch
+)
+
+# Import checkpointed distribution runs
+from distribution_runs import (
+    create_distribution_run_indexes,
+    start_distribution_run,
+    load_pending_chunks,
+    load_chunk_leads,
+    repair_interrupted_chunk,
+    mark_chunk_writing,
+    commit_chunk,
+    get_failed_chunks,
+    finish_distribution_run,
+    release_distribution_run,
+    claim_distribution_run,
+    claim_interrupted_runs,
+    run_percent_complete,
+    RunLease,
+    RunLeaseLost
+)
+
+# Import cross-run repeat prevention
+from lead_assignments import (
+    create_lead_assignment_indexes,
+    intern_members,
+    make_repeat_check,
+    lead_assignment_updates,
+    rebuild_lead_assignment_sets
+)
+
+# Import dry-run distribution planner
+from distribution_planner import plan_distribution
+
+# Import background lead validation job
+from lead_validation_job import run_lead_validation_job, pause_interrupted_validation_jobs
+
+# Import member CSV rendering and storage
+from csv_storage import (
+    CSV_BODY_FIELDS,
+    rendered_csv_fields,
+    csv_file_etag,
+    csv_range_etag,
+    csv_line_count,
+    iter_csv_body,
+    iter_csv_range,
+    gzip_stream,
+    iter_zip_export,
+    iter_ndjson_export,
+    read_csv_body
+)
+
+# Import integration API key verification
+from api_keys import (
+    create_api_key_indexes,
+    generate_api_key,
+    verify_api_key,
+    has_permissions,
+    invalidate_api_key
+)
+
+# Import buffered usage accounting
+from usage_accounting import (
+    record_key_usage,
+    record_export_log,
+    start_usage_buffer,
+    stop_usage_buffer
+)
+
+# Import integration rate limiting
+from rate_limiter import (
+    DEFAULT_RATE_LIMIT,
+    create_rate_limiter,
+    create_rate_limit_indexes,
+    period_seconds as rate_limit_period_seconds
+)
+
+# Import member CSV change feed
+from csv_change_feed import (
+    CHANGE_FEED_DEFAULT_LIMIT,
+    create_csv_change_feed_indexes,
+    list_csv_file_changes
+)
+
+# Import queued notification and email fan-out
+from email_outbox import (
+    create_email_outbox_indexes,
+    build_outbox_email,
+    enqueue_notifications,
+    start_email_outbox_worker,
+    stop_email_outbox_worker
 )
 
 # Import scheduler utilities
-from scheduler import start_scheduler_task, calculate_next_run
+from scheduler import start_scheduler_task, calculate_next_run, notify_schedules_changed
 
 # Import email service from the same directory
 try:
     from email_service import (
         send_new_referral_email,
-        send_lead_distribution_email,
+        lead_distribution_email_content,
         send_payment_confirmation_email,
         send_subscription_reminder_email,
         send_commission_payout_email,
@@ -60,7 +199,7 @@ except ImportError as e:
     logging.error(f"Failed to import email_service: {str(e)}")
     # Define dummy functions if import fails
     async def send_new_referral_email(*args, **kwargs): pass
-    async def send_lead_distribution_email(*args, **kwargs): pass
+    def lead_distribution_email_content(*args, **kwargs): return "", ""
     async def send_payment_confirmation_email(*args, **kwargs): pass
     async def send_subscription_reminder_email(*args, **kwargs): pass
     async def send_commission_payout_email(*args, **kwargs): pass
@@ -97,11 +236,35 @@ async def startup_event():
     await start_scheduler_task()
     # Create integration database indexes
     await create_integration_indexes()
+    # Create lead system database indexes
+    await create_lead_indexes()
+    # Start sending queued notification emails
+    await start_email_outbox_worker(db)
+    # Start buffering API key usage and export logs
+    await start_usage_buffer(db)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared connections on shutdown"""
+    await close_email_validation_client()
+    await stop_email_outbox_worker()
+    await stop_usage_buffer()
 
 # Database connection
 client = AsyncIOMotorClient(os.getenv("MONGO_URL"))
 db = client[os.getenv("DB_NAME")]
 
+# Background jobs started by requests (referenced so they are not garbage collected mid-run)
+_background_tasks: set = set()
+
+
+def start_background_task(coro) -> asyncio.Task:
+    """Run a coroutine as a background task, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
 # Configuration
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
@@ -220,9 +383,20 @@ class ScheduleUpdate(BaseModel):
     tier_allocations: Optional[Dict[str, int]] = None
     enabled: Optional[bool] = None
 
+class ChunkedUploadInit(BaseModel):
+    filename: str
+    total_size: int  # Bytes
+    total_chunks: int
+    chunk_size: int  # Bytes, every chunk except the last must be exactly this size
+    check_duplicates: bool = True
+    validate_emails: bool = False
+    skip_duplicates: bool = False
+    validation_mode: str = "remote"  # 'offline', 'hybrid' or 'remote'
+
 class EmailValidationRequest(BaseModel):
     emails: List[str]
     use_api: bool = True
+    mode: Optional[str] = None  # 'offline', 'hybrid' or 'remote'
 
 class MembershipTierConfig(BaseModel):
     tier_name: str
@@ -346,6 +520,13 @@ class CSVExportRequest(BaseModel):
     file_id: str
     format: str = "csv"
 
+class CSVBatchExportRequest(BaseModel):
+    user_id: str
+    file_ids: Optional[List[str]] = None
+    since: Optional[datetime] = None  # Files created after this (when no file_ids)
+    since_file_id: Optional[str] = None  # With since: resume after this file (X-Next-Since-File-Id)
+    format: str = "zip"  # zip | ndjson
+
 class CSVExportResponse(BaseModel):
     success: bool
     csv_data: Optional[str] = None
@@ -5179,12 +5360,340 @@ async def get_referral_info(referral_code: str):
     }
 
 # Leads Distribution System
+# Required lead CSV headers (matched case-insensitively)
+LEAD_CSV_REQUIRED_HEADERS = ['name', 'email', 'address']
+
+
+def map_lead_csv_headers(fieldnames: Optional[List[str]]) -> Dict[str, str]:
+    """
+    Map required lead headers to the actual CSV headers (case-insensitive)
+    Raises HTTPException(400) if any required header is missing
+    """
+    fieldnames = fieldnames or []
+    header_mapping = {}
+    for header in fieldnames:
+        for required in LEAD_CSV_REQUIRED_HEADERS:
+            if header.lower() == required.lower():
+                header_mapping[required] = header
+                break
+    
+    # Validate headers
+    missing_headers = [header for header in LEAD_CSV_REQUIRED_HEADERS if header not in header_mapping]
+    if missing_headers:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"CSV must contain headers: {', '.join(LEAD_CSV_REQUIRED_HEADERS)}. Found headers: {', '.join(fieldnames)}"
+        )
+    return header_mapping
+
+
+def build_lead_from_csv_row(row: dict, header_mapping: Dict[str, str], row_num: int) -> dict:
+    """
+    Validate a lead CSV row and build the lead document
+    Raises HTTPException(400) if required data is missing
+    """
+    # Check if all required data is present using the mapped headers
+    missing_data = []
+    for required_header in LEAD_CSV_REQUIRED_HEADERS:
+        actual_header = header_mapping[required_header]
+        value = (row.get(actual_header) or '').strip()
+        if not value:
+            missing_data.append(actual_header)
+    
+    if missing_data:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing required data in row {row_num}: {', '.join(missing_data)}"
+        )
+    
+    return {
+        "lead_id": str(uuid.uuid4()),
+        "name": (row.get(header_mapping['name']) or '').strip(),
+        "email": (row.get(header_mapping['email']) or '').strip().lower(),
+        "address": (row.get(header_mapping['address']) or '').strip(),
+        "distribution_count": 0,
+        "assigned_members": [],
+        "created_at": datetime.utcnow()
+    }
+
+
+LEAD_INGEST_BATCH_SIZE = 5000  # Leads parsed, validated and inserted per batch
+
+
+def iter_lead_csv_rows(lines) -> Iterator[dict]:
+    """Parse lead CSV text lines (any iterable of str) into lead documents, one row at a time"""
+    csv_reader = csv.DictReader(lines)
+    header_mapping = map_lead_csv_headers(csv_reader.fieldnames)
+    for row_num, row in enumerate(csv_reader, start=2):
+        yield build_lead_from_csv_row(row, header_mapping, row_num)
+
+
+async def iter_lead_csv_batches(open_lines: Callable[[], Iterable[str]], batch_size: int = LEAD_INGEST_BATCH_SIZE):
+    """
+    Batches of parsed leads from a fresh pass over the CSV lines
+    Parsing (and reading chunks from disk) runs in a worker thread.
+    """
+    rows = iter_lead_csv_rows(open_lines())
+    while True:
+        batch = await asyncio.to_thread(lambda: list(itertools.islice(rows, batch_size)))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_lead_csv_block(text: str, fieldnames: Optional[List[str]], first_row_num: int) -> Tuple[List[str], List[dict]]:
+    """
+    Parse complete lead CSV rows into lead documents carrying their row_num
+    Without fieldnames the block starts with the header row.
+    """
+    csv_reader = csv.DictReader(io.StringIO(text), fieldnames=fieldnames)
+    header_mapping = map_lead_csv_headers(csv_reader.fieldnames)
+    leads = []
+    for row_num, row in enumerate(csv_reader, start=first_row_num):
+        lead = build_lead_from_csv_row(row, header_mapping, row_num)
+        lead["row_num"] = row_num
+        leads.append(lead)
+    return list(csv_reader.fieldnames), leads
+
+
+async def discard_partial_lead_distribution(distribution_id: str):
+    """
+    Delete a distribution whose ingest did not finish, with the leads it
+    already stored and their duplicate index entries, so the upload can be
+    retried without inserting those leads twice. Safe to repeat.
+    """
+    while True:
+        leads = await db.leads.find(
+            {"distribution_id": distribution_id}, {"_id": 0, "lead_id": 1, "email": 1}
+        ).limit(LEAD_INGEST_BATCH_SIZE).to_list(None)
+        if not leads:
+            break
+        await remove_from_email_index(db, leads, distribution_id)
+        await db.leads.delete_many({"lead_id": {"$in": [lead["lead_id"] for lead in leads]}})
+    await db.lead_distributions.delete_one({"distribution_id": distribution_id})
+
+
+async def ingest_uploaded_leads(
+    open_batches: Callable[[], AsyncIterator[List[dict]]],
+    filename: str,
+    uploaded_by: str,
+    check_duplicates_bool: bool,
+    validate_emails_bool: bool,
+    skip_duplicates_bool: bool,
+    validation_mode: Optional[str] = "remote",
+    distribution_id: Optional[str] = None
+) -> dict:
+    """
+    Run duplicate detection and email validation on uploaded leads, then store
+    them under a new lead distribution. Shared by the single-request and
+    chunked upload paths. Returns the API response (or a duplicate report).
+    open_batches returns a fresh async iterator of parsed lead batches each
+    time it is called: a first pass checks every row and collects emails for
+    duplicate detection, a second pass validates and inserts the leads batch
+    by batch, so the parsed file is never held in memory. If the second pass
+    fails, the leads it stored are deleted again.
+    """
+    if validate_emails_bool and validation_mode not in VALIDATION_MODES:
+        raise HTTPException(status_code=400, detail=f"validation_mode must be one of: {', '.join(VALIDATION_MODES)}")
+    
+    # First pass: reject bad rows before anything is written, collect duplicates
+    total_rows = 0
+    seen_emails = set()
+    duplicates_in_csv = set()
+    existing_emails = set()
+    async for batch in open_batches():
+        total_rows += len(batch)
+        if not check_duplicates_bool:
+            continue
+        batch_emails = set()
+        for lead in batch:
+            if lead["email"] in seen_emails:
+                duplicates_in_csv.add(lead["email"])
+            seen_emails.add(lead["email"])
+            batch_emails.add(lead["email"])
+        existing = await db.leads.find(
+            {"email": {"$in": list(batch_emails)}}, {"_id": 0, "email": 1}
+        ).to_list(None)
+        existing_emails.update(lead["email"] for lead in existing)
+    
+    if total_rows == 0:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    
+    # ENHANCEMENT 1: Check for duplicates
+    if check_duplicates_bool:
+        if duplicates_in_csv and not skip_duplicates_bool:
+            return {
+                "error": "duplicate_in_csv",
+                "message": f"Found {len(duplicates_in_csv)} duplicate emails within the CSV",
+                "duplicates": list(duplicates_in_csv)[:20],  # Show first 20
+                "total_duplicates": len(duplicates_in_csv),
+                "action_required": "remove_duplicates_or_skip"
+            }
+        
+        if existing_emails and not skip_duplicates_bool:
+            return {
+                "error": "duplicate_in_database",
+                "message": f"Found {len(existing_emails)} emails that already exist in database",
+                "duplicates": list(existing_emails)[:20],
+                "total_duplicates": len(existing_emails),
+                "total_new_leads": total_rows - len(existing_emails),
+                "actions": {
+                    "skip_duplicates": "Upload only new leads",
+                    "cancel": "Cancel upload"
+                }
+            }
+        
+        if skip_duplicates_bool:
+            new_lead_count = len(seen_emails - existing_emails)
+            if new_lead_count == 0:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"All {total_rows} leads were duplicates. No new leads to upload."
+                )
+            logger.info(f"Skipping {total_rows - new_lead_count} duplicate leads, uploading {new_lead_count} new leads")
+    
+    # Create lead distribution record (queued once every batch is stored)
+    distribution_id = distribution_id or str(uuid.uuid4())
+    distribution_doc = {
+        "distribution_id": distribution_id,
+        "filename": filename,
+        "total_leads": 0,
+        "status": "uploading",
+        "uploaded_by": uploaded_by,
+        "uploaded_at": datetime.utcnow(),
+        "processing_started_at": None,
+        "processing_completed_at": None,
+        "validation_performed": validate_emails_bool,
+        "duplicates_skipped": skip_duplicates_bool
+    }
+    await db.lead_distributions.insert_one(distribution_doc)
+    
+    # Second pass: filter, validate and store batch by batch
+    stored_leads = 0
+    stored_emails = set()
+    validation_stats = None
+    invalid_emails_skipped = 0
+    try:
+        async for leads_data in open_batches():
+            if check_duplicates_bool and skip_duplicates_bool:
+                filtered_leads = []
+                for lead in leads_data:
+                    if lead["email"] not in stored_emails and lead["email"] not in existing_emails:
+                        stored_emails.add(lead["email"])
+                        filtered_leads.append(lead)
+                leads_data = filtered_leads
+            
+            # ENHANCEMENT 2: Email validation (optional)
+            if validate_emails_bool and leads_data:
+                validation_results = await analyze_csv_emails(
+                    [lead["email"] for lead in leads_data], use_api=True, mode=validation_mode
+                )
+                if validation_stats is None:
+                    validation_stats = Counter()
+                validation_stats.update(validation_results["stats"])
+                
+                # Filter out invalid emails
+                valid_leads = []
+                for i, lead in enumerate(leads_data):
+                    if i < len(validation_results.get("validation_results", [])):
+                        result = validation_results["validation_results"][i]
+                        if result.get("valid", False):
+                            # Add validation data to valid leads
+                            lead["email_validated"] = True
+                            lead["validation_status"] = result.get("status", "VALID")
+                            lead["is_disposable"] = result.get("is_disposable", False)
+                            lead["is_role_based"] = result.get("is_role_based", False)
+                            lead["validation_date"] = datetime.utcnow()
+                            valid_leads.append(lead)
+                        else:
+                            invalid_emails_skipped += 1
+                            logger.info(f"Skipped invalid email: {lead['email']} - Status: {result.get('status', 'INVALID')}")
+                    else:
+                        # If no validation result, include the lead
+                        valid_leads.append(lead)
+                leads_data = valid_leads
+            
+            if leads_data:
+                for lead in leads_data:
+                    lead["distribution_id"] = distribution_id
+                await db.leads.insert_many(leads_data)
+                await update_email_index(db, leads_data)
+                stored_leads += len(leads_data)
+    except Exception as e:
+        logger.error(f"Ingest of distribution {distribution_id} failed after {stored_leads} leads, rolling back: {str(e)}")
+        try:
+            await discard_partial_lead_distribution(distribution_id)
+        except Exception as rollback_error:
+            # Left for sweep_abandoned_lead_uploads to discard
+            logger.error(f"Failed to roll back distribution {distribution_id}: {str(rollback_error)}")
+            await db.lead_distributions.update_one(
+                {"distribution_id": distribution_id},
+                {"$set": {"status": "failed", "rollback_pending": True, "total_leads": stored_leads, "error_message": str(e)}}
+            )
+        raise
+    
+    if invalid_emails_skipped > 0:
+        logger.warning(f"Filtered out {invalid_emails_skipped} invalid emails, uploading {stored_leads} valid leads")
+    
+    if stored_leads == 0:
+        # All leads were invalid or duplicates
+        await db.lead_distributions.delete_one({"distribution_id": distribution_id})
+        raise HTTPException(
+            status_code=400,
+            detail="No valid leads to upload. All leads were either duplicates or invalid."
+        )
+    
+    # Calculate eligible members for distribution
+    eligible_members = await db.users.count_documents(eligible_members_filter())
+    
+    # Estimate distribution timeline (assuming weekly distribution)
+    max_leads_per_member = 10  # Each lead can go to max 10 members
+    total_distributions_possible = stored_leads * max_leads_per_member
+    leads_per_week = eligible_members * 5  # Assume 5 leads per member per week
+    estimated_weeks = max(1, total_distributions_possible // leads_per_week) if leads_per_week > 0 else 0
+    
+    # Queue the distribution with its estimates
+    await db.lead_distributions.update_one(
+        {"distribution_id": distribution_id},
+        {"$set": {
+            "status": "queued",
+            "total_leads": stored_leads,
+            "eligible_members": eligible_members,
+            "estimated_weeks": estimated_weeks
+        }}
+    )
+    
+    response = {
+        "distribution_id": distribution_id,
+        "total_leads": stored_leads,
+        "eligible_members": eligible_members,
+        "estimated_weeks": estimated_weeks,
+        "status": "queued"
+    }
+    
+    # Add validation summary if performed
+    if validation_stats is not None:
+        response["validation"] = {
+            "total_checked": validation_stats["total"],
+            "valid": stored_leads,
+            "invalid_skipped": invalid_emails_skipped,
+            "invalid_format": validation_stats.get("invalid_format", 0),
+            "invalid_domain": validation_stats.get("invalid_domain", 0),
+            "disposable": validation_stats.get("disposable", 0),
+            "role_based": validation_stats.get("role_based", 0),
+            "api_errors": validation_stats.get("api_errors", 0)
+        }
+    
+    return response
+
+
 @app.post("/api/admin/leads/upload")
 async def upload_leads_csv(
     request: Request,
     check_duplicates: str = Form("true"),
     validate_emails: str = Form("false"),
     skip_duplicates: str = Form("false"),
+    validation_mode: str = Form("remote"),
     admin: dict = Depends(get_admin_user)
 ):
     """Upload CSV file for lead distribution with duplicate detection and email validation"""
@@ -5204,252 +5713,539 @@ async def upload_leads_csv(
         contents = await csv_file.read()
         csv_content = contents.decode('utf-8')
         
-        # Parse CSV to validate structure and count rows
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        leads_data = []
-        # Required headers (case-insensitive)
-        required_headers = ['name', 'email', 'address']
-        
-        # Create a case mapping for headers
-        header_mapping = {}
-        for header in csv_reader.fieldnames:
-            for required in required_headers:
-                if header.lower() == required.lower():
-                    header_mapping[required] = header
-                    break
+        return await ingest_uploaded_leads(
+            lambda: iter_lead_csv_batches(lambda: io.StringIO(csv_content)),
+            csv_file.filename,
+            admin["username"],
+            check_duplicates_bool,
+            validate_emails_bool,
+            skip_duplicates_bool,
+            validation_mode
+        )
         
-        # Validate headers
-        missing_headers = [header for header in required_headers if header not in header_mapping]
-        if missing_headers:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"CSV must contain headers: {', '.join(required_headers)}. Found headers: {', '.join(csv_reader.fieldnames)}"
-            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to upload leads CSV: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to process CSV file")
+
+
+# =============================================================================
+# CHUNKED (RESUMABLE) LEAD CSV UPLOADS
+# =============================================================================
+
+UPLOAD_PARSE_LEASE_SECONDS = 300  # How long one request may hold an upload's parsing turn
+
+
+def parse_lead_upload_chunk(upload: dict, chunk_index: int) -> Tuple[List[dict], Optional[List[str]], bytes, int]:
+    """
+    Parse the complete rows that a stored chunk finishes (runs in a worker thread)
+    The partial row at the end of the chunk is carried into the next one.
+    Returns (leads, csv fieldnames, carried partial row, rows parsed so far).
+    Raises HTTPException(400) for bad rows and ValueError for bad chunk data.
+    """
+    data = read_chunk(upload["upload_id"], chunk_index, upload.get("chunk_checksums", {}).get(str(chunk_index)))
+    data = bytes(upload.get("pending_row") or b"") + data
+    if chunk_index == upload["total_chunks"] - 1:
+        complete, pending = data, b""
+    else:
+        complete, pending = split_complete_rows(data)
+    
+    fieldnames = upload.get("csv_fieldnames")
+    parsed_rows = upload.get("parsed_rows", 0)
+    if len(pending) > MAX_PENDING_ROW_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Row {parsed_rows + 2} is longer than {MAX_PENDING_ROW_SIZE} bytes or has an unclosed quote"
+        )
+    try:
+        # Until the header is parsed the block starts at the beginning of the file
+        text = complete.decode("utf-8-sig" if fieldnames is None else "utf-8")
+    except UnicodeDecodeError:
+        raise ValueError(f"Chunk {chunk_index} is not valid UTF-8")
+    if not text:
+        return [], fieldnames, pending, parsed_rows
+    
+    fieldnames, leads = parse_lead_csv_block(text, fieldnames, parsed_rows + 2)
+    return leads, fieldnames, pending, parsed_rows + len(leads)
+
+
+async def stage_received_lead_chunks(upload_id: str) -> Optional[Tuple[int, HTTPException]]:
+    """
+    Parse received chunks in order, as soon as each one continues the parsed
+    prefix, and stage their rows in lead_upload_rows so that completing the
+    upload only has to filter and insert them. One request parses at a time
+    (a leased turn on the upload); the others just store their chunk.
+    A chunk with bad rows is removed so a corrected one can be sent again.
+    Returns (chunk_index, error) of a rejected chunk, if any.
+    """
+    while True:
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=UPLOAD_PARSE_LEASE_SECONDS)
+        upload = await db.lead_uploads.find_one_and_update(
+            {
+                "upload_id": upload_id,
+                "status": {"$in": ["uploading", "completing"]},
+                "$or": [{"parsing_until": None}, {"parsing_until": {"$lt": now}}]
+            },
+            {"$set": {"parsing_until": lease_until}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not upload:
+            return None
+        turn = {"upload_id": upload_id, "parsing_until": lease_until}
+        
+        chunk_index = upload.get("parsed_chunks", 0)
+        if chunk_index >= upload["total_chunks"] or chunk_index not in upload["received_chunks"]:
+            await db.lead_uploads.update_one(turn, {"$set": {"parsing_until": None}})
+            # Pick up a chunk that was recorded while this turn was held
+            upload = await db.lead_uploads.find_one({"upload_id": upload_id})
+            chunk_index = upload.get("parsed_chunks", 0)
+            if chunk_index < upload["total_chunks"] and chunk_index in upload["received_chunks"]:
+                continue
+            return None
         
-        # Process and validate CSV rows
-        for row_num, row in enumerate(csv_reader, start=2):
-            # Check if all required data is present using the mapped headers
-            missing_data = []
-            for required_header in required_headers:
-                actual_header = header_mapping[required_header]
-                value = row.get(actual_header, '').strip()
-                if not value:
-                    missing_data.append(actual_header)
-            
-            if missing_data:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Missing required data in row {row_num}: {', '.join(missing_data)}"
+        try:
+            try:
+                leads, fieldnames, pending, parsed_rows = await asyncio.to_thread(
+                    parse_lead_upload_chunk, upload, chunk_index
                 )
-            
-            lead_data = {
-                "lead_id": str(uuid.uuid4()),
-                "name": row.get(header_mapping['name'], '').strip(),
-                "email": row.get(header_mapping['email'], '').strip().lower(),
-                "address": row.get(header_mapping['address'], '').strip(),
-                "distribution_count": 0,
-                "created_at": datetime.utcnow()
-            }
-            leads_data.append(lead_data)
-        
-        if len(leads_data) == 0:
-            raise HTTPException(status_code=400, detail="CSV file is empty")
-        
-        # ENHANCEMENT 1: Check for duplicates
-        if check_duplicates_bool:
-            # Check for duplicates within CSV
-            emails_in_csv = [lead["email"] for lead in leads_data]
-            email_counts = {}
-            duplicates_in_csv = []
-            
-            for email in emails_in_csv:
-                if email in email_counts:
-                    duplicates_in_csv.append(email)
-                email_counts[email] = email_counts.get(email, 0) + 1
-            
-            if duplicates_in_csv and not skip_duplicates_bool:
-                return {
-                    "error": "duplicate_in_csv",
-                    "message": f"Found {len(set(duplicates_in_csv))} duplicate emails within the CSV",
-                    "duplicates": list(set(duplicates_in_csv))[:20],  # Show first 20
-                    "total_duplicates": len(set(duplicates_in_csv)),
-                    "action_required": "remove_duplicates_or_skip"
-                }
-            
-            # Check for duplicates against existing leads in database
-            existing_emails = set()
-            for lead in leads_data:
-                existing = await db.leads.find_one({"email": lead["email"]})
-                if existing:
-                    existing_emails.add(lead["email"])
-            
-            if existing_emails and not skip_duplicates_bool:
-                return {
-                    "error": "duplicate_in_database",
-                    "message": f"Found {len(existing_emails)} emails that already exist in database",
-                    "duplicates": list(existing_emails)[:20],
-                    "total_duplicates": len(existing_emails),
-                    "total_new_leads": len(leads_data) - len(existing_emails),
-                    "actions": {
-                        "skip_duplicates": "Upload only new leads",
-                        "cancel": "Cancel upload"
+            except (HTTPException, ValueError) as e:
+                error = e if isinstance(e, HTTPException) else HTTPException(status_code=400, detail=str(e))
+                await asyncio.to_thread(remove_chunk, upload_id, chunk_index)
+                await db.lead_uploads.update_one(
+                    turn,
+                    {
+                        "$pull": {"received_chunks": chunk_index},
+                        "$unset": {f"chunk_checksums.{chunk_index}": ""},
+                        "$set": {
+                            "parsing_until": None,
+                            "error_message": f"Chunk {chunk_index} rejected: {error.detail}",
+                            "updated_at": datetime.utcnow()
+                        }
                     }
-                }
-            
-            # If skip_duplicates is enabled, filter out duplicates
-            if skip_duplicates_bool:
-                # Remove duplicates from leads_data
-                original_count = len(leads_data)
-                unique_emails = set()
-                filtered_leads = []
-                
-                for lead in leads_data:
-                    if lead["email"] not in unique_emails and lead["email"] not in existing_emails:
-                        unique_emails.add(lead["email"])
-                        filtered_leads.append(lead)
-                
-                leads_data = filtered_leads
-                skipped_count = original_count - len(leads_data)
-                
-                if len(leads_data) == 0:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"All {original_count} leads were duplicates. No new leads to upload."
-                    )
-                
-                logger.info(f"Skipped {skipped_count} duplicate leads, uploading {len(leads_data)} new leads")
-        
-        # ENHANCEMENT 2: Email validation (optional)
-        validation_results = None
-        invalid_emails_skipped = 0
-        if validate_emails_bool:
-            emails_to_validate = [lead["email"] for lead in leads_data]
-            validation_results = await analyze_csv_emails(emails_to_validate, use_api=True)
-            
-            # Filter out invalid emails
-            valid_leads = []
-            for i, lead in enumerate(leads_data):
-                if i < len(validation_results.get("validation_results", [])):
-                    result = validation_results["validation_results"][i]
-                    if result.get("valid", False):
-                        # Add validation data to valid leads
-                        lead["email_validated"] = True
-                        lead["validation_status"] = result.get("status", "VALID")
-                        lead["is_disposable"] = result.get("is_disposable", False)
-                        lead["is_role_based"] = result.get("is_role_based", False)
-                        lead["validation_date"] = datetime.utcnow()
-                        valid_leads.append(lead)
-                    else:
-                        invalid_emails_skipped += 1
-                        logger.info(f"Skipped invalid email: {lead['email']} - Status: {result.get('status', 'INVALID')}")
-                else:
-                    # If no validation result, include the lead
-                    valid_leads.append(lead)
-            
-            # Replace leads_data with only valid leads
-            original_count = len(leads_data)
-            leads_data = valid_leads
-            
-            if invalid_emails_skipped > 0:
-                logger.warning(f"Filtered out {invalid_emails_skipped} invalid emails, uploading {len(leads_data)} valid leads")
-        
-        # Create lead distribution record
-        distribution_id = str(uuid.uuid4())
-        distribution_doc = {
-            "distribution_id": distribution_id,
-            "filename": csv_file.filename,
-            "total_leads": len(leads_data),
-            "status": "queued",
-            "uploaded_by": admin["username"],
-            "uploaded_at": datetime.utcnow(),
-            "processing_started_at": None,
-            "processing_completed_at": None,
-            "validation_performed": validate_emails_bool,
-            "duplicates_skipped": skip_duplicates_bool
-        }
-        
-        # Store distribution record
-        await db.lead_distributions.insert_one(distribution_doc)
-        
-        # Store individual leads (validation data already added if validation was performed)
-        for lead in leads_data:
-            lead["distribution_id"] = distribution_id
-        
-        if len(leads_data) > 0:
-            await db.leads.insert_many(leads_data)
-        else:
-            # All leads were invalid or duplicates
+                )
+                return chunk_index, error
+            
+            # Staging a chunk is repeatable: rows of an earlier, interrupted attempt are replaced
+            await db.lead_upload_rows.delete_many({"upload_id": upload_id, "chunk_index": chunk_index})
+            if leads:
+                for lead in leads:
+                    lead["upload_id"] = upload_id
+                    lead["chunk_index"] = chunk_index
+                    lead["expires_at"] = upload["expires_at"]
+                await db.lead_upload_rows.insert_many(leads)
+            
+            result = await db.lead_uploads.update_one(
+                {**turn, "parsed_chunks": chunk_index},
+                {"$set": {
+                    "parsed_chunks": chunk_index + 1,
+                    "parsed_rows": parsed_rows,
+                    "pending_row": pending,
+                    "csv_fieldnames": fieldnames,
+                    "parsing_until": None,
+                    "updated_at": datetime.utcnow()
+                }}
+            )
+            if result.modified_count == 0:
+                # Turn expired and was taken over; the new holder continues
+                return None
+        except Exception:
+            await db.lead_uploads.update_one(turn, {"$set": {"parsing_until": None}})
+            raise
+
+
+async def iter_staged_lead_batches(upload_id: str, batch_size: int = LEAD_INGEST_BATCH_SIZE):
+    """Batches of the leads staged for a chunked upload, in file order"""
+    last_row_num = 0
+    while True:
+        batch = await db.lead_upload_rows.find(
+            {"upload_id": upload_id, "row_num": {"$gt": last_row_num}},
+            {"_id": 0, "upload_id": 0, "chunk_index": 0, "expires_at": 0}
+        ).sort("row_num", 1).limit(batch_size).to_list(None)
+        if not batch:
+            return
+        last_row_num = batch[-1]["row_num"]
+        for lead in batch:
+            del lead["row_num"]
+        yield batch
+
+
+@app.post("/api/admin/leads/upload/init")
+async def init_chunked_lead_upload(
+    upload: ChunkedUploadInit,
+    admin: dict = Depends(get_admin_user)
+):
+    """Start a resumable chunked upload for a large lead CSV"""
+    try:
+        if upload.chunk_size <= 0 or upload.chunk_size > MAX_CHUNK_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"chunk_size must be between 1 and {MAX_CHUNK_SIZE} bytes"
+            )
+        expected_chunks = max(1, (upload.total_size + upload.chunk_size - 1) // upload.chunk_size)
+        if upload.total_size <= 0 or upload.total_chunks != expected_chunks:
+            raise HTTPException(
+                status_code=400,
+                detail=f"total_chunks must be {expected_chunks} for total_size {upload.total_size} and chunk_size {upload.chunk_size}"
+            )
+        if upload.validation_mode not in VALIDATION_MODES:
             raise HTTPException(
                 status_code=400,
-                detail="No valid leads to upload. All leads were either duplicates or invalid."
+                detail=f"validation_mode must be one of: {', '.join(VALIDATION_MODES)}"
             )
         
-        # Calculate eligible members for distribution
-        eligible_members = await db.users.count_documents({
-            "membership_tier": {"$in": ["bronze", "silver", "gold"]},
-            "suspended": {"$ne": True}
+        upload_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        await db.lead_uploads.insert_one({
+            "upload_id": upload_id,
+            "filename": upload.filename,
+            "total_size": upload.total_size,
+            "total_chunks": upload.total_chunks,
+            "chunk_size": upload.chunk_size,
+            "check_duplicates": upload.check_duplicates,
+            "validate_emails": upload.validate_emails,
+            "skip_duplicates": upload.skip_duplicates,
+            "validation_mode": upload.validation_mode,
+            "received_chunks": [],
+            "chunk_checksums": {},
+            "parsed_chunks": 0,
+            "parsed_rows": 0,
+            "pending_row": b"",
+            "csv_fieldnames": None,
+            "parsing_until": None,
+            "status": "uploading",
+            "distribution_id": None,
+            "created_by": admin["username"],
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + timedelta(hours=UPLOAD_EXPIRY_HOURS)
         })
         
-        # Estimate distribution timeline (assuming weekly distribution)
-        max_leads_per_member = 10  # Each lead can go to max 10 members
-        total_distributions_possible = len(leads_data) * max_leads_per_member
-        leads_per_week = eligible_members * 5  # Assume 5 leads per member per week
-        estimated_weeks = max(1, total_distributions_possible // leads_per_week) if leads_per_week > 0 else 0
-        
-        # Update distribution with estimates
-        await db.lead_distributions.update_one(
-            {"distribution_id": distribution_id},
-            {"$set": {
-                "eligible_members": eligible_members,
-                "estimated_weeks": estimated_weeks
-            }}
-        )
-        
-        response = {
-            "distribution_id": distribution_id,
-            "total_leads": len(leads_data),
-            "eligible_members": eligible_members,
-            "estimated_weeks": estimated_weeks,
-            "status": "queued"
+        return {
+            "upload_id": upload_id,
+            "total_chunks": upload.total_chunks,
+            "chunk_size": upload.chunk_size,
+            "expires_at": (now + timedelta(hours=UPLOAD_EXPIRY_HOURS)).isoformat()
         }
         
-        # Add validation summary if performed
-        if validation_results:
-            response["validation"] = {
-                "total_checked": validation_results["stats"]["total"],
-                "valid": len(leads_data),
-                "invalid_skipped": invalid_emails_skipped,
-                "invalid_format": validation_results["stats"].get("invalid_format", 0),
-                "invalid_domain": validation_results["stats"].get("invalid_domain", 0),
-                "disposable": validation_results["stats"].get("disposable", 0),
-                "role_based": validation_results["stats"].get("role_based", 0)
-            }
-        
-        return response
-        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to upload leads CSV: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to process CSV file")
+        logger.error(f"Failed to initialise chunked upload: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to initialise upload")
 
-@app.get("/api/admin/leads/distributions")
-async def get_lead_distributions(
-    page: int = 1,
-    limit: int = 20,
+
+@app.put("/api/admin/leads/upload/{upload_id}/chunks/{chunk_index}")
+async def upload_lead_csv_chunk(
+    upload_id: str,
+    chunk_index: int,
+    request: Request,
+    x_chunk_checksum: Optional[str] = Header(None, alias="X-Chunk-Checksum"),
     admin: dict = Depends(get_admin_user)
 ):
-    """Get all lead distributions with status"""
+    """
+    Upload one chunk (raw request body). X-Chunk-Checksum must carry the
+    SHA-256 hex digest of the chunk. Re-sending a chunk is idempotent.
+    Rows are parsed and staged as soon as the chunks before them have
+    arrived, so a chunk with bad rows is rejected here with a 400.
+    """
     try:
-        skip = (page - 1) * limit
-        
-        # Get total count
-        total_count = await db.lead_distributions.count_documents({})
+        upload = await db.lead_uploads.find_one({"upload_id": upload_id})
+        if not upload:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if upload["status"] != "uploading":
+            raise HTTPException(status_code=409, detail=f"Upload is {upload['status']}")
+        if chunk_index < 0 or chunk_index >= upload["total_chunks"]:
+            raise HTTPException(status_code=400, detail="chunk_index out of range")
+        if not x_chunk_checksum:
+            raise HTTPException(status_code=400, detail="X-Chunk-Checksum header is required")
+        
+        data = await request.body()
+        if len(data) == 0 or len(data) > upload["chunk_size"]:
+            raise HTTPException(status_code=400, detail="Chunk size does not match the upload")
+        
+        if chunk_index < upload.get("parsed_chunks", 0):
+            # Already staged: only an identical re-send is accepted
+            if compute_checksum(data) != upload["chunk_checksums"].get(str(chunk_index)):
+                raise HTTPException(status_code=409, detail=f"Chunk {chunk_index} was already ingested")
+        else:
+            try:
+                checksum = await asyncio.to_thread(write_chunk, upload_id, chunk_index, data, x_chunk_checksum)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            await db.lead_uploads.update_one(
+                {"upload_id": upload_id},
+                {
+                    "$addToSet": {"received_chunks": chunk_index},
+                    "$set": {
+                        f"chunk_checksums.{chunk_index}": checksum,
+                        "updated_at": datetime.utcnow()
+                    }
+                }
+            )
+            
+            rejected = await stage_received_lead_chunks(upload_id)
+            if rejected and rejected[0] == chunk_index:
+                raise rejected[1]
+        
+        upload = await db.lead_uploads.find_one({"upload_id": upload_id})
+        return {
+            "upload_id": upload_id,
+            "chunk_index": chunk_index,
+            "checksum": upload["chunk_checksums"].get(str(chunk_index)),
+            "received_chunks": len(upload["received_chunks"]),
+            "parsed_chunks": upload.get("parsed_chunks", 0),
+            "total_chunks": upload["total_chunks"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to store upload chunk: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to store chunk")
+
+
+@app.get("/api/admin/leads/upload/{upload_id}")
+async def get_chunked_lead_upload(
+    upload_id: str,
+    admin: dict = Depends(get_admin_user)
+):
+    """Get upload progress and the chunks still missing (for resuming)"""
+    try:
+        upload = await db.lead_uploads.find_one(
+            {"upload_id": upload_id},
+            {"_id": 0, "chunk_checksums": 0, "pending_row": 0}
+        )
+        if not upload:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        
+        received = set(upload.get("received_chunks", []))
+        missing_chunks = [i for i in range(upload["total_chunks"]) if i not in received]
+        
+        return {
+            "upload_id": upload_id,
+            "filename": upload["filename"],
+            "status": upload["status"],
+            "total_chunks": upload["total_chunks"],
+            "received_count": len(received),
+            "missing_chunks": missing_chunks[:1000],
+            "parsed_chunks": upload.get("parsed_chunks", 0),
+            "parsed_rows": upload.get("parsed_rows", 0),
+            "distribution_id": upload.get("distribution_id"),
+            "error_message": upload.get("error_message"),
+            "expires_at": upload.get("expires_at")
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to fetch upload status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch upload status")
+
+
+@app.post("/api/admin/leads/upload/{upload_id}/complete")
+async def complete_chunked_lead_upload(
+    upload_id: str,
+    skip_duplicates: Optional[bool] = None,
+    admin: dict = Depends(get_admin_user)
+):
+    """
+    Ingest a chunked upload from the rows staged while its chunks arrived,
+    through the same duplicate and validation rules as upload_leads_csv.
+    If a duplicate report or a validation error is returned the staged rows
+    are kept, so the admin can fix chunks or complete again with
+    skip_duplicates=true. Leads stored by a failed attempt are deleted
+    before the next one.
+    """
+    # Claim the upload so concurrent completes cannot ingest it twice
+    upload = await db.lead_uploads.find_one_and_update(
+        {"upload_id": upload_id, "status": "uploading"},
+        {"$set": {"status": "completing", "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not upload:
+        existing = await db.lead_uploads.find_one({"upload_id": upload_id})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        raise HTTPException(status_code=409, detail=f"Upload is {existing['status']}")
+    
+    try:
+        received = set(upload.get("received_chunks", []))
+        missing_chunks = [i for i in range(upload["total_chunks"]) if i not in received]
+        if missing_chunks:
+            await db.lead_uploads.update_one({"upload_id": upload_id}, {"$set": {"status": "uploading"}})
+            raise HTTPException(
+                status_code=409,
+                detail=f"{len(missing_chunks)} chunks missing, first missing chunk: {missing_chunks[0]}"
+            )
+        
+        rejected = await stage_received_lead_chunks(upload_id)
+        upload = await db.lead_uploads.find_one({"upload_id": upload_id})
+        if upload.get("parsed_chunks", 0) < upload["total_chunks"]:
+            if rejected:
+                raise rejected[1]
+            await db.lead_uploads.update_one({"upload_id": upload_id}, {"$set": {"status": "uploading"}})
+            raise HTTPException(status_code=409, detail="Chunks are still being ingested, complete the upload again shortly")
+        
+        if upload.get("distribution_id"):
+            previous = await db.lead_distributions.find_one(
+                {"distribution_id": upload["distribution_id"]}, {"_id": 0, "status": 1, "total_leads": 1}
+            )
+            if previous and previous["status"] not in ("uploading", "failed"):
+                # An earlier complete stored everything but did not record it
+                await db.lead_uploads.update_one(
+                    {"upload_id": upload_id},
+                    {"$set": {"status": "completed", "completed_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+                )
+                await db.lead_upload_rows.delete_many({"upload_id": upload_id})
+                await asyncio.to_thread(remove_upload, upload_id)
+                return {
+                    "distribution_id": upload["distribution_id"],
+                    "total_leads": previous.get("total_leads", 0),
+                    "status": previous["status"]
+                }
+            if previous:
+                await discard_partial_lead_distribution(upload["distribution_id"])
+        
+        # Recorded before ingesting, so a retry can discard what a failed attempt left
+        distribution_id = str(uuid.uuid4())
+        await db.lead_uploads.update_one({"upload_id": upload_id}, {"$set": {"distribution_id": distribution_id}})
+        
+        response = await ingest_uploaded_leads(
+            lambda: iter_staged_lead_batches(upload_id),
+            upload["filename"],
+            admin["username"],
+            upload["check_duplicates"],
+            upload["validate_emails"],
+            upload["skip_duplicates"] if skip_duplicates is None else skip_duplicates,
+            upload.get("validation_mode", "remote"),
+            distribution_id=distribution_id
+        )
+        
+        if "error" in response:
+            # Duplicate report - keep the staged rows so the admin can retry without re-uploading
+            await db.lead_uploads.update_one(
+                {"upload_id": upload_id},
+                {"$set": {"status": "uploading", "distribution_id": None}}
+            )
+            return response
+        
+        await db.lead_uploads.update_one(
+            {"upload_id": upload_id},
+            {"$set": {
+                "status": "completed",
+                "completed_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        await db.lead_upload_rows.delete_many({"upload_id": upload_id})
+        await asyncio.to_thread(remove_upload, upload_id)
+        
+        return response
+        
+    except HTTPException as e:
+        if e.status_code != 409:
+            # Keep the chunks: bad chunks can be re-sent and the upload completed again
+            await db.lead_uploads.update_one(
+                {"upload_id": upload_id},
+                {"$set": {"status": "uploading", "error_message": str(e.detail), "updated_at": datetime.utcnow()}}
+            )
+        raise
+    except Exception as e:
+        logger.error(f"Failed to complete chunked upload: {str(e)}")
+        await db.lead_uploads.update_one(
+            {"upload_id": upload_id},
+            {"$set": {"status": "uploading", "error_message": str(e), "updated_at": datetime.utcnow()}}
+        )
+        raise HTTPException(status_code=500, detail="Failed to process CSV file")
+
+
+async def sweep_abandoned_lead_uploads() -> int:
+    """
+    Delete chunk directories and staged rows on this host whose upload is no
+    longer in progress (expired and removed by the TTL index, failed or
+    completed), and discard distributions left half-stored by an ingest that
+    crashed or could not roll back
+    """
+    stale_before = datetime.utcnow() - timedelta(hours=UPLOAD_EXPIRY_HOURS)
+    partial_distributions = await db.lead_distributions.find(
+        {"$or": [
+            {"status": "uploading", "uploaded_at": {"$lt": stale_before}},
+            {"status": "failed", "rollback_pending": True}
+        ]},
+        {"_id": 0, "distribution_id": 1}
+    ).to_list(None)
+    for distribution in partial_distributions:
+        await discard_partial_lead_distribution(distribution["distribution_id"])
+    if partial_distributions:
+        logger.info(f"Discarded {len(partial_distributions)} partially ingested lead distributions")
+    
+    upload_ids = await asyncio.to_thread(list_upload_ids)
+    if not upload_ids:
+        return 0
+    live_upload_ids = set(await db.lead_uploads.distinct(
+        "upload_id",
+        {"upload_id": {"$in": upload_ids}, "status": {"$in": ["uploading", "completing"]}}
+    ))
+    abandoned = [upload_id for upload_id in upload_ids if upload_id not in live_upload_ids]
+    for upload_id in abandoned:
+        await asyncio.to_thread(remove_upload, upload_id)
+    if abandoned:
+        await db.lead_upload_rows.delete_many({"upload_id": {"$in": abandoned}})
+        logger.info(f"Removed chunks of {len(abandoned)} abandoned lead uploads")
+    return len(abandoned)
+
+
+@app.get("/api/admin/leads/distributions/plan")
+async def plan_lead_distribution(
+    distribution_id: Optional[str] = None,
+    shortfall_limit: int = 100,
+    admin: dict = Depends(get_admin_user)
+):
+    """
+    Dry-run a distribution without writing anything
+    Without distribution_id, the next oldest-first scheduled run is simulated.
+    """
+    try:
+        if distribution_id:
+            distribution = await db.lead_distributions.find_one({"distribution_id": distribution_id}, {"_id": 1})
+            if not distribution:
+                raise HTTPException(status_code=404, detail="Distribution not found")
+        
+        return await plan_distribution(db, distribution_id, shortfall_limit=max(0, min(shortfall_limit, 1000)))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to plan lead distribution: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to plan distribution")
+
+@app.get("/api/admin/leads/distributions")
+async def get_lead_distributions(
+    page: int = 1,
+    limit: int = 20,
+    admin: dict = Depends(get_admin_user)
+):
+    """Get all lead distributions with status"""
+    try:
+        skip = (page - 1) * limit
+        
+        # Get total count
+        total_count = await db.lead_distributions.count_documents({})
         
         # Get distributions with pagination
         distributions_cursor = db.lead_distributions.find({}).skip(skip).limit(limit).sort("uploaded_at", -1)
         distributions = await distributions_cursor.to_list(length=None)
         
+        # Progress of the latest run of each listed distribution (one query for the page)
+        run_ids = [dist["run_id"] for dist in distributions if dist.get("run_id")]
+        runs_by_id = {}
+        if run_ids:
+            runs = await db.distribution_runs.find({"run_id": {"$in": run_ids}}, {"_id": 0}).to_list(None)
+            runs_by_id = {run["run_id"]: run for run in runs}
+        
         # Enrich with current status data
         enriched_distributions = []
         for dist in distributions:
@@ -5476,6 +6272,18 @@ async def get_lead_distributions(
                 "processing_started_at": dist.get("processing_started_at"),
                 "processing_completed_at": dist.get("processing_completed_at")
             }
+            run = runs_by_id.get(dist.get("run_id"))
+            if run:
+                enriched_dist["run"] = {
+                    "run_id": run["run_id"],
+                    "status": run["status"],
+                    "percent_complete": run_percent_complete(run),
+                    "members_committed": run["members_committed"],
+                    "members_total": run["members_total"],
+                    "chunks_committed": run["chunks_committed"],
+                    "chunks_total": run["chunks_total"],
+                    "resume_count": run.get("resume_count", 0)
+                }
             enriched_distributions.append(enriched_dist)
         
         return {
@@ -5493,10 +6301,14 @@ async def get_lead_distributions(
 @app.post("/api/admin/leads/distribute/{distribution_id}")
 async def manually_distribute_leads(
     distribution_id: str,
+    concurrency: Optional[int] = None,
     admin: dict = Depends(get_admin_user)
 ):
     """Manually trigger lead distribution for a specific distribution"""
     try:
+        if concurrency is not None and not 1 <= concurrency <= 32:
+            raise HTTPException(status_code=400, detail="concurrency must be between 1 and 32")
+        
         # Find the distribution
         distribution = await db.lead_distributions.find_one({"distribution_id": distribution_id})
         if not distribution:
@@ -5515,7 +6327,7 @@ async def manually_distribute_leads(
         )
         
         # Perform distribution
-        await perform_lead_distribution(distribution_id)
+        await perform_lead_distribution(distribution_id, concurrency=concurrency)
         
         return {"message": "Lead distribution completed successfully"}
         
@@ -5525,103 +6337,107 @@ async def manually_distribute_leads(
         logger.error(f"Failed to distribute leads: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to distribute leads")
 
-async def perform_lead_distribution(distribution_id: str):
-    """Perform the actual lead distribution logic"""
+async def perform_lead_distribution(
+    distribution_id: str,
+    concurrency: Optional[int] = None,
+    run: Optional[dict] = None
+):
+    """
+    Perform the actual lead distribution logic
+    Allocation is planned in memory and saved as a distribution run, then
+    persisted in member chunks; `concurrency` chunks are written at once
+    (default DISTRIBUTION_CONCURRENCY). An unfinished run of the distribution
+    is resumed from its last committed chunk instead of being planned again.
+    """
     try:
-        # Get eligible members (bronze, silver, gold - not suspended)
-        # Note: Using separate queries due to MongoDB $or/$in issues
-        bronze_members = await db.users.find({
-            "membership_tier": "bronze",
-            "suspended": False
-        }).to_list(None)
-        
-        silver_members = await db.users.find({
-            "membership_tier": "silver", 
-            "suspended": False
-        }).to_list(None)
-        
-        gold_members = await db.users.find({
-            "membership_tier": "gold",
-            "suspended": False
-        }).to_list(None)
-        
-        eligible_members = bronze_members + silver_members + gold_members
-        
-        if not eligible_members:
-            logger.warning("No eligible members for lead distribution")
-            return
-        
-        # Get leads that haven't reached max distribution count
-        available_leads = await db.leads.find({
-            "distribution_id": distribution_id,
-            "distribution_count": {"$lt": 10}
-        }).to_list(None)
-        
-        if not available_leads:
-            logger.info("No available leads for distribution")
-            return
-        
-        # Distribution logic: Each lead can be distributed to up to 10 different users
-        # No user should receive the same lead more than once
-        leads_per_member = {
-            "bronze": 100,
-            "silver": 250,
-            "gold": 500
-        }
-        
-        MAX_DISTRIBUTIONS_PER_LEAD = 10
-        
-        total_available_leads = len(available_leads)
-        total_capacity = total_available_leads * MAX_DISTRIBUTIONS_PER_LEAD
-        total_demand = sum(leads_per_member.get(member.get("membership_tier", "bronze"), 100) 
-                          for member in eligible_members)
-        
-        logger.info(f"Distribution planning:")
-        logger.info(f"  - Available leads: {total_available_leads}")
-        logger.info(f"  - Max distributions per lead: {MAX_DISTRIBUTIONS_PER_LEAD}")
-        logger.info(f"  - Total capacity: {total_capacity}")
-        logger.info(f"  - Total demand: {total_demand} from {len(eligible_members)} members")
-        logger.info(f"  - Can fulfill all requests: {total_capacity >= total_demand}")
-        
-        distributions_made = 0
-        
-        # Track which leads have been assigned to which members to prevent duplicates
-        lead_assignments = {}  # lead_id -> set of member addresses who received it
-        for lead in available_leads:
-            lead_assignments[lead["lead_id"]] = set()
-        
-        # Process each member and give them their full allocation
-        for member in eligible_members:
+        if run is None:
+            unfinished = await db.distribution_runs.find_one(
+                {"distribution_id": distribution_id, "status": "running"},
+                {"_id": 0, "run_id": 1}
+            )
+            if unfinished:
+                run = await claim_distribution_run(db, unfinished["run_id"])
+                if not run:
+                    logger.info(f"Distribution {distribution_id} has a run in progress elsewhere")
+                    return
+                logger.info(f"Resuming distribution run {run['run_id']} for {distribution_id}")
+        
+        if run is None:
+            run = await plan_lead_distribution_run(distribution_id)
+            if run is None:
+                return
+        
+        await execute_distribution_run(run, concurrency)
+        
+    except RunLeaseLost as e:
+        # Another process resumed the run and carries on with it
+        logger.warning(f"Stopped lead distribution {distribution_id}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in lead distribution: {str(e)}")
+        if run is not None:
+            await release_distribution_run(db, run, str(e))
+        # Mark distribution as failed
+        await db.lead_distributions.update_one(
+            {"distribution_id": distribution_id},
+            {"$set": {
+                "status": "failed",
+                "error_message": str(e)
+            }}
+        )
+        raise
+
+
+async def plan_lead_distribution_run(distribution_id: str) -> Optional[dict]:
+    """Build the allocation plan of a distribution and save it as a new run"""
+    # Get leads that haven't reached max distribution count
+    available_leads = await db.leads.find({
+        "distribution_id": distribution_id,
+        "distribution_count": {"$lt": 10}
+    }).to_list(None)
+    
+    if not available_leads:
+        logger.info("No available leads for distribution")
+        return None
+    
+    # Distribution logic: Each lead can be distributed to up to 10 different users
+    # No user should receive the same lead more than once
+    # Leads a member received in earlier runs are never given to them again
+    member_ids = {}
+    allocator = LeadAllocator(
+        available_leads,
+        max_per_lead=MAX_DISTRIBUTIONS_PER_LEAD,
+        is_assigned=make_repeat_check(member_ids)
+    )
+    
+    total_available_leads = len(available_leads)
+    total_capacity = allocator.remaining_capacity
+    total_demand = 0
+    eligible_count = 0
+    
+    # Members that already have a CSV file for this distribution (one query for all members)
+    served_addresses = set(await db.member_csv_files.distinct(
+        "member_address", {"distribution_id": distribution_id}
+    ))
+    
+    # Eligible members (bronze, silver, gold - not suspended, not expired) are streamed
+    allocation_plan = []  # (member, leads)
+    async for members in iter_eligible_member_batches(db):
+        member_ids.update(await intern_members(db, [member["address"] for member in members]))
+        for member in members:
             member_tier = member.get("membership_tier", "bronze")
-            desired_leads = leads_per_member.get(member_tier, 100)
+            desired_leads = get_tier_quota(member_tier)
             member_address = member["address"]
+            eligible_count += 1
+            total_demand += desired_leads
             
             logger.info(f"Processing {member['username']} ({member_tier} tier): needs {desired_leads} leads")
             
-            # Check if member already has a CSV file for this distribution
-            existing_csv = await db.member_csv_files.find_one({
-                "member_address": member_address,
-                "distribution_id": distribution_id
-            })
-            
-            if existing_csv:
+            if member_address in served_addresses:
                 logger.info(f"Member {member['username']} already has CSV file for distribution {distribution_id}")
                 continue
             
-            # Find leads for this member (avoiding duplicates)
-            member_leads = []
-            for lead in available_leads:
-                if len(member_leads) >= desired_leads:
-                    break
-                    
-                lead_id = lead["lead_id"]
-                
-                # Check if this lead has been assigned to this member already
-                if member_address not in lead_assignments[lead_id]:
-                    # Check if this lead hasn't exceeded max distributions
-                    if len(lead_assignments[lead_id]) < MAX_DISTRIBUTIONS_PER_LEAD:
-                        member_leads.append(lead)
-                        lead_assignments[lead_id].add(member_address)
+            # Take the next leads with remaining capacity (no repeats per member)
+            member_leads = allocator.allocate(member_address, desired_leads)
             
             if len(member_leads) < desired_leads:
                 logger.warning(f"Could only allocate {len(member_leads)} leads to {member['username']} (wanted {desired_leads})")
@@ -5632,45 +6448,106 @@ async def perform_lead_distribution(distribution_id: str):
                 logger.info(f"No leads available for member {member['username']}")
                 continue
             
-            # Generate CSV content
-            csv_content = "Name,Email,Address\n"
-            for lead in member_leads:
-                csv_content += f'"{lead["name"]}","{lead["email"]}","{lead["address"]}"\n'
+            allocation_plan.append((member, member_leads))
+    
+    if not eligible_count:
+        logger.warning("No eligible members for lead distribution")
+        return None
+    
+    logger.info(f"Distribution planning:")
+    logger.info(f"  - Available leads: {total_available_leads}")
+    logger.info(f"  - Max distributions per lead: {MAX_DISTRIBUTIONS_PER_LEAD}")
+    logger.info(f"  - Total capacity: {total_capacity}")
+    logger.info(f"  - Total demand: {total_demand} from {eligible_count} members")
+    logger.info(f"  - Can fulfill all requests: {total_capacity >= total_demand}")
+    
+    # Save the plan before writing anything so an interrupted run can resume
+    return await start_distribution_run(
+        db,
+        distribution_id,
+        allocation_plan,
+        MEMBER_WRITE_BATCH_SIZE,
+        totals={"available_leads": total_available_leads, "eligible_members": eligible_count}
+    )
+
+
+async def execute_distribution_run(run: dict, concurrency: Optional[int] = None):
+    """
+    Persist the uncommitted chunks of a distribution run and mark it completed
+    The run's lease is renewed by a heartbeat for as long as this runs;
+    RunLeaseLost is raised if another process takes the run over.
+    """
+    async with RunLease(db, run) as lease:
+        await _execute_distribution_run(run, lease, concurrency)
+
+
+async def _execute_distribution_run(run: dict, lease: RunLease, concurrency: Optional[int] = None):
+    distribution_id = run["distribution_id"]
+    run_id = run["run_id"]
+    concurrency = concurrency or DISTRIBUTION_CONCURRENCY
+    rate_limiter = WriteRateLimiter()
+    
+    pending_chunks = await load_pending_chunks(db, run_id)
+    for chunk in pending_chunks:
+        if chunk["status"] == "writing":
+            await repair_interrupted_chunk(db, lease, chunk)
+    
+    await db.lead_distributions.update_one(
+        {"distribution_id": distribution_id},
+        {"$set": {
+            "status": "processing",
+            "run_id": run_id,
+            "execution": {"concurrency": concurrency, "chunk_size": run["chunk_size"]},
+            "chunk_progress": {
+                "total": run["chunks_total"],
+                "completed": run["chunks_committed"],
+                "failed": run["chunks_failed"],
+                "assignments": run["assignments_committed"]
+            }
+        }}
+    )
+    
+    member_ids = await intern_members(
+        db, [member["address"] for chunk in pending_chunks for member in chunk["members"]]
+    )
+    
+    async def persist_chunk(_: int, chunk: dict) -> dict:
+        leads_by_id = await load_chunk_leads(db, chunk)
+        csv_file_docs = []
+        member_lead_docs = []
+        lead_increments = Counter()
+        served_members = []
+        
+        for member in chunk["members"]:
+            member_tier = member["membership_tier"]
+            # Leads deleted since planning are left out
+            member_leads = [leads_by_id[lead_id] for lead_id in member["lead_ids"] if lead_id in leads_by_id]
+            if not member_leads:
+                continue
             
             # Create CSV file record
             csv_file_doc = {
-                "file_id": str(uuid.uuid4()),
-                "member_address": member_address,
+                "file_id": member["file_id"],
+                "member_address": member["address"],
                 "member_username": member["username"],
                 "member_tier": member_tier,
                 "distribution_id": distribution_id,
                 "filename": f"leads_{member['username']}_{distribution_id[:8]}.csv",
-                "csv_content": csv_content,
+                "line_count": len(member_leads),
                 "lead_count": len(member_leads),
                 "created_at": datetime.utcnow(),
                 "downloaded": False,
                 "downloaded_at": None,
-                "download_count": 0
+                "download_count": 0,
+                # Rendered on download from the member_leads rows below
+                **rendered_csv_fields()
             }
+            csv_file_docs.append(csv_file_doc)
             
-            await db.member_csv_files.insert_one(csv_file_doc)
-            
-            # Send lead distribution email to member if enabled
-            member_prefs = member.get("email_notifications", {})
-            if member_prefs.get("lead_distribution", True):
-                try:
-                    await send_lead_distribution_email(
-                        member["email"],
-                        member["username"],
-                        len(member_leads),
-                        csv_file_doc["filename"]
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to send lead distribution email to {member['username']}: {str(e)}")
-            
-            # Create individual member_leads records for tracking (keep existing structure for now)
+            # Create individual member_leads records (the CSV file is rendered from these)
+            assigned_at = datetime.utcnow()
             for lead in member_leads:
-                member_lead_doc = {
+                member_lead_docs.append({
                     "assignment_id": str(uuid.uuid4()),
                     "member_address": member["address"],
                     "member_username": member["username"],
@@ -5680,62 +6557,118 @@ async def perform_lead_distribution(distribution_id: str):
                     "lead_name": lead["name"],
                     "lead_email": lead["email"],
                     "lead_address": lead["address"],
-                    "assigned_at": datetime.utcnow(),
+                    "assigned_at": assigned_at,
                     "downloaded": False,
                     "downloaded_at": None,
                     "csv_file_id": csv_file_doc["file_id"]  # Link to CSV file
-                }
-                
-                await db.member_leads.insert_one(member_lead_doc)
-                
-                # Increment distribution count for the lead
-                await db.leads.update_one(
-                    {"lead_id": lead["lead_id"]},
-                    {"$inc": {"distribution_count": 1}}
-                )
+                })
+                lead_increments[lead["lead_id"]] += 1
             
-            distributions_made += len(member_leads)
+            served_members.append((member, csv_file_doc))
+        
+        # A chunk left "writing" by a crash is undone and replayed on resume
+        await mark_chunk_writing(db, lease, chunk["chunk_number"])
+        batch_result = await write_distribution_batch(
+            db, chunk["chunk_number"], csv_file_docs, member_lead_docs, lead_increments, rate_limiter,
+            lead_members=lead_assignment_updates(
+                ((doc["member_address"], doc["lead_id"]) for doc in member_lead_docs), member_ids
+            )
+        )
+        await commit_chunk(db, lease, chunk, batch_result)
         
-        # Mark distribution as completed
+        # Record per-chunk progress on the distribution
         await db.lead_distributions.update_one(
             {"distribution_id": distribution_id},
-            {"$set": {
-                "status": "completed",
-                "processing_completed_at": datetime.utcnow(),
-                "distributions_made": distributions_made
+            {"$inc": {
+                "chunk_progress.completed": 1,
+                "chunk_progress.failed": 1 if batch_result["errors"] else 0,
+                "chunk_progress.assignments": batch_result["assignments"]
             }}
         )
         
-        # Send admin email notification
+        if any(error["collection"] == "member_csv_files" for error in batch_result["errors"]):
+            # Members cannot be told which files exist - skip emails for this chunk
+            return batch_result
+        
+        # Queue lead distribution emails for members who have them enabled
+        emails = []
+        for member, csv_file_doc in served_members:
+            member_prefs = member["email_notifications"]
+            if member["email"] and member_prefs.get("lead_distribution", True):
+                subject, body = lead_distribution_email_content(
+                    member["username"], csv_file_doc["lead_count"], csv_file_doc["filename"]
+                )
+                emails.append(build_outbox_email(
+                    member["email"], subject, body, "lead_distribution",
+                    dedupe_key=f"lead_distribution:{distribution_id}:{member['email']}"
+                ))
         try:
-            await send_admin_lead_distribution_status(
-                distribution_id,
-                "completed",
-                total_available_leads,
-                len(eligible_members)
-            )
+            await enqueue_notifications(db, [], emails)
         except Exception as e:
-            logger.error(f"Failed to send admin lead distribution email: {str(e)}")
+            logger.error(f"Failed to queue lead distribution emails for chunk {chunk['chunk_number']}: {str(e)}")
         
-        logger.info(f"Lead distribution completed: {distributions_made} assignments made")
-        
-    except Exception as e:
-        logger.error(f"Error in lead distribution: {str(e)}")
-        # Mark distribution as failed
-        await db.lead_distributions.update_one(
-            {"distribution_id": distribution_id},
-            {"$set": {
-                "status": "failed",
-                "error_message": str(e)
-            }}
+        return batch_result
+    
+    batch_results = await run_partitioned(pending_chunks, persist_chunk, concurrency)
+    failed_chunks = await get_failed_chunks(db, run_id)
+    run = await finish_distribution_run(db, run_id, lease_owner=lease.owner)
+    if run is None:
+        raise RunLeaseLost(f"Distribution run {run_id} was taken over by another process")
+    distributions_made = run["assignments_committed"]
+    
+    # Mark distribution as completed
+    await db.lead_distributions.update_one(
+        {"distribution_id": distribution_id},
+        {"$set": {
+            "status": "completed",
+            "processing_completed_at": datetime.utcnow(),
+            "distributions_made": distributions_made,
+            "write_batches": run["chunks_total"],
+            "failed_write_batches": failed_chunks
+        }}
+    )
+    
+    # Send admin email notification
+    try:
+        await send_admin_lead_distribution_status(
+            distribution_id,
+            "completed",
+            run["totals"].get("available_leads", 0),
+            run["totals"].get("eligible_members", 0)
         )
-        raise
+    except Exception as e:
+        logger.error(f"Failed to send admin lead distribution email: {str(e)}")
+    
+    logger.info(
+        f"Lead distribution completed: {distributions_made} assignments made "
+        f"({len(failed_chunks)} of {run['chunks_total']} write batches had failures, "
+        f"{len(batch_results)} written in this pass)"
+    )
+
+
+async def resume_distribution_run(run: dict):
+    """Finish a claimed distribution run (runs as a background task)"""
+    try:
+        await perform_lead_distribution(run["distribution_id"], run=run)
+    except Exception as e:
+        logger.error(f"Failed to resume distribution run {run['run_id']}: {str(e)}")
+
+
+async def resume_interrupted_distribution_runs():
+    """
+    Resume distribution runs left unfinished by a restart or a failed write
+    Each claimed run continues in a background task so a large run does not
+    hold up the caller; its lease keeps other processes from claiming it.
+    """
+    for run in await claim_interrupted_runs(db):
+        logger.info(f"Resuming interrupted distribution run {run['run_id']} for {run['distribution_id']}")
+        start_background_task(resume_distribution_run(run))
 
 # =============================================================================
 # SEQUENTIAL LEAD DISTRIBUTION FOR SCHEDULED RUNS
 # =============================================================================
 
-async def perform_scheduled_lead_distribution(schedule_id: str, schedule_name: str):
+async def perform_scheduled_lead_distribution(schedule_id: str, schedule_name: str, concurrency: Optional[int] = None):
     """
     Perform sequential lead distribution from multiple CSVs (oldest first)
     Distributes to all eligible members once per run
@@ -5743,83 +6676,69 @@ async def perform_scheduled_lead_distribution(schedule_id: str, schedule_name: s
     try:
         logger.info(f"Starting sequential distribution for schedule: {schedule_name}")
         
-        # Get eligible members
-        bronze_members = await db.users.find({"membership_tier": "bronze", "suspended": False}).to_list(None)
-        silver_members = await db.users.find({"membership_tier": "silver", "suspended": False}).to_list(None)
-        gold_members = await db.users.find({"membership_tier": "gold", "suspended": False}).to_list(None)
+        # Plan the whole run from one forward cursor over the oldest leads with free slots
+        leads_cursor = db.leads.find(
+            {"distribution_count": {"$lt": MAX_DISTRIBUTIONS_PER_LEAD}},
+            {"_id": 0, "lead_id": 1, "name": 1, "email": 1, "address": 1, "distribution_id": 1,
+             "distribution_count": 1, "assigned_members": 1}
+        ).sort("created_at", 1)
+        # Skip leads a member already received in an earlier run
+        member_ids = {}
+        allocator = WindowedLeadAllocator(leads_cursor, is_assigned=make_repeat_check(member_ids))
         
-        eligible_members = bronze_members + silver_members + gold_members
+        source_csvs = []
+        allocation_plan = []  # (member, leads)
+        eligible_count = 0
+        # Eligible members are streamed from one projected query
+        async for members in iter_eligible_member_batches(db):
+            eligible_count += len(members)
+            member_ids.update(await intern_members(db, [member.get("address", "") for member in members]))
+            for member in members:
+                member_limit = get_tier_quota(member.get("membership_tier", "bronze"))
+                member_address = member.get("address", "")
+                
+                # Oldest leads still below the cap, never the same lead twice for a member
+                member_leads = await allocator.allocate(member_address, member_limit)
+                
+                if not member_leads:
+                    logger.info(f"No more leads available for member {member_address}")
+                    continue
+                
+                # Track source CSV
+                for lead in member_leads:
+                    dist_id = lead.get("distribution_id")
+                    if dist_id and dist_id not in source_csvs:
+                        source_csvs.append(dist_id)
+                
+                allocation_plan.append((member, member_leads))
         
-        if not eligible_members:
+        if not eligible_count:
             logger.warning("No eligible members for scheduled distribution")
             return
         
-        # Define lead allocations per tier
-        tier_lead_limits = {
-            "bronze": 100,
-            "silver": 250,
-            "gold": 500
-        }
+        logger.info(
+            f"Planned {allocator.assignments_made} assignments for {len(allocation_plan)} members "
+            f"from {allocator.leads_fetched} leads read"
+        )
         
-        total_leads_distributed = 0
-        distributions_made = 0
-        source_csvs = []
+        # Persist the plan in member chunks with bounded concurrency
+        rate_limiter = WriteRateLimiter()
+        chunks = [
+            allocation_plan[i:i + MEMBER_WRITE_BATCH_SIZE]
+            for i in range(0, len(allocation_plan), MEMBER_WRITE_BATCH_SIZE)
+        ]
         
-        # Distribute to each member
-        for member in eligible_members:
-            member_tier = member.get("membership_tier", "bronze")
-            member_limit = tier_lead_limits.get(member_tier, 100)
-            member_address = member.get("address", "")
-            
-            # Get leads for this member from oldest CSVs first
-            # Pull from available leads (distribution_count < 10) ordered by created_at (oldest first)
-            leads_cursor = db.leads.find({
-                "distribution_count": {"$lt": 10}
-            }).sort("created_at", 1).limit(member_limit)
-            
-            available_leads = await leads_cursor.to_list(None)
+        async def persist_chunk(chunk_number: int, chunk: list) -> dict:
+            csv_file_docs = []
+            member_lead_docs = []
+            lead_increments = Counter()
+            served_members = []
             
-            if not available_leads:
-                logger.info(f"No more leads available for member {member_address}")
-                continue
-            
-            # Create member_leads records
-            member_leads = []
-            for lead in available_leads:
-                member_lead_doc = {
-                    "member_lead_id": str(uuid.uuid4()),
-                    "member_address": member_address,
-                    "member_username": member.get("username", ""),
-                    "lead_id": lead["lead_id"],
-                    "distribution_id": lead.get("distribution_id", ""),
-                    "assigned_at": datetime.utcnow(),
-                    "schedule_id": schedule_id
-                }
-                member_leads.append(member_lead_doc)
+            for member, member_leads in chunk:
+                member_tier = member.get("membership_tier", "bronze")
+                member_address = member.get("address", "")
                 
-                # Track source CSV
-                dist_id = lead.get("distribution_id")
-                if dist_id and dist_id not in source_csvs:
-                    source_csvs.append(dist_id)
-                
-                # Increment distribution count for lead
-                await db.leads.update_one(
-                    {"lead_id": lead["lead_id"]},
-                    {"$inc": {"distribution_count": 1}}
-                )
-            
-            # Insert member leads
-            if member_leads:
-                await db.member_leads.insert_many(member_leads)
-                total_leads_distributed += len(member_leads)
-                distributions_made += 1
-                
-                # Generate CSV file for member
-                csv_content = "Name,Email,Address\n"
-                for lead in available_leads:
-                    csv_content += f'"{lead["name"]}","{lead["email"]}","{lead["address"]}"\n'
-                
-                # Create CSV file record
+                # Create CSV file record (rendered on download from the member_leads rows)
                 csv_file_doc = {
                     "file_id": str(uuid.uuid4()),
                     "member_address": member_address,
@@ -5827,53 +6746,82 @@ async def perform_scheduled_lead_distribution(schedule_id: str, schedule_name: s
                     "member_tier": member_tier,
                     "distribution_id": schedule_id,
                     "filename": f"leads_{member.get('username', 'member')}_{schedule_id[:8]}.csv",
-                    "csv_content": csv_content,
+                    "line_count": len(member_leads),
                     "lead_count": len(member_leads),
                     "created_at": datetime.utcnow(),
                     "downloaded": False,
                     "downloaded_at": None,
-                    "download_count": 0
+                    "download_count": 0,
+                    **rendered_csv_fields()
                 }
-                await db.member_csv_files.insert_one(csv_file_doc)
+                csv_file_docs.append(csv_file_doc)
                 
-                # Send notification to member
-                try:
-                    notification_doc = {
-                        "notification_id": str(uuid.uuid4()),
-                        "user_address": member_address,
-                        "type": "lead_distribution",
-                        "title": "New Leads Available",
-                        "message": f"You have received {len(member_leads)} new leads!",
-                        "read": False,
-                        "created_at": datetime.utcnow()
-                    }
-                    await db.notifications.insert_one(notification_doc)
-                    
-                    # Send email notification (check if email was sent recently to prevent duplicates)
-                    member_email = member.get("email", "")
-                    if member_email:
-                        # Check if email was sent in the last 5 minutes
-                        five_mins_ago = datetime.utcnow() - timedelta(minutes=5)
-                        recent_email = await db.email_history.find_one({
-                            "to_email": member_email,
-                            "notification_type": "lead_distribution",
-                            "sent_at": {"$gte": five_mins_ago}
-                        })
-                        
-                        if not recent_email:
-                            from email_service import send_email
-                            email_subject = "🎉 New Leads Available - Proleads Network"
-                            email_body = f"""
+                # Create member_leads records
+                assigned_at = datetime.utcnow()
+                for lead in member_leads:
+                    member_lead_docs.append({
+                        "member_lead_id": str(uuid.uuid4()),
+                        "member_address": member_address,
+                        "member_username": member.get("username", ""),
+                        "lead_id": lead["lead_id"],
+                        "distribution_id": lead.get("distribution_id", ""),
+                        "lead_name": lead["name"],
+                        "lead_email": lead["email"],
+                        "lead_address": lead["address"],
+                        "assigned_at": assigned_at,
+                        "schedule_id": schedule_id,
+                        "csv_file_id": csv_file_doc["file_id"]
+                    })
+                    lead_increments[lead["lead_id"]] += 1
+                
+                served_members.append((member, csv_file_doc))
+            
+            batch_result = await write_distribution_batch(
+                db, chunk_number, csv_file_docs, member_lead_docs, lead_increments, rate_limiter,
+                lead_members=lead_assignment_updates(
+                    ((doc["member_address"], doc["lead_id"]) for doc in member_lead_docs), member_ids
+                )
+            )
+            batch_result["members_served"] = 0
+            
+            if any(error["collection"] == "member_csv_files" for error in batch_result["errors"]):
+                # Members cannot be told which files exist - skip notifications for this chunk
+                return batch_result
+            batch_result["members_served"] = len(served_members)
+            
+            # Queue in-app notifications and emails; the outbox worker sends them
+            notifications = []
+            emails = []
+            run_date = datetime.utcnow().strftime('%Y-%m-%d')
+            for member, csv_file_doc in served_members:
+                member_tier = member.get("membership_tier", "bronze")
+                lead_count = csv_file_doc["lead_count"]
+                
+                notifications.append({
+                    "notification_id": str(uuid.uuid4()),
+                    "user_address": member.get("address", ""),
+                    "type": "lead_distribution",
+                    "title": "New Leads Available",
+                    "message": f"You have received {lead_count} new leads!",
+                    "read_status": False,
+                    "created_at": datetime.utcnow()
+                })
+                
+                # One email per member per schedule per day, even if the schedule runs twice
+                member_email = member.get("email", "")
+                if member_email:
+                    email_subject = "🎉 New Leads Available - Proleads Network"
+                    email_body = f"""
 Hello {member.get('username', 'Member')},
 
-Great news! You have received {len(member_leads)} new leads in your Proleads Network account.
+Great news! You have received {lead_count} new leads in your Proleads Network account.
 
 Your leads are ready and waiting for you in your dashboard.
 
 Log in now to access your leads: {os.getenv('APP_URL', 'https://members.proleads.network')}
 
 Tier: {member_tier.title()}
-Leads Received: {len(member_leads)}
+Leads Received: {lead_count}
 Distribution Date: {datetime.utcnow().strftime('%B %d, %Y at %H:%M UTC')}
 
 Thank you for being a valued member of Proleads Network!
@@ -5881,22 +6829,23 @@ Thank you for being a valued member of Proleads Network!
 Best regards,
 The Proleads Network Team
 """
-                            try:
-                                await send_email(
-                                    to_email=member_email,
-                                    subject=email_subject,
-                                    body=email_body,
-                                    notification_type="lead_distribution",
-                                    store_in_history=True
-                                )
-                                logger.info(f"Email sent to {member_email} for lead distribution")
-                            except Exception as email_error:
-                                logger.error(f"Failed to send email to {member_email}: {str(email_error)}")
-                        else:
-                            logger.info(f"Skipping email to {member_email} - already sent recently")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to send notification to {member_address}: {str(e)}")
+                    emails.append(build_outbox_email(
+                        member_email, email_subject, email_body, "lead_distribution",
+                        dedupe_key=f"lead_distribution:{schedule_id}:{run_date}:{member_email}"
+                    ))
+            
+            try:
+                queued = await enqueue_notifications(db, notifications, emails)
+                if queued["emails_deduplicated"]:
+                    logger.info(f"Skipped {queued['emails_deduplicated']} lead distribution emails already sent today")
+            except Exception as e:
+                logger.error(f"Failed to queue notifications for chunk {chunk_number}: {str(e)}")
+            
+            return batch_result
+        
+        batch_results = await run_partitioned(chunks, persist_chunk, concurrency or DISTRIBUTION_CONCURRENCY)
+        total_leads_distributed = sum(result["assignments"] for result in batch_results)
+        distributions_made = sum(result["members_served"] for result in batch_results)
         
         # Mark CSVs as completed if they're exhausted (all leads distributed 10 times)
         for dist_id in source_csvs:
@@ -5913,6 +6862,8 @@ The Proleads Network Team
                 )
                 logger.info(f"CSV {dist_id} marked as exhausted")
         
+        failed_batches = [result for result in batch_results if result["errors"]]
+        
         # Create a summary record
         summary_doc = {
             "execution_id": str(uuid.uuid4()),
@@ -5922,13 +6873,16 @@ The Proleads Network Team
             "total_leads_distributed": total_leads_distributed,
             "members_served": distributions_made,
             "source_csvs": source_csvs,
+            "write_batches": len(batch_results),
+            "failed_write_batches": failed_batches,
             "status": "completed"
         }
         await db.scheduled_distribution_history.insert_one(summary_doc)
         
         logger.info(
             f"Scheduled distribution completed: {total_leads_distributed} leads "
-            f"distributed to {distributions_made} members from {len(source_csvs)} CSVs"
+            f"distributed to {distributions_made} members from {len(source_csvs)} CSVs "
+            f"({len(failed_batches)} of {len(batch_results)} write batches had failures)"
         )
         
     except Exception as e:
@@ -6077,10 +7031,7 @@ async def get_distribution_overview(admin: dict = Depends(get_admin_user)):
         exhausted_csvs.sort(key=lambda x: x["uploaded_at"], reverse=True)
         
         # Get eligible members count
-        eligible_members = await db.users.count_documents({
-            "membership_tier": {"$in": ["bronze", "silver", "gold"]},
-            "suspended": {"$ne": True}
-        })
+        eligible_members = await db.users.count_documents(eligible_members_filter())
         
         # Calculate estimated weeks remaining (rough estimate)
         # Assume each member gets leads once per week, and each lead can go to 10 members
@@ -6120,38 +7071,38 @@ async def get_distribution_overview(admin: dict = Depends(get_admin_user)):
 
 # =============================================================================
 # ENHANCEMENT 1: DUPLICATE DETECTION ENDPOINTS
-# =============================================================================
-
-@app.get("/api/admin/leads/duplicates")
-async def get_duplicate_leads(admin: dict = Depends(get_admin_user)):
-    """Get a report of duplicate email addresses in the database"""
-    try:
-        # Use MongoDB aggregation to find duplicate emails
-        pipeline = [
-            {
-                "$group": {
-                    "_id": "$email",
-                    "count": {"$sum": 1},
-                    "lead_ids": {"$push": "$lead_id"},
-                    "distributions": {"$push": "$distribution_id"},
-                    "names": {"$push": "$name"}
-                }
-            },
-            {
-                "$match": {
-                    "count": {"$gt": 1}
-                }
-            },
-            {
-                "$sort": {"count": -1}
-            },
-            {
-                "$limit": 100
-            }
-        ]
+# =============================================================================
+
+@app.get("/api/admin/leads/duplicates")
+async def get_duplicate_leads(
+    limit: int = 100,
+    admin: dict = Depends(get_admin_user)
+):
+    """Get a report of duplicate email addresses in the database"""
+    try:
+        # Indexed range query over the duplicate index (lead_count > 1)
+        groups = await get_duplicate_groups(db, limit=limit)
         
-        duplicates_cursor = db.leads.aggregate(pipeline)
-        duplicates = await duplicates_cursor.to_list(None)
+        # Fetch names/distributions for the reported leads in one query
+        lead_ids = [lead_id for group in groups for lead_id in group["lead_ids"]]
+        leads = await db.leads.find(
+            {"lead_id": {"$in": lead_ids}},
+            {"_id": 0, "lead_id": 1, "name": 1, "distribution_id": 1, "distribution_count": 1}
+        ).to_list(None)
+        leads_by_id = {lead["lead_id"]: lead for lead in leads}
+        
+        duplicates = []
+        for group in groups:
+            group_leads = [leads_by_id[lead_id] for lead_id in group["lead_ids"] if lead_id in leads_by_id]
+            duplicates.append({
+                "_id": group["email"],
+                "count": group["lead_count"],
+                "lead_ids": group["lead_ids"],
+                "distributions": [lead.get("distribution_id") for lead in group_leads],
+                "names": [lead.get("name") for lead in group_leads],
+                # Summed from the leads themselves, so it is as current as their counts
+                "total_distribution_count": sum(lead.get("distribution_count", 0) for lead in group_leads)
+            })
         
         return {
             "total_duplicates": len(duplicates),
@@ -6183,35 +7134,14 @@ async def merge_duplicate_leads(
         if not lead_to_keep:
             raise HTTPException(status_code=404, detail="Lead to keep not found")
         
-        # Get leads to merge
-        leads_to_merge = [l for l in duplicate_leads if l["lead_id"] != keep_lead_id]
-        
-        # Update all member_leads references to point to kept lead
-        merge_count = 0
-        for old_lead in leads_to_merge:
-            result = await db.member_leads.update_many(
-                {"lead_id": old_lead["lead_id"]},
-                {"$set": {"lead_id": keep_lead_id}}
-            )
-            merge_count += result.modified_count
-            
-            # Increment distribution count on kept lead
-            await db.leads.update_one(
-                {"lead_id": keep_lead_id},
-                {"$inc": {"distribution_count": old_lead.get("distribution_count", 0)}}
-            )
-        
-        # Delete duplicate leads
-        delete_result = await db.leads.delete_many({
-            "email": email,
-            "lead_id": {"$ne": keep_lead_id}
-        })
+        # Repoint references, fold counts and delete duplicates in bulk writes
+        result = await merge_duplicate_group(db, email, keep_lead_id, duplicate_leads)
         
         return {
-            "message": f"Merged {len(leads_to_merge)} duplicate leads",
+            "message": f"Merged {result['merged_leads']} duplicate leads",
             "kept_lead_id": keep_lead_id,
-            "merged_references": merge_count,
-            "deleted_duplicates": delete_result.deleted_count
+            "merged_references": result["merged_references"],
+            "deleted_duplicates": result["deleted_duplicates"]
         }
         
     except HTTPException:
@@ -6221,6 +7151,63 @@ async def merge_duplicate_leads(
         raise HTTPException(status_code=500, detail="Failed to merge duplicates")
 
 
+@app.post("/api/admin/leads/merge-duplicates/all")
+async def merge_all_duplicate_leads(admin: dict = Depends(get_admin_user)):
+    """Start a background job that merges every duplicate group (keeps the oldest lead)"""
+    try:
+        running = await db.lead_jobs.find_one({
+            "type": "merge_duplicates",
+            "status": {"$in": ["queued", "running"]}
+        })
+        if running:
+            raise HTTPException(status_code=409, detail=f"Merge job {running['job_id']} is already running")
+        
+        job_id = str(uuid.uuid4())
+        await db.lead_jobs.insert_one({
+            "job_id": job_id,
+            "type": "merge_duplicates",
+            "status": "queued",
+            "progress": {},
+            "created_by": admin["username"],
+            "created_at": datetime.utcnow()
+        })
+        start_background_task(merge_all_duplicates(db, job_id))
+        
+        return {"job_id": job_id, "status": "queued"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to start merge job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to start merge job")
+
+
+@app.post("/api/admin/leads/email-index/rebuild")
+async def rebuild_duplicate_index(admin: dict = Depends(get_admin_user)):
+    """Rebuild the duplicate email index from the leads collection"""
+    try:
+        indexed = await rebuild_email_index(db)
+        return {"message": "Email index rebuilt", "indexed_emails": indexed}
+    except Exception as e:
+        logger.error(f"Failed to rebuild email index: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to rebuild email index")
+
+
+@app.get("/api/admin/leads/jobs/{job_id}")
+async def get_lead_job(job_id: str, admin: dict = Depends(get_admin_user)):
+    """Get status and progress of a background lead job"""
+    try:
+        job = await db.lead_jobs.find_one({"job_id": job_id}, {"_id": 0})
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to fetch lead job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch job")
+
+
 # =============================================================================
 # ENHANCEMENT 2: EMAIL VERIFICATION ENDPOINTS
 # =============================================================================
@@ -6229,9 +7216,17 @@ async def merge_duplicate_leads(
 async def validate_csv_before_upload(
     request: Request,
     use_api: bool = True,
+    mode: Optional[str] = None,
+    sample: bool = False,
+    sample_size: int = 1500,
     admin: dict = Depends(get_admin_user)
 ):
-    """Validate CSV emails before actual upload (preview mode)"""
+    """
+    Validate CSV emails before actual upload (preview mode)
+    With sample=true only a domain-stratified sample is validated and the
+    response carries estimated rates with confidence intervals plus the full
+    domain histogram; full validation then happens on the real import.
+    """
     try:
         form = await request.form()
         csv_file = form.get("csv_file")
@@ -6261,7 +7256,19 @@ async def validate_csv_before_upload(
                 emails.append(email)
         
         # Validate emails
-        validation_result = await analyze_csv_emails(emails, use_api=use_api)
+        try:
+            if sample:
+                if sample_size < 1 or sample_size > 10000:
+                    raise HTTPException(status_code=400, detail="sample_size must be between 1 and 10000")
+                validation_result = await estimate_csv_email_quality(
+                    emails,
+                    sample_size=sample_size,
+                    mode=mode or ("hybrid" if use_api else "offline")
+                )
+            else:
+                validation_result = await analyze_csv_emails(emails, use_api=use_api, mode=mode)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return validation_result
         
@@ -6279,8 +7286,14 @@ async def validate_emails(
 ):
     """Validate a list of email addresses"""
     try:
-        result = await analyze_csv_emails(request_data.emails, use_api=request_data.use_api)
+        result = await analyze_csv_emails(
+            request_data.emails,
+            use_api=request_data.use_api,
+            mode=request_data.mode
+        )
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to validate emails: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to validate emails")
@@ -6289,61 +7302,96 @@ async def validate_emails(
 @app.post("/api/admin/leads/batch-validate")
 async def batch_validate_existing_leads(
     distribution_id: Optional[str] = None,
+    mode: Optional[str] = None,
     admin: dict = Depends(get_admin_user)
 ):
-    """Validate existing leads in database"""
+    """
+    Start a background job that validates existing leads (all of them, or one
+    distribution). Progress, throughput and ETA are available from
+    GET /api/admin/leads/jobs/{job_id}; the job can be paused and resumed.
+    """
     try:
-        # Get leads to validate
-        query = {"distribution_id": distribution_id} if distribution_id else {}
-        leads_cursor = db.leads.find(query).limit(1000)  # Limit to prevent timeout
-        leads = await leads_cursor.to_list(None)
+        if mode is not None and mode not in VALIDATION_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(VALIDATION_MODES)}")
         
-        if not leads:
-            return {
-                "total_validated": 0,
-                "valid_count": 0,
-                "invalid_count": 0,
-                "results": []
-            }
+        running = await db.lead_jobs.find_one({
+            "type": "validate_leads",
+            "status": {"$in": ["queued", "running", "pausing"]}
+        })
+        if running:
+            raise HTTPException(status_code=409, detail=f"Validation job {running['job_id']} is already running")
         
-        # Extract emails
-        emails = [lead["email"] for lead in leads]
-        lead_map = {lead["email"]: lead for lead in leads}
-        
-        # Validate using batch API
-        validation_result = await analyze_csv_emails(emails, use_api=True)
-        
-        # Update database with validation results
-        for result in validation_result.get("validation_results", []):
-            email = result.get("email")
-            if email in lead_map:
-                lead = lead_map[email]
-                await db.leads.update_one(
-                    {"lead_id": lead["lead_id"]},
-                    {"$set": {
-                        "email_validated": result.get("valid", False),
-                        "validation_date": datetime.utcnow(),
-                        "validation_status": result.get("status", "UNKNOWN"),
-                        "is_disposable": result.get("is_disposable", False),
-                        "is_role_based": result.get("is_role_based", False)
-                    }}
-                )
+        query = {"distribution_id": distribution_id} if distribution_id else {}
+        total_leads = await db.leads.count_documents(query)
         
-        stats = validation_result.get("stats", {})
+        job_id = str(uuid.uuid4())
+        await db.lead_jobs.insert_one({
+            "job_id": job_id,
+            "type": "validate_leads",
+            "status": "queued",
+            "distribution_id": distribution_id,
+            "mode": mode,
+            "total_leads": total_leads,
+            "checkpoint": None,
+            "progress": {"processed": 0, "valid": 0, "invalid": 0, "remaining": total_leads},
+            "created_by": admin["username"],
+            "created_at": datetime.utcnow()
+        })
+        start_background_task(run_lead_validation_job(db, job_id))
         
-        return {
-            "total_validated": stats.get("total", 0),
-            "valid_count": stats.get("valid", 0),
-            "invalid_count": stats.get("total", 0) - stats.get("valid", 0),
-            "stats": stats,
-            "results": validation_result.get("validation_results", [])[:50]  # Return first 50
-        }
+        return {"job_id": job_id, "status": "queued", "total_leads": total_leads}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Failed to batch validate: {str(e)}")
+        logger.error(f"Failed to start batch validation: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to validate leads")
 
 
+@app.post("/api/admin/leads/jobs/{job_id}/pause")
+async def pause_lead_job(job_id: str, admin: dict = Depends(get_admin_user)):
+    """Ask a running validation job to pause after its current page"""
+    try:
+        # A job that has not started yet has no page to finish - pause it directly
+        result = await db.lead_jobs.update_one(
+            {"job_id": job_id, "type": "validate_leads", "status": "queued"},
+            {"$set": {"status": "paused", "paused_at": datetime.utcnow()}}
+        )
+        if result.modified_count == 1:
+            return {"job_id": job_id, "status": "paused"}
+        
+        result = await db.lead_jobs.update_one(
+            {"job_id": job_id, "type": "validate_leads", "status": "running"},
+            {"$set": {"status": "pausing"}}
+        )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=409, detail="Job is not running")
+        return {"job_id": job_id, "status": "pausing"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to pause lead job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to pause job")
+
+
+@app.post("/api/admin/leads/jobs/{job_id}/resume")
+async def resume_lead_job(job_id: str, admin: dict = Depends(get_admin_user)):
+    """Resume a paused validation job from its last checkpoint"""
+    try:
+        job = await db.lead_jobs.find_one({"job_id": job_id, "type": "validate_leads"})
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] != "paused":
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+        start_background_task(run_lead_validation_job(db, job_id, resume=True))
+        return {"job_id": job_id, "status": "resuming"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to resume lead job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to resume job")
+
+
 # =============================================================================
 # ENHANCEMENT 3: SCHEDULED DISTRIBUTIONS ENDPOINTS
 # =============================================================================
@@ -6395,6 +7443,7 @@ async def create_distribution_schedule(
         }
         
         await db.distribution_schedules.insert_one(schedule_doc)
+        notify_schedules_changed()
         
         logger.info(f"Created distribution schedule: {schedule.name} (next run: {next_run})")
         
@@ -6515,6 +7564,7 @@ async def update_distribution_schedule(
                 {"schedule_id": schedule_id},
                 {"$set": update_doc}
             )
+            notify_schedules_changed()
         
         return {"message": "Schedule updated successfully"}
         
@@ -6536,6 +7586,7 @@ async def delete_distribution_schedule(
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Schedule not found")
+        notify_schedules_changed()
         
         return {"message": "Schedule deleted successfully"}
         
@@ -6791,7 +7842,7 @@ async def get_user_leads(
         # Get CSV files for this user
         csv_files = await db.member_csv_files.find({
             "member_address": user_address
-        }).sort("created_at", -1).skip(offset).limit(limit).to_list(length=limit)
+        }, CSV_BODY_FIELDS).sort("created_at", -1).skip(offset).limit(limit).to_list(length=limit)
         
         total_files = await db.member_csv_files.count_documents({
             "member_address": user_address
@@ -6827,9 +7878,10 @@ async def get_user_leads(
 @app.get("/api/users/leads/download/{file_id}")
 async def download_user_leads_csv(
     file_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
-    """Download user's lead CSV file"""
+    """Download user's lead CSV file (ETag / If-None-Match supported)"""
     try:
         user_address = current_user["address"]
         
@@ -6842,23 +7894,31 @@ async def download_user_leads_csv(
         if not csv_file:
             raise HTTPException(status_code=404, detail="CSV file not found")
         
-        # Update download tracking
+        # Client already has this file
+        etag = csv_file_etag(csv_file)
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        # Update download tracking (updated_at from the database clock, for the change feed)
         await db.member_csv_files.update_one(
             {"file_id": file_id},
-            {
-                "$set": {
-                    "downloaded": True,
-                    "downloaded_at": datetime.utcnow()
-                },
-                "$inc": {"download_count": 1}
-            }
+            [{"$set": {
+                "downloaded": True,
+                "downloaded_at": datetime.utcnow(),
+                "updated_at": "$$NOW",
+                "download_count": {"$add": [{"$ifNull": ["$download_count", 0]}, 1]}
+            }}]
         )
         
-        # Return CSV content as downloadable file
+        # Stream the CSV body as a downloadable file
         return StreamingResponse(
-            io.StringIO(csv_file["csv_content"]),
+            iter_csv_body(db, csv_file),
             media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={csv_file['filename']}"}
+            headers={
+                "Content-Disposition": f"attachment; filename={csv_file['filename']}",
+                "ETag": etag,
+                "Cache-Control": "private, no-cache"
+            }
         )
         
     except HTTPException:
@@ -8284,80 +9344,108 @@ async def get_analytics_graphs(
 # SSO & INTEGRATION HELPER FUNCTIONS
 # =============================================================================
 
-# Rate limiting storage (in production, use Redis)
-rate_limit_storage = defaultdict(list)
+BATCH_EXPORT_MAX_FILES = 100  # Files per batch export request
+
+# Integration rate limiter (created on first use, backend from RATE_LIMIT_BACKEND)
+integration_rate_limiter = None
 
 async def validate_api_key(api_key: str, required_permissions: List[str]) -> bool:
     """
     Validate API key and check permissions
+    One prefix lookup and bcrypt check per key, then served from the verified-key cache
     """
     try:
-        # Find API key in database (stored as hash)
-        api_keys = await db.integration_api_keys.find({
-            "status": "active"
-        }).to_list(None)
-        
-        for key_record in api_keys:
-            # Compare hashed API key
-            if bcrypt.checkpw(api_key.encode('utf-8'), key_record["api_key_hash"].encode('utf-8')):
-                # Check permissions
-                key_permissions = key_record.get("permissions", [])
-                if all(perm in key_permissions for perm in required_permissions):
-                    # Update last used
-                    await db.integration_api_keys.update_one(
-                        {"key_id": key_record["key_id"]},
-                        {
-                            "$set": {"last_used_at": datetime.utcnow()},
-                            "$inc": {"usage_count": 1}
-                        }
-                    )
-                    return True
+        key_record = await verify_api_key(db, api_key)
+        if key_record is None or not has_permissions(key_record, required_permissions):
+            return False
         
-        return False
+        # Update last used (buffered, written in batches)
+        await record_key_usage(db, key_record["key_id"])
+        return True
         
     except Exception as e:
         logger.error(f"API key validation error: {str(e)}")
         return False
 
 
-async def check_rate_limit(api_key: str, limit: int = 100, period_seconds: int = 3600):
+async def check_rate_limit(api_key: str, limit: Optional[int] = None, period_seconds: Optional[int] = None):
     """
-    Check rate limit for API key (token bucket algorithm)
-    In production, use Redis for distributed rate limiting
+    Check rate limit for API key (fixed window, shared by all workers)
+    Uses the key's rate_limit / rate_limit_period unless limit/period_seconds are given
     """
+    global integration_rate_limiter
     try:
-        current_time = datetime.utcnow()
-        key_requests = rate_limit_storage[api_key]
+        if integration_rate_limiter is None:
+            integration_rate_limiter = create_rate_limiter(db)
         
-        # Remove requests outside the time window
-        cutoff_time = current_time - timedelta(seconds=period_seconds)
-        rate_limit_storage[api_key] = [
-            req_time for req_time in key_requests
-            if req_time > cutoff_time
-        ]
-        
-        # Check if limit exceeded
-        if len(rate_limit_storage[api_key]) >= limit:
-            return False, {
-                "limit": limit,
-                "remaining": 0,
-                "reset": int((rate_limit_storage[api_key][0] + timedelta(seconds=period_seconds)).timestamp())
-            }
+        # Verified keys come from the cache, so this costs no extra round-trip
+        key_record = await verify_api_key(db, api_key) or {}
+        if limit is None:
+            limit = key_record.get("rate_limit")
+        if limit is None:
+            limit = DEFAULT_RATE_LIMIT
+        period_seconds = period_seconds or rate_limit_period_seconds(key_record.get("rate_limit_period"))
+        limiter_key = key_record.get("key_id") or hashlib.sha256(api_key.encode('utf-8')).hexdigest()
         
-        # Add current request
-        rate_limit_storage[api_key].append(current_time)
-        
-        return True, {
-            "limit": limit,
-            "remaining": limit - len(rate_limit_storage[api_key]),
-            "reset": int((current_time + timedelta(seconds=period_seconds)).timestamp())
-        }
+        return await integration_rate_limiter.hit(limiter_key, limit, period_seconds)
         
     except Exception as e:
         logger.error(f"Rate limit check error: {str(e)}")
         return True, {"limit": limit, "remaining": limit, "reset": 0}
 
 
+async def create_lead_indexes():
+    """Create database indexes for the lead system"""
+    try:
+        # Chunked uploads (expired uploads and their staged rows are removed by the TTL indexes)
+        await db.lead_uploads.create_index("upload_id", unique=True)
+        await db.lead_uploads.create_index("expires_at", expireAfterSeconds=0)
+        await db.lead_upload_rows.create_index([("upload_id", 1), ("row_num", 1)])
+        await db.lead_upload_rows.create_index([("upload_id", 1), ("chunk_index", 1)])
+        await db.lead_upload_rows.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Duplicate index and background lead jobs
+        await create_email_index_indexes(db)
+        await db.lead_jobs.create_index("job_id", unique=True)
+        await db.lead_jobs.create_index([("type", 1), ("status", 1)])
+        
+        # Queued notification emails (dedupe key and worker claims)
+        await create_email_outbox_indexes(db)
+        
+        # Checkpointed distribution runs (resumed by the scheduler once their lease expires)
+        await create_distribution_run_indexes(db)
+        
+        # Oldest-first scans over leads with free slots (scheduled distributions)
+        await db.leads.create_index([("created_at", 1), ("distribution_count", 1)])
+        
+        # Rendering member CSV files from their assignments (in insertion order)
+        await db.member_leads.create_index([("csv_file_id", 1), ("_id", 1)])
+        
+        # Eligible members for distributions (tier, not suspended, subscription not expired)
+        await db.users.create_index([("membership_tier", 1), ("suspended", 1), ("subscription_expires_at", 1)])
+        
+        # Jobs whose process died (lease expired) resume from their checkpoint on request
+        interrupted = await pause_interrupted_validation_jobs(db)
+        if interrupted:
+            logger.info(f"Paused {interrupted} interrupted lead validation job(s)")
+        
+        # One-off backfill of the duplicate index for existing leads
+        if await db.email_index.estimated_document_count() == 0 and await db.leads.estimated_document_count() > 0:
+            indexed = await rebuild_email_index(db)
+            logger.info(f"Backfilled email index with {indexed} emails")
+        
+        # One-off backfill of per-lead assigned member sets from past distributions
+        await create_lead_assignment_indexes(db)
+        if await db.leads.find_one({"distribution_count": {"$gt": 0}, "assigned_members": {"$exists": False}}, {"_id": 1}):
+            updated = await rebuild_lead_assignment_sets(db)
+            logger.info(f"Backfilled assigned member sets for {updated} leads")
+        
+        logger.info("Lead database indexes created successfully")
+        
+    except Exception as e:
+        logger.error(f"Failed to create lead indexes: {str(e)}")
+
+
 async def create_integration_indexes():
     """Create database indexes for integration features"""
     try:
@@ -8370,6 +9458,10 @@ async def create_integration_indexes():
         await db.integration_api_keys.create_index("key_id", unique=True)
         await db.integration_api_keys.create_index("integration_name")
         await db.integration_api_keys.create_index("status")
+        await create_api_key_indexes(db)
+        await create_rate_limit_indexes(db)
+        await create_csv_change_feed_indexes(db)
+        await db.member_csv_files.create_index([("member_address", 1), ("created_at", 1), ("file_id", 1)])
         
         # CSV export logs index
         await db.csv_export_logs.create_index("export_id", unique=True)
@@ -8571,6 +9663,62 @@ async def sso_user_info(
 # INTEGRATION API - CSV EXPORT
 # =============================================================================
 
+async def authorize_integration_user(x_api_key: Optional[str], user_id: str) -> dict:
+    """
+    Check the API key and its rate limit, then load the user being exported
+    Raises the HTTP errors of the CSV export endpoints.
+    """
+    # Validate API key
+    if not x_api_key:
+        raise HTTPException(status_code=401, detail="API key required")
+    
+    api_key_valid = await validate_api_key(x_api_key, ["csv_export"])
+    if not api_key_valid:
+        logger.warning(f"Invalid API key used for CSV export")
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    # Check rate limit
+    rate_limit_ok, rate_info = await check_rate_limit(x_api_key)
+    if not rate_limit_ok:
+        logger.warning(f"Rate limit exceeded for API key")
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={
+                "X-RateLimit-Limit": str(rate_info["limit"]),
+                "X-RateLimit-Remaining": str(rate_info["remaining"]),
+                "X-RateLimit-Reset": str(rate_info["reset"]),
+                "Retry-After": str(max(1, rate_info["reset"] - int(time.time())))
+            }
+        )
+    
+    # Verify user exists
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "address": 1})
+    if not user:
+        logger.warning(f"CSV export requested for non-existent user: {user_id}")
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+async def authorize_integration_csv_file(x_api_key: Optional[str], user_id: str, file_id: str) -> dict:
+    """Check the API key and its rate limit, then load the user's CSV file"""
+    user = await authorize_integration_user(x_api_key, user_id)
+    
+    # Get CSV file from database
+    csv_file = await db.member_csv_files.find_one({
+        "file_id": file_id,
+        "member_address": user["address"]
+    })
+    
+    if not csv_file:
+        logger.warning(f"CSV file {file_id} not found for user {user_id}")
+        raise HTTPException(
+            status_code=403,
+            detail="CSV file not found or user does not have access"
+        )
+    return csv_file
+
+
 @app.post("/api/integrations/csv-export", response_model=CSVExportResponse)
 async def integration_csv_export(
     request: CSVExportRequest,
@@ -8581,61 +9729,19 @@ async def integration_csv_export(
     Requires API key authentication
     """
     try:
-        # Validate API key
-        if not x_api_key:
-            raise HTTPException(status_code=401, detail="API key required")
-        
-        api_key_valid = await validate_api_key(x_api_key, ["csv_export"])
-        if not api_key_valid:
-            logger.warning(f"Invalid API key used for CSV export")
-            raise HTTPException(status_code=401, detail="Invalid API key")
-        
-        # Check rate limit
-        rate_limit_ok, rate_info = await check_rate_limit(x_api_key)
-        if not rate_limit_ok:
-            logger.warning(f"Rate limit exceeded for API key")
-            raise HTTPException(
-                status_code=429,
-                detail="Rate limit exceeded",
-                headers={
-                    "X-RateLimit-Limit": str(rate_info["limit"]),
-                    "X-RateLimit-Remaining": str(rate_info["remaining"]),
-                    "X-RateLimit-Reset": str(rate_info["reset"]),
-                    "Retry-After": "60"
-                }
-            )
-        
-        # Verify user exists
-        user = await db.users.find_one({"user_id": request.user_id})
-        if not user:
-            logger.warning(f"CSV export requested for non-existent user: {request.user_id}")
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Get CSV file from database
-        csv_file = await db.member_csv_files.find_one({
-            "file_id": request.file_id,
-            "member_address": user["address"]
-        })
-        
-        if not csv_file:
-            logger.warning(f"CSV file {request.file_id} not found for user {request.user_id}")
-            raise HTTPException(
-                status_code=403,
-                detail="CSV file not found or user does not have access"
-            )
+        csv_file = await authorize_integration_csv_file(x_api_key, request.user_id, request.file_id)
         
-        # Get CSV content (stored in database)
-        csv_content = csv_file.get("csv_content", "")
+        # Get CSV content (rendered or from storage)
+        csv_content = await read_csv_body(db, csv_file)
         
         if not csv_content:
             logger.error(f"CSV file {request.file_id} has no content")
             raise HTTPException(status_code=500, detail="CSV file has no content")
         
-        # Count lines
-        line_count = len(csv_content.split('\n')) - 1  # Subtract header row
+        line_count = csv_line_count(csv_file)
         
-        # Log export event
-        await db.csv_export_logs.insert_one({
+        # Log export event (buffered, written in batches)
+        await record_export_log(db, {
             "export_id": str(uuid.uuid4()),
             "user_id": request.user_id,
             "file_id": request.file_id,
@@ -8667,37 +9773,180 @@ async def integration_csv_export(
         raise HTTPException(status_code=500, detail="Failed to export CSV")
 
 
-@app.get("/api/integrations/csv-files")
-async def integration_list_csv_files(
+@app.get("/api/integrations/csv-export/raw")
+async def integration_csv_export_raw(
     user_id: str,
+    file_id: str,
+    start_line: int = 0,
+    max_lines: Optional[int] = None,
+    x_api_key: Optional[str] = Header(None, alias="X-API-Key"),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Stream a user's lead CSV as text/csv for external integrations
+    start_line/max_lines fetch a range of data rows (the header is always
+    included), gzip is used when the client accepts it, and the total row
+    count comes back in X-Line-Count. Pages continue from X-Next-Start-Line.
+    """
+    try:
+        if start_line < 0 or (max_lines is not None and max_lines < 0):
+            raise HTTPException(status_code=400, detail="start_line and max_lines must not be negative")
+        
+        csv_file = await authorize_integration_csv_file(x_api_key, user_id, file_id)
+        
+        line_count = csv_line_count(csv_file)
+        lines_returned = max(0, line_count - start_line)
+        if max_lines is not None:
+            lines_returned = min(lines_returned, max_lines)
+        next_start_line = start_line + lines_returned
+        
+        use_gzip = bool(accept_encoding and "gzip" in accept_encoding.lower())
+        # Each page and encoding is its own representation with its own validator
+        etag = csv_range_etag(csv_file, start_line, max_lines, use_gzip)
+        headers = {
+            "Content-Disposition": f"attachment; filename={csv_file.get('filename', f'leads_{user_id}.csv')}",
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "X-Line-Count": str(line_count),
+            "X-Start-Line": str(start_line),
+            "X-Lines-Returned": str(lines_returned)
+        }
+        if next_start_line < line_count:
+            headers["X-Next-Start-Line"] = str(next_start_line)
+        
+        # Integration already has this file
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        
+        # Log export event (buffered, written in batches)
+        await record_export_log(db, {
+            "export_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "file_id": file_id,
+            "integration": "automailer",
+            "exported_at": datetime.utcnow(),
+            "line_count": lines_returned,
+            "start_line": start_line,
+            "api_key_id": x_api_key[:8] + "..."  # Log first 8 chars only
+        })
+        
+        whole_file = start_line == 0 and max_lines is None
+        body = iter_csv_body(db, csv_file) if whole_file else iter_csv_range(db, csv_file, start_line, max_lines)
+        if use_gzip:
+            body = gzip_stream(body)
+            headers["Content-Encoding"] = "gzip"
+        
+        logger.info(f"CSV raw export: user={user_id}, file={file_id}, lines={start_line}+{lines_returned}")
+        return StreamingResponse(body, media_type="text/csv", headers=headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to export CSV: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to export CSV")
+
+
+@app.post("/api/integrations/csv-export/batch")
+async def integration_csv_export_batch(
+    request: CSVBatchExportRequest,
     x_api_key: Optional[str] = Header(None, alias="X-API-Key")
 ):
     """
-    List available CSV files for a user
+    Export several of a user's lead CSVs in one streamed response
+    Files are chosen by file_ids or created after `since`, and sent as a zip
+    archive or as NDJSON (one object per file, shaped like the single export).
+    The API key and rate limit are checked once, and one export log is written.
+    `since` batches are ordered by (created_at, file_id); when more files are
+    waiting, X-Has-More is true and X-Next-Since / X-Next-Since-File-Id give
+    the since / since_file_id of the next request.
     """
     try:
-        # Validate API key
-        if not x_api_key:
-            raise HTTPException(status_code=401, detail="API key required")
+        if request.format not in ("zip", "ndjson"):
+            raise HTTPException(status_code=400, detail="format must be zip or ndjson")
+        if not request.file_ids and request.since is None:
+            raise HTTPException(status_code=400, detail="file_ids or since is required")
+        if request.file_ids and len(request.file_ids) > BATCH_EXPORT_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_EXPORT_MAX_FILES} files per batch")
         
-        api_key_valid = await validate_api_key(x_api_key, ["csv_export"])
-        if not api_key_valid:
-            raise HTTPException(status_code=401, detail="Invalid API key")
+        user = await authorize_integration_user(x_api_key, request.user_id)
+        
+        query = {"member_address": user["address"]}
+        if request.file_ids:
+            query["file_id"] = {"$in": request.file_ids}
+        elif request.since_file_id:
+            # Files sharing the cursor's timestamp are ordered by file_id
+            query["$or"] = [
+                {"created_at": {"$gt": request.since}},
+                {"created_at": request.since, "file_id": {"$gt": request.since_file_id}}
+            ]
+        else:
+            query["created_at"] = {"$gt": request.since}
+        csv_files = await db.member_csv_files.find(query).sort(
+            [("created_at", 1), ("file_id", 1)]
+        ).limit(BATCH_EXPORT_MAX_FILES + 1).to_list(None)
+        has_more = len(csv_files) > BATCH_EXPORT_MAX_FILES
+        csv_files = csv_files[:BATCH_EXPORT_MAX_FILES]
+        
+        if request.file_ids and len(csv_files) != len(set(request.file_ids)):
+            found = {csv_file["file_id"] for csv_file in csv_files}
+            missing = [file_id for file_id in request.file_ids if file_id not in found]
+            logger.warning(f"Batch export: files {missing} not found for user {request.user_id}")
+            raise HTTPException(
+                status_code=403,
+                detail="CSV file not found or user does not have access"
+            )
         
-        # Check rate limit
-        rate_limit_ok, rate_info = await check_rate_limit(x_api_key)
-        if not rate_limit_ok:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+        line_count = sum(csv_line_count(csv_file) for csv_file in csv_files)
         
-        # Verify user exists
-        user = await db.users.find_one({"user_id": user_id})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        # One log entry for the whole batch
+        await record_export_log(db, {
+            "export_id": str(uuid.uuid4()),
+            "user_id": request.user_id,
+            "file_ids": [csv_file["file_id"] for csv_file in csv_files],
+            "file_count": len(csv_files),
+            "integration": "automailer",
+            "format": request.format,
+            "exported_at": datetime.utcnow(),
+            "line_count": line_count,
+            "api_key_id": x_api_key[:8] + "..."  # Log first 8 chars only
+        })
+        
+        logger.info(f"CSV batch export: user={request.user_id}, files={len(csv_files)}, lines={line_count}")
+        
+        headers = {"X-File-Count": str(len(csv_files)), "X-Line-Count": str(line_count)}
+        if not request.file_ids:
+            headers["X-Has-More"] = "true" if has_more else "false"
+            if csv_files:
+                headers["X-Next-Since"] = csv_files[-1]["created_at"].isoformat()
+                headers["X-Next-Since-File-Id"] = csv_files[-1]["file_id"]
+        if request.format == "zip":
+            headers["Content-Disposition"] = f"attachment; filename=leads_{request.user_id}.zip"
+            return StreamingResponse(iter_zip_export(db, csv_files), media_type="application/zip", headers=headers)
+        return StreamingResponse(iter_ndjson_export(db, csv_files), media_type="application/x-ndjson", headers=headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to export CSV batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to export CSV batch")
+
+
+@app.get("/api/integrations/csv-files")
+async def integration_list_csv_files(
+    user_id: str,
+    x_api_key: Optional[str] = Header(None, alias="X-API-Key")
+):
+    """
+    List available CSV files for a user
+    """
+    try:
+        user = await authorize_integration_user(x_api_key, user_id)
         
         # Get all CSV files for user
         csv_files = await db.member_csv_files.find({
             "member_address": user["address"]
-        }).sort("created_at", -1).to_list(None)
+        }, CSV_BODY_FIELDS).sort("created_at", -1).to_list(None)
         
         # Format response
         files = []
@@ -8723,6 +9972,53 @@ async def integration_list_csv_files(
         raise HTTPException(status_code=500, detail="Failed to list CSV files")
 
 
+@app.get("/api/integrations/csv-files/changes")
+async def integration_csv_file_changes(
+    user_id: str,
+    resume_token: Optional[str] = None,
+    limit: int = CHANGE_FEED_DEFAULT_LIMIT,
+    x_api_key: Optional[str] = Header(None, alias="X-API-Key")
+):
+    """
+    CSV files of a user created or changed since the last sync
+    Start without a resume_token, then pass back the returned one; keep
+    paging while has_more is true.
+    """
+    try:
+        user = await authorize_integration_user(x_api_key, user_id)
+        
+        try:
+            changes = await list_csv_file_changes(db, user["address"], resume_token, limit)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid resume token")
+        
+        files = []
+        for csv_file in changes["files"]:
+            files.append({
+                "file_id": csv_file["file_id"],
+                "filename": csv_file["filename"],
+                "line_count": csv_file.get("lead_count", 0),
+                "created_at": csv_file["created_at"].isoformat(),
+                "updated_at": csv_file["updated_at"].isoformat(),
+                "distribution_id": csv_file.get("distribution_id", ""),
+                "downloaded": csv_file.get("downloaded", False),
+                "download_count": csv_file.get("download_count", 0)
+            })
+        
+        return {
+            "success": True,
+            "files": files,
+            "resume_token": changes["resume_token"],
+            "has_more": changes["has_more"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to list CSV file changes: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to list CSV file changes")
+
+
 # =============================================================================
 # ADMIN API KEY MANAGEMENT
 # =============================================================================
@@ -8736,16 +10032,14 @@ async def admin_create_api_key(
     Generate new API key for external integrations (Admin only)
     """
     try:
-        # Generate API key
-        api_key_raw = f"{request.integration_name}_live_key_" + secrets.token_urlsafe(32)
+        # Generate API key (hashed before storing, with a public lookup prefix)
+        api_key_raw, key_prefix, api_key_hash = generate_api_key(request.integration_name)
         key_id = str(uuid.uuid4())
         
-        # Hash API key before storing
-        api_key_hash = bcrypt.hashpw(api_key_raw.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
         # Store in database
         await db.integration_api_keys.insert_one({
             "key_id": key_id,
+            "key_prefix": key_prefix,
             "api_key_hash": api_key_hash,  # Never store plain text
             "integration_name": request.integration_name,
             "description": request.description,
@@ -8766,6 +10060,7 @@ async def admin_create_api_key(
             "success": True,
             "api_key": {
                 "key_id": key_id,
+                "key_prefix": key_prefix,
                 "api_key": api_key_raw,  # Only shown once!
                 "integration_name": request.integration_name,
                 "permissions": request.permissions,
@@ -8795,6 +10090,7 @@ async def admin_list_api_keys(current_admin: dict = Depends(get_admin_user)):
         for key in api_keys:
             keys.append({
                 "key_id": key["key_id"],
+                "key_prefix": key.get("key_prefix"),
                 "integration_name": key["integration_name"],
                 "description": key.get("description", ""),
                 "permissions": key["permissions"],
@@ -8833,6 +10129,7 @@ async def admin_revoke_api_key(
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="API key not found")
+        invalidate_api_key(key_id)
         
         logger.info(f"API key revoked: {key_id} by {current_admin['username']}")
         
@@ -8863,13 +10160,13 @@ async def admin_rotate_api_key(
             raise HTTPException(status_code=404, detail="API key not found")
         
         # Generate new API key
-        new_api_key_raw = f"{existing_key['integration_name']}_live_key_" + secrets.token_urlsafe(32)
+        new_api_key_raw, new_key_prefix, new_api_key_hash = generate_api_key(existing_key["integration_name"])
         new_key_id = str(uuid.uuid4())
-        new_api_key_hash = bcrypt.hashpw(new_api_key_raw.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
         
         # Create new key record
         await db.integration_api_keys.insert_one({
             "key_id": new_key_id,
+            "key_prefix": new_key_prefix,
             "api_key_hash": new_api_key_hash,
             "integration_name": existing_key["integration_name"],
             "description": existing_key.get("description", ""),
@@ -8897,6 +10194,7 @@ async def admin_rotate_api_key(
                 }
             }
         )
+        invalidate_api_key(key_id)
         
         logger.info(f"API key rotated: {key_id} -> {new_key_id} by {current_admin['username']}")
         
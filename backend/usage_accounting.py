@@ -0,0 +1,171 @@
+"""
+Buffered usage accounting for integration requests
+
+API key usage (last_used_at, usage_count) and CSV export log entries are
+collected in memory instead of being written on the request path. Usage is
+merged per key, so any number of requests by one key costs a single update
+per flush, and export logs go out in one insert_many. The buffer is flushed
+every few seconds, as soon as enough events are waiting, and on shutdown.
+Without a running buffer (scripts, tests) both are written directly.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "5"))
+USAGE_FLUSH_EVENTS = 500  # Flush early once this many events are waiting
+USAGE_MAX_BUFFERED_EVENTS = 20000  # Events kept for retry when flushes keep failing
+DUPLICATE_KEY_ERROR = 11000
+
+
+class UsageBuffer:
+    """Merges key usage and batches export logs, flushed by a background task"""
+
+    def __init__(self, db, flush_seconds: float = USAGE_FLUSH_SECONDS, flush_events: int = USAGE_FLUSH_EVENTS):
+        self.db = db
+        self.flush_seconds = flush_seconds
+        self.flush_events = flush_events
+        self.key_usage: Dict[str, Dict] = {}  # key_id -> {"count", "last_used_at"}
+        self.export_logs: List[dict] = []
+        self.pending_events = 0
+        self.flush_event = asyncio.Event()
+        self.stopping = False
+        self.task: Optional[asyncio.Task] = None
+
+    def add_key_usage(self, key_id: str, used_at: datetime, count: int = 1):
+        usage = self.key_usage.setdefault(key_id, {"count": 0, "last_used_at": used_at})
+        usage["count"] += count
+        usage["last_used_at"] = max(usage["last_used_at"], used_at)
+        self._event_added(count)
+
+    def add_export_log(self, log: dict):
+        self.export_logs.append(log)
+        self._event_added(1)
+
+    def _event_added(self, count: int):
+        self.pending_events += count
+        if self.pending_events >= self.flush_events:
+            self.flush_event.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.stopping = True
+        self.flush_event.set()
+        if self.task is not None:
+            await self.task
+        await self.flush()
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.flush_event.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_event.clear()
+            if not self.stopping:
+                await self.flush()
+
+    async def flush(self):
+        """
+        Write everything buffered so far
+        After a partial bulk failure only the writes that did not apply are
+        kept for the next flush. Usage whose outcome is unknown (the whole
+        request failed) is dropped rather than risk counting it twice; export
+        logs keep their _id, so re-sending one that did go in is a duplicate
+        key error and is dropped then.
+        """
+        key_usage, self.key_usage = self.key_usage, {}
+        export_logs, self.export_logs = self.export_logs, []
+        self.pending_events = 0
+
+        if key_usage:
+            usage_items = list(key_usage.items())
+            try:
+                await self.db.integration_api_keys.bulk_write([
+                    UpdateOne(
+                        {"key_id": key_id},
+                        {"$inc": {"usage_count": usage["count"]}, "$max": {"last_used_at": usage["last_used_at"]}}
+                    )
+                    for key_id, usage in usage_items
+                ], ordered=False)
+            except BulkWriteError as e:
+                failed = _failed_indexes(e)
+                logger.error(f"Failed to flush API key usage for {len(failed)} of {len(usage_items)} keys: {str(e)}")
+                for index in failed:
+                    key_id, usage = usage_items[index]
+                    self.add_key_usage(key_id, usage["last_used_at"], usage["count"])
+            except Exception as e:
+                logger.error(f"Failed to flush API key usage for {len(usage_items)} keys, dropped: {str(e)}")
+
+        if export_logs:
+            try:
+                await self.db.csv_export_logs.insert_many(export_logs, ordered=False)
+                return
+            except BulkWriteError as e:
+                retry = [export_logs[index] for index in _failed_indexes(e)]
+                logger.error(f"Failed to flush {len(retry)} of {len(export_logs)} export logs: {str(e)}")
+            except Exception as e:
+                retry = export_logs
+                logger.error(f"Failed to flush {len(export_logs)} export logs: {str(e)}")
+            if len(self.export_logs) + len(retry) <= USAGE_MAX_BUFFERED_EVENTS:
+                self.export_logs = retry + self.export_logs
+                self.pending_events += len(retry)
+            else:
+                logger.error(f"Dropped {len(retry)} export logs (buffer full)")
+
+
+def _failed_indexes(error: BulkWriteError) -> List[int]:
+    """Indexes of the writes in a bulk that failed and are worth retrying (not duplicates)"""
+    return [
+        write_error["index"]
+        for write_error in (error.details or {}).get("writeErrors", [])
+        if write_error.get("code") != DUPLICATE_KEY_ERROR
+    ]
+
+
+_buffer: Optional[UsageBuffer] = None
+
+
+async def record_key_usage(db, key_id: str):
+    """Count one request by an API key"""
+    if _buffer is not None:
+        _buffer.add_key_usage(key_id, datetime.utcnow())
+        return
+    await db.integration_api_keys.update_one(
+        {"key_id": key_id},
+        {"$set": {"last_used_at": datetime.utcnow()}, "$inc": {"usage_count": 1}}
+    )
+
+
+async def record_export_log(db, log: dict):
+    """Store a csv_export_logs entry"""
+    if _buffer is not None:
+        _buffer.add_export_log(log)
+        return
+    await db.csv_export_logs.insert_one(log)
+
+
+async def start_usage_buffer(db):
+    """Start the process-wide usage buffer (idempotent)"""
+    global _buffer
+    if _buffer is None:
+        _buffer = UsageBuffer(db)
+        _buffer.start()
+        logger.info("Usage accounting buffer started")
+
+
+async def stop_usage_buffer():
+    """Flush and stop the usage buffer"""
+    global _buffer
+    if _buffer is not None:
+        buffer, _buffer = _buffer, None
+        await buffer.stop()